@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'products.audit.AuditUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -77,6 +79,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Varias cajas escriben a la vez: las transacciones toman el bloqueo
+            # de escritura al iniciar y esperan en lugar de fallar de inmediato
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Base de pruebas en archivo para que los tests con hilos compartan
+        # bloqueos como en producción (la de memoria compartida no espera)
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -122,6 +135,85 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Los archivos subidos se nombran por el hash de su contenido (sin duplicados)
+STORAGES = {
+    'default': {
+        'BACKEND': 'products.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Imágenes de productos: lado máximo del original y anchos de las miniaturas
+PRODUCT_IMAGE_MAX_DIMENSION = 1600
+PRODUCT_IMAGE_VARIANT_WIDTHS = (320, 640)
+
+# Paginación
+PRODUCT_LIST_PAGE_SIZE = 24
+SALE_LIST_PAGE_SIZE = 50
+HISTORY_LIST_PAGE_SIZE = 50
+PAGINATION_MAX_PAGE_SIZE = 100
+
+# Tablero de ventas: días mostrados por defecto y cantidad de SKU en el ranking
+SALES_DASHBOARD_DAYS = 30
+SALES_DASHBOARD_TOP_SKUS = 10
+
+# Análisis de ventas: caché de los periodos en curso y de los ya cerrados
+ANALYTICS_CACHE_TIMEOUT = 60 * 10
+ANALYTICS_CLOSED_PERIOD_TIMEOUT = 60 * 60 * 24
+ANALYTICS_TOP_SKUS = 20
+ANALYTICS_DEAD_STOCK_DAYS = 90
+
+# Reabastecimiento (compute_reorder_suggestions): ventana para la velocidad de
+# venta y días de entrega, de reserva y de cobertura de cada pedido
+REORDER_WINDOW_DAYS = 28
+REORDER_LEAD_TIME_DAYS = 7
+REORDER_SAFETY_DAYS = 3
+REORDER_COVER_DAYS = 30
+
+# Valuación del inventario: productos de mayor valor que se listan
+INVENTORY_VALUATION_TOP_PRODUCTS = 20
+
+# Caché (locmem por proceso; con varios procesos usar
+# django.core.cache.backends.filebased.FileBasedCache con un directorio compartido).
+# El catálogo usa su propia caché para que las tarjetas (una por producto) no
+# desplacen las sesiones, los tickets ni los análisis de 'default'
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'perfumeria',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'perfumeria-catalog',
+        # Una tarjeta por producto más las primeras páginas de los filtros
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Caché del catálogo: tarjetas por producto y primera página por filtros
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+CATALOG_PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Lector de códigos: mapa código → id en memoria de cada proceso (scan.py)
+SCAN_WARM_MAP = True
+
+# Historial de auditoría: 'sync' escribe en la misma transacción, 'commit' en
+# lote al confirmarla y 'background' desde un hilo, fuera de la petición
+AUDIT_MODE = 'background'
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 2.0
+
+# Sesiones (incluyen el carrito): 'cached_db' lee la sesión desde la caché en
+# cada petición; 'signed_cookies' la guarda en la cookie firmada sin escribir
+# en la base de datos. Con 'db' o 'cached_db' hay que programar
+# `manage.py clearsessions` (ver README) para borrar las sesiones vencidas.
+SESSION_BACKEND = os.environ.get('DJANGO_SESSION_BACKEND', 'cached_db')
+SESSION_ENGINE = f'django.contrib.sessions.backends.{SESSION_BACKEND}'
+
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'product_list'
 LOGOUT_REDIRECT_URL = 'login'
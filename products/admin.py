@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, History, UserProfile, Sale, SaleItem
+from .models import Product, History, ReorderSuggestion, UserProfile, Sale, SaleItem, SalesDaily
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -40,3 +40,17 @@ class SaleItemAdmin(admin.ModelAdmin):
     list_display = ['sale', 'product_name', 'product_brand', 'quantity', 'unit_price', 'subtotal']
     list_filter = ['sale__created_at']
     search_fields = ['product_name', 'product_brand', 'product_sku']
+
+
+@admin.register(SalesDaily)
+class SalesDailyAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'product_sku', 'units', 'revenue', 'sales']
+    list_filter = ['day', 'user']
+    search_fields = ['product_sku']
+
+
+@admin.register(ReorderSuggestion)
+class ReorderSuggestionAdmin(admin.ModelAdmin):
+    list_display = ['sku', 'name', 'supplier', 'quantity', 'velocity', 'reorder_point', 'suggested_quantity', 'needs_reorder']
+    list_filter = ['needs_reorder', 'supplier']
+    search_fields = ['sku', 'name']
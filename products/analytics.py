@@ -0,0 +1,155 @@
+"""Análisis de ventas por SKU: más vendidos, clasificación ABC y stock sin movimiento.
+
+Cada reporte es una sola consulta agrupada sobre SaleItem unido a Sale, que
+filtra por ``sale.created_at`` (índice sale_created_idx) y agrupa por
+``product_sku`` (índice saleitem_sku_sale_idx). Los resultados se guardan en
+la caché con la clave del periodo: un periodo ya cerrado no cambia, así que
+se guarda por más tiempo que uno que incluye el día de hoy.
+
+Los periodos son días locales ``[inicio, fin)``; ``period_bounds`` convierte
+los nombres que usa la vista (``month``, ``last_month``, ``30d``...).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import DecimalField, ExpressionWrapper, F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import Product, SaleItem
+
+PERIODS = {
+    'month': 'Este mes',
+    'last_month': 'Mes anterior',
+    '30d': 'Últimos 30 días',
+    '90d': 'Últimos 90 días',
+    '365d': 'Últimos 365 días',
+}
+DEFAULT_PERIOD = 'month'
+
+# Límites de la clasificación ABC en % acumulado de ingresos
+ABC_THRESHOLDS = (80, 95)
+
+
+def period_bounds(period, today=None):
+    """Días ``(inicio, fin)`` del periodo, con fin exclusivo"""
+    today = today or timezone.localdate()
+    if period == 'month':
+        return today.replace(day=1), today + timedelta(days=1)
+    if period == 'last_month':
+        end = today.replace(day=1)
+        return (end - timedelta(days=1)).replace(day=1), end
+    if period.endswith('d') and period[:-1].isdigit():
+        days = int(period[:-1])
+        return today - timedelta(days=days - 1), today + timedelta(days=1)
+    raise ValueError(f'Periodo desconocido: {period}')
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _timeout(end):
+    # Un periodo que terminó antes de hoy ya no recibe ventas
+    if end <= timezone.localdate():
+        return getattr(settings, 'ANALYTICS_CLOSED_PERIOD_TIMEOUT', 60 * 60 * 24)
+    return getattr(settings, 'ANALYTICS_CACHE_TIMEOUT', 60 * 10)
+
+
+def _cached(name, start, end, compute, *params):
+    key = ':'.join(['analytics', name, start.isoformat(), end.isoformat(), *map(str, params)])
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, _timeout(end))
+    return result
+
+
+def _sku_totals(start, end):
+    """Unidades e ingresos por SKU de las ventas del periodo"""
+    return (
+        SaleItem.objects
+        .filter(sale__created_at__gte=_aware(start), sale__created_at__lt=_aware(end))
+        .values('product_sku')
+        .annotate(
+            product_name=Max('product_name'),
+            product_brand=Max('product_brand'),
+            units=Sum('quantity'),
+            revenue=Sum('subtotal'),
+        )
+    )
+
+
+def top_skus(start, end, limit=20, by='revenue'):
+    """Los ``limit`` SKU con más ingresos (``by='revenue'``) o unidades (``by='units'``)"""
+    if by not in ('revenue', 'units'):
+        raise ValueError(f'Orden desconocido: {by}')
+    order = [f'-{by}', 'product_sku']
+    return _cached(
+        'top', start, end,
+        lambda: list(_sku_totals(start, end).order_by(*order)[:limit]),
+        limit, by,
+    )
+
+
+def classify(rows, thresholds=ABC_THRESHOLDS):
+    """Agrega ``share``, ``cumulative_share`` y ``abc`` a filas ordenadas por ingresos"""
+    total = sum((row['revenue'] for row in rows), Decimal('0'))
+    cumulative = Decimal('0')
+    for row in rows:
+        # La clase se decide por el acumulado antes de sumar el SKU: el que
+        # cruza el 80% todavía es A
+        before = cumulative * 100 / total if total else Decimal('0')
+        cumulative += row['revenue']
+        row['share'] = float(row['revenue'] * 100 / total) if total else 0.0
+        row['cumulative_share'] = float(cumulative * 100 / total) if total else 0.0
+        row['abc'] = 'A' if before < thresholds[0] else 'B' if before < thresholds[1] else 'C'
+    return rows
+
+
+def abc_classification(start, end):
+    """Todos los SKU vendidos del periodo con su clase ABC por ingresos"""
+    return _cached(
+        'abc', start, end,
+        lambda: classify(list(_sku_totals(start, end).order_by('-revenue', 'product_sku'))),
+    )
+
+
+def abc_summary(rows):
+    """{'A': {'skus', 'revenue'}, ...} a partir de abc_classification"""
+    summary = {label: {'skus': 0, 'revenue': Decimal('0')} for label in 'ABC'}
+    for row in rows:
+        summary[row['abc']]['skus'] += 1
+        summary[row['abc']]['revenue'] += row['revenue']
+    return summary
+
+
+def dead_stock(days=90, today=None):
+    """Productos con stock y sin ventas en los últimos ``days`` días.
+
+    Incluye la fecha de la última venta (o None si nunca se vendió) y el valor
+    del stock a costo, ordenados del mayor valor inmovilizado al menor.
+    """
+    today = today or timezone.localdate()
+    since = today - timedelta(days=days - 1)
+
+    def compute():
+        last_sold = (
+            SaleItem.objects.filter(product_sku=OuterRef('sku'))
+            .values('product_sku')
+            .annotate(last=Max('sale__created_at'))
+            .values('last')
+        )
+        return list(
+            Product.objects.filter(quantity__gt=0)
+            .annotate(
+                last_sold=Subquery(last_sold),
+                stock_cost=ExpressionWrapper(F('cost') * F('quantity'), output_field=DecimalField()),
+            )
+            .filter(Q(last_sold__isnull=True) | Q(last_sold__lt=_aware(since)))
+            .order_by('-stock_cost', 'sku')
+            .values('id', 'sku', 'name', 'brand', 'quantity', 'cost', 'stock_cost', 'last_sold')
+        )
+
+    return _cached('dead', since, today + timedelta(days=1), compute, days)
@@ -0,0 +1,159 @@
+"""Endpoints JSON del carrito.
+
+Aplican los mismos cambios que las vistas con redirección de views.py pero
+responden solo con la línea modificada y los totales del carrito, para que
+cart.html se actualice sin recargar la página. Los totales salen de la sesión
+(precio en centavos guardado al agregar), así que la única consulta es la del
+producto cuando hay que validar stock.
+
+Al agregar un producto que no estaba en el carrito, con ``render=line`` la
+respuesta incluye el HTML de su línea (products/cart_line.html) para que
+cart.html la inserte sin recargar.
+"""
+from functools import wraps
+
+from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils.formats import number_format
+from django.views.decorators.http import require_POST
+
+from .cart import (
+    CART_PRODUCT_FIELDS, CartError, add_item, cart_line, from_cents, load_cart, save_cart, set_quantity,
+    summarize,
+)
+from .models import Product
+from .scan import find_by_code
+
+API_PRODUCT_FIELDS = CART_PRODUCT_FIELDS
+
+
+def api_login_required(view):
+    """Como login_required pero responde 401 en JSON en lugar de redirigir"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response('Tu sesión expiró, vuelve a iniciar sesión', status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def error_response(message, status=400):
+    return JsonResponse({'ok': False, 'error': message}, status=status)
+
+
+def _money(value):
+    return number_format(value, 2)
+
+
+def cart_response(cart, product_id=None, message='', html=None):
+    """Línea ``product_id`` (o None si ya no está) y totales del carrito"""
+    line = None
+    if product_id is not None and str(product_id) in cart:
+        quantity, cents = cart[str(product_id)]
+        line = {
+            'id': int(product_id),
+            'quantity': quantity,
+            'unit_price': _money(from_cents(cents)),
+            'subtotal': _money(from_cents(quantity * cents)),
+        }
+        if html is not None:
+            line['html'] = html
+    summary = summarize(cart)
+    return JsonResponse({
+        'ok': True,
+        'message': message,
+        'line': line,
+        'lines': summary['lines'],
+        'units': summary['units'],
+        'total': _money(summary['total']),
+    })
+
+
+def _add_to_cart(request, product, quantity):
+    """Agrega ``product`` y responde; con ``render=line`` incluye el HTML de una línea nueva"""
+    cart = load_cart(request.session)
+    is_new = str(product.pk) not in cart
+    try:
+        add_item(cart, product, quantity)
+    except CartError as e:
+        return error_response(str(e), status=409)
+    save_cart(request.session, cart)
+
+    html = None
+    if is_new and request.POST.get('render') == 'line':
+        item = cart_line(product, *cart[str(product.pk)])
+        html = render_to_string('products/cart_line.html', {'item': item}, request=request)
+    return cart_response(cart, product.pk, f'{product.name} agregado al carrito', html)
+
+
+def _get_product(pk):
+    return Product.objects.only(*API_PRODUCT_FIELDS).filter(pk=pk).first()
+
+
+def _posted_quantity(request, default=None):
+    try:
+        return int(request.POST.get('quantity', default))
+    except (TypeError, ValueError):
+        return None
+
+
+@api_login_required
+@require_POST
+def cart_add(request, pk):
+    product = _get_product(pk)
+    if product is None:
+        return error_response('Producto no encontrado', status=404)
+    quantity = _posted_quantity(request, default=1)
+    if quantity is None:
+        return error_response('Cantidad inválida')
+    return _add_to_cart(request, product, quantity)
+
+
+@api_login_required
+@require_POST
+def cart_update_quantity(request, pk):
+    product = _get_product(pk)
+    if product is None:
+        return error_response('Producto no encontrado', status=404)
+    quantity = _posted_quantity(request)
+    if quantity is None:
+        return error_response('Cantidad inválida')
+
+    cart = load_cart(request.session)
+    try:
+        set_quantity(cart, product, quantity)
+    except CartError as e:
+        return error_response(str(e), status=409)
+    save_cart(request.session, cart)
+    return cart_response(cart, pk, 'Cantidad actualizada')
+
+
+@api_login_required
+@require_POST
+def cart_remove(request, pk):
+    cart = load_cart(request.session)
+    if cart.pop(str(pk), None) is not None:
+        save_cart(request.session, cart)
+    return cart_response(cart, pk, 'Producto eliminado del carrito')
+
+
+@api_login_required
+@require_POST
+def cart_clear(request):
+    cart = {}
+    save_cart(request.session, cart)
+    return cart_response(cart, message='Carrito vaciado')
+
+
+@api_login_required
+@require_POST
+def cart_scan(request):
+    """Agrega al carrito el producto del código escaneado (barcode o SKU)"""
+    code = request.POST.get('code', '')
+    product = find_by_code(code)
+    if product is None:
+        return error_response(f'No hay ningún producto con el código {code.strip()}', status=404)
+    quantity = _posted_quantity(request, default=1)
+    if quantity is None:
+        return error_response('Cantidad inválida')
+    return _add_to_cart(request, product, quantity)
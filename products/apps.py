@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def ensure_search_index(sender, using, **kwargs):
+    """Recrea los triggers FTS si una migración reconstruyó la tabla de productos"""
+    from django.db import connections
+    from . import search
+
+    connection = connections[using]
+    if search.install(connection):
+        search.rebuild(connection)
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        from . import audit, catalog_cache, receipts, rollup, scan  # noqa: F401  registran sus señales
+
+        post_migrate.connect(ensure_search_index, sender=self)
@@ -0,0 +1,256 @@
+"""Registro de auditoría (History) para los cambios en productos.
+
+Los cambios se detectan con señales del modelo: al cargar un Product se toma
+una instantánea de sus valores y al guardarlo o eliminarlo se compara contra
+ella usando la lista de campos del modelo, sin diccionarios copiados a mano.
+
+El usuario responsable se toma de ``AuditUserMiddleware`` en las peticiones
+web o de ``acting_as(user)`` en comandos; sin usuario no se registra nada.
+
+Según ``AUDIT_MODE`` los registros se escriben:
+
+* ``'sync'``: en el momento, dentro de la misma transacción (para tests).
+* ``'commit'``: al confirmar la transacción, todos juntos con bulk_create.
+* ``'background'``: al confirmar se encolan y un hilo los escribe en lotes,
+  fuera del ciclo de la petición.
+"""
+import atexit
+import contextvars
+import logging
+import threading
+import weakref
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .models import History, Product
+
+logger = logging.getLogger(__name__)
+
+# Campos que no forman parte del historial
+EXCLUDED_FIELDS = {'id', 'image', 'created_at', 'updated_at'}
+
+AUDITED_FIELDS = [
+    field for field in Product._meta.concrete_fields
+    if field.name not in EXCLUDED_FIELDS
+]
+
+# Igual que en settings; AUDIT_MODE sólo se lee a través de audit_mode()
+DEFAULT_MODE = 'background'
+
+_current_user = contextvars.ContextVar('audit_user', default=None)
+
+
+def audit_mode():
+    return getattr(settings, 'AUDIT_MODE', DEFAULT_MODE)
+
+
+@contextmanager
+def acting_as(user):
+    """Atribuye a ``user`` los cambios hechos dentro del bloque"""
+    token = _current_user.set(user)
+    try:
+        yield
+    finally:
+        _current_user.reset(token)
+
+
+class AuditUserMiddleware:
+    """Toma el usuario autenticado de la petición como responsable de los cambios"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.get_response(request)
+        with acting_as(user):
+            return self.get_response(request)
+
+
+def serialize_value(field, value):
+    """Normaliza el valor de un campo a un tipo JSON estable"""
+    if value is None:
+        return None
+    try:
+        value = field.to_python(value)
+    except Exception:
+        return str(value)
+    if isinstance(value, Decimal):
+        if isinstance(field, models.DecimalField):
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+        return str(value)
+    return value
+
+
+def snapshot(instance):
+    """Valores auditables ya cargados en la instancia (omite campos diferidos)"""
+    data = instance.__dict__
+    return {
+        field.name: serialize_value(field, data[field.attname])
+        for field in AUDITED_FIELDS
+        if field.attname in data
+    }
+
+
+def diff(old, new):
+    return {
+        name: {'old': old.get(name), 'new': value}
+        for name, value in new.items()
+        if name in old and old[name] != value
+    }
+
+
+def build_entry(action, instance, changes, user=None):
+    return History(
+        user=user or _current_user.get(),
+        product_id=instance.pk,
+        product_name=instance.name,
+        action=action,
+        changes=changes,
+    )
+
+
+class AuditWriter:
+    """Acumula registros confirmados y los escribe con bulk_create"""
+
+    def __init__(self):
+        self._entries = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'AUDIT_BATCH_SIZE', 500)
+
+    def add(self, entries):
+        with self._lock:
+            self._entries.extend(entries)
+            pending = len(self._entries)
+        if audit_mode() == 'background':
+            self._ensure_thread()
+            if pending >= self.batch_size:
+                self._wakeup.set()
+        else:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if entries:
+            try:
+                History.objects.bulk_create(entries, batch_size=self.batch_size)
+            except Exception:
+                # bulk_create es atómico: el lote completo vuelve a la cola,
+                # delante de lo que llegó mientras tanto, y se reintenta
+                with self._lock:
+                    self._entries[:0] = entries
+                raise
+        return len(entries)
+
+    def pending(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(getattr(settings, 'AUDIT_FLUSH_INTERVAL', 2.0))
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('No se pudo escribir el historial de auditoría')
+            finally:
+                connection.close()
+
+
+writer = AuditWriter()
+atexit.register(writer.flush)
+
+
+class _PendingBatch:
+    """Registros de un mismo nivel de transacción que esperan al commit"""
+
+    def __init__(self):
+        self.entries = []
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        writer.add(self.entries)
+
+
+_batches = threading.local()
+
+
+def _pending_batch(conn):
+    # Un lote por nivel de savepoint: si el savepoint o la transacción se
+    # revierten Django descarta su callback, y como la única referencia fuerte
+    # al lote es ese callback, también desaparece de este registro
+    registry = getattr(_batches, 'registry', None)
+    if registry is None:
+        registry = _batches.registry = weakref.WeakValueDictionary()
+    key = (conn.alias, tuple(conn.savepoint_ids))
+    batch = registry.get(key)
+    if batch is None or batch.done:
+        batch = registry[key] = _PendingBatch()
+        transaction.on_commit(batch)
+    return batch
+
+
+def record(entry):
+    """Registra un History según AUDIT_MODE; se descarta si la transacción se revierte"""
+    record_many([entry])
+
+
+def record_many(entries):
+    """Registra varios History (por ejemplo de operaciones masivas) en un solo lote"""
+    entries = [entry for entry in entries if entry.user_id is not None]
+    if not entries:
+        return
+    if audit_mode() == 'sync':
+        History.objects.bulk_create(entries, batch_size=writer.batch_size)
+        return
+    conn = transaction.get_connection()
+    if not conn.in_atomic_block:
+        writer.add(entries)
+        return
+    _pending_batch(conn).entries.extend(entries)
+
+
+@receiver(post_init, sender=Product)
+def _take_snapshot(sender, instance, **kwargs):
+    instance._audit_snapshot = snapshot(instance) if instance.pk else {}
+
+
+@receiver(post_save, sender=Product)
+def _audit_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = snapshot(instance)
+    if created:
+        record(build_entry('CREATE', instance, current))
+    else:
+        changes = diff(getattr(instance, '_audit_snapshot', {}), current)
+        if changes:
+            record(build_entry('UPDATE', instance, changes))
+    instance._audit_snapshot = current
+
+
+@receiver(post_delete, sender=Product)
+def _audit_delete(sender, instance, **kwargs):
+    record(build_entry('DELETE', instance, snapshot(instance)))
@@ -0,0 +1,136 @@
+"""Carrito guardado en la sesión.
+
+El carrito se guarda en forma compacta como ``{"id": [cantidad, centavos]}``:
+solo el id del producto, la cantidad y el precio al agregarlo en centavos
+enteros. Así ocupa pocos bytes (cabe en una cookie firmada) y el precio no
+pasa por float. Los nombres y demás datos se leen de la base de datos al
+mostrarlo. Las sesiones con el formato anterior (diccionario por línea con
+precio float) se convierten al leerlas.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from .models import Product
+
+CART_SESSION_KEY = 'cart'
+
+# Columnas que usa cart.html para cada línea
+CART_PRODUCT_FIELDS = ('id', 'name', 'brand', 'category', 'volume', 'sku', 'price', 'quantity', 'image')
+
+
+def to_cents(value):
+    return int((Decimal(str(value)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def normalize_line(value):
+    """Retorna ``[cantidad, centavos]`` para una línea compacta o del formato anterior"""
+    if isinstance(value, dict):
+        return [int(value['quantity']), to_cents(value['price'])]
+    quantity, cents = value
+    return [int(quantity), int(cents)]
+
+
+def load_cart(session):
+    """Carrito de la sesión como ``{"id": [cantidad, centavos]}``"""
+    cart = {}
+    for product_id, value in (session.get(CART_SESSION_KEY) or {}).items():
+        try:
+            cart[str(product_id)] = normalize_line(value)
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            continue
+    return cart
+
+
+def save_cart(session, cart):
+    session[CART_SESSION_KEY] = cart
+
+
+class CartError(Exception):
+    """El cambio al carrito no se pudo aplicar; el mensaje se muestra al usuario"""
+
+
+def add_item(cart, product, quantity=1):
+    """Suma ``quantity`` unidades de ``product`` validando el stock; retorna la línea"""
+    product_id = str(product.pk)
+    if product.quantity <= 0:
+        raise CartError(f'No hay stock disponible de {product.name}')
+    if quantity <= 0:
+        raise CartError('La cantidad debe ser mayor a 0')
+    current = cart[product_id][0] if product_id in cart else 0
+    if current + quantity > product.quantity:
+        raise CartError(f'No hay suficiente stock de {product.name}. Disponible: {product.quantity}')
+
+    if product_id in cart:
+        cart[product_id][0] += quantity
+    else:
+        cart[product_id] = [quantity, to_cents(product.price)]
+    return cart[product_id]
+
+
+def set_quantity(cart, product, quantity):
+    """Cambia la cantidad de una línea existente validando el stock"""
+    if quantity <= 0:
+        raise CartError('La cantidad debe ser mayor a 0')
+    if quantity > product.quantity:
+        raise CartError(f'No hay suficiente stock. Disponible: {product.quantity}')
+    product_id = str(product.pk)
+    if product_id not in cart:
+        raise CartError('El producto no está en el carrito')
+    cart[product_id][0] = quantity
+    return cart[product_id]
+
+
+def summarize(cart):
+    """Totales calculados solo con la sesión, sin consultar productos"""
+    return {
+        'lines': len(cart),
+        'units': sum(quantity for quantity, _ in cart.values()),
+        'total': from_cents(sum(quantity * cents for quantity, cents in cart.values())),
+    }
+
+
+def cart_line(product, quantity, cents):
+    """Línea del carrito como la muestra cart.html (products/cart_line.html)"""
+    unit_price = from_cents(cents)
+    return {
+        'product': product,
+        'quantity': quantity,
+        'unit_price': unit_price,
+        'subtotal': unit_price * quantity,
+        'price_changed': product.price != unit_price,
+        'stock_short': quantity > product.quantity,
+    }
+
+
+def hydrate_cart(session):
+    """Carga todos los productos del carrito con una sola consulta.
+
+    Las líneas cuyo producto ya no existe se quitan de la sesión. Retorna
+    ``(líneas, total, ids_eliminados)``; cada línea incluye el precio
+    guardado al agregarla y marca si el precio o el stock actual cambiaron.
+    """
+    cart = load_cart(session)
+    ids = [int(product_id) for product_id in cart if product_id.isdigit()]
+    products = Product.objects.only(*CART_PRODUCT_FIELDS).in_bulk(ids)
+
+    lines = []
+    removed = []
+    total = Decimal('0.00')
+    for product_id, (quantity, cents) in list(cart.items()):
+        product = products.get(int(product_id)) if product_id.isdigit() else None
+        if product is None:
+            removed.append(product_id)
+            del cart[product_id]
+            continue
+
+        line = cart_line(product, quantity, cents)
+        total += line['subtotal']
+        lines.append(line)
+
+    if removed:
+        save_cart(session, cart)
+
+    return lines, total, removed
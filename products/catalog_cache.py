@@ -0,0 +1,147 @@
+"""Caché del catálogo de productos.
+
+Dos niveles:
+
+* Tarjetas: el HTML de cada tarjeta de product_list.html se guarda con la
+  clave ``pk`` + ``updated_at``; cualquier guardado del producto cambia la
+  clave, así que una tarjeta nunca se sirve desactualizada.
+* Primera página: para las combinaciones de filtros simples (categoría,
+  género, fragancia, orden, stock bajo) se guarda la página ya consultada.
+  Las claves incluyen una versión del catálogo que se incrementa al guardar o
+  eliminar cualquier producto.
+
+Funciona con cualquier backend de ``CACHES`` (locmem o archivos); con varios
+procesos conviene el de archivos para que la invalidación sea compartida.
+"""
+import threading
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+CARD_TEMPLATE = 'products/product_card.html'
+VERSION_KEY = 'catalog:version'
+
+# Parámetros con los que la primera página se puede guardar en caché
+PAGE_CACHE_PARAMS = ('category', 'gender', 'fragrance', 'order_by', 'low_stock', 'page_size')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def _count(name, amount=1):
+    if amount:
+        with _stats_lock:
+            _stats[name] += amount
+
+
+def stats():
+    """Contadores de aciertos y fallos de este proceso"""
+    with _stats_lock:
+        return {
+            name: _stats[name]
+            for name in ('card_hits', 'card_misses', 'page_hits', 'page_misses')
+        }
+
+
+def stats_report():
+    """Contadores de stats() con el porcentaje de aciertos de tarjetas y páginas"""
+    report = stats()
+    for kind in ('card', 'page'):
+        total = report[f'{kind}_hits'] + report[f'{kind}_misses']
+        report[f'{kind}_hit_rate'] = round(report[f'{kind}_hits'] * 100 / total, 1) if total else None
+    report['alias'] = getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')
+    return report
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def card_key(product):
+    return f'catalog:card:{product.pk}:{product.updated_at.timestamp()}'
+
+
+def render_cards(products):
+    """HTML de las tarjetas de ``products``, leyendo la caché con una sola llamada"""
+    cache = get_cache()
+    keys = [card_key(product) for product in products]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    cards = []
+    for key, product in zip(keys, products):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(CARD_TEMPLATE, {'product': product})
+            missing[key] = html
+        cards.append(mark_safe(html))
+
+    if missing:
+        cache.set_many(missing, getattr(settings, 'CATALOG_CARD_CACHE_TIMEOUT', 86400))
+    _count('card_hits', len(keys) - len(missing))
+    _count('card_misses', len(missing))
+    return cards
+
+
+def page_key(params):
+    """Clave de la primera página para ``params`` o None si no se puede guardar"""
+    values = {}
+    for name, value in params.items():
+        if not value:
+            continue
+        if name not in PAGE_CACHE_PARAMS:
+            return None
+        values[name] = value
+    version = get_cache().get_or_set(VERSION_KEY, 1, None)
+    return f'catalog:page:{version}:{urlencode(sorted(values.items()))}'
+
+
+def get_page(params, build_page):
+    """Primera página del catálogo, desde la caché cuando los filtros lo permiten"""
+    key = page_key(params)
+    if key is None:
+        return build_page()
+
+    cache = get_cache()
+    page = cache.get(key)
+    if page is not None:
+        _count('page_hits')
+        return page
+
+    _count('page_misses')
+    page = build_page()
+    page.object_list = list(page.object_list)
+    cache.set(key, page, getattr(settings, 'CATALOG_PAGE_CACHE_TIMEOUT', 300))
+    return page
+
+
+def invalidate_pages():
+    """Descarta todas las primeras páginas guardadas"""
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def _invalidate_catalog(sender, instance, **kwargs):
+    # Se invalida de inmediato y otra vez al commit, por si otra petición
+    # guardó la página antes de que el cambio fuera visible
+    invalidate_pages()
+    transaction.on_commit(invalidate_pages)
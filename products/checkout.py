@@ -0,0 +1,112 @@
+"""Procesamiento de ventas a partir del carrito de la sesión.
+
+Toda la venta se registra dentro de una transacción y con un número fijo de
+consultas sin importar cuántas líneas tenga el carrito: una lectura de los
+productos (bloqueados con SELECT ... FOR UPDATE donde la base de datos lo
+soporta), un UPDATE condicional que descuenta el stock de todas las líneas,
+el INSERT de la venta, un bulk_create de sus items y la actualización del
+resumen diario (rollup.py).
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+
+from .cart import from_cents, normalize_line
+from .catalog_cache import invalidate_pages
+from .models import Product, Sale, SaleItem
+from .rollup import add_sale
+from .tickets import next_ticket_number
+
+
+class CheckoutError(Exception):
+    """La venta no se pudo registrar; el mensaje se muestra al usuario"""
+
+
+def _parse_cart(cart):
+    """Convierte el carrito de la sesión en {product_id: (cantidad, precio)}"""
+    lines = {}
+    for product_id, item_data in cart.items():
+        try:
+            quantity, cents = normalize_line(item_data)
+            lines[int(product_id)] = (quantity, from_cents(cents))
+        except (KeyError, TypeError, ValueError, ArithmeticError):
+            raise CheckoutError('El carrito contiene datos inválidos')
+        if quantity <= 0:
+            raise CheckoutError('La cantidad debe ser mayor a 0')
+    return lines
+
+
+def _lock_products(product_ids):
+    """Lee y bloquea los productos del carrito en orden de id para evitar interbloqueos"""
+    return list(
+        Product.objects.select_for_update()
+        .filter(pk__in=product_ids)
+        .only('id', 'name', 'brand', 'sku', 'quantity')
+        .order_by('pk')
+    )
+
+
+def process_sale(user, cart):
+    """Registra la venta del carrito y descuenta el stock; retorna la Sale creada.
+
+    Lanza CheckoutError si el carrito está vacío, algún producto ya no existe
+    o no hay stock suficiente; en ese caso no se guarda ningún cambio.
+    """
+    lines = _parse_cart(cart)
+    if not lines:
+        raise CheckoutError('El carrito está vacío')
+
+    # El número se asigna fuera de la transacción de la venta para que el
+    # asignador pueda reservar bloques; una venta fallida deja un hueco
+    ticket_number = next_ticket_number()
+
+    with transaction.atomic():
+        products = _lock_products(list(lines))
+        if len(products) != len(lines):
+            raise CheckoutError('Producto no encontrado')
+
+        for product in products:
+            quantity = lines[product.pk][0]
+            if product.quantity < quantity:
+                raise CheckoutError(f'Stock insuficiente para {product.name}. Disponible: {product.quantity}')
+
+        # Descuento condicional: una fila que ya no tenga stock suficiente no se
+        # actualiza, así que dos terminales simultáneas nunca venden de más
+        requested = Case(
+            *[When(pk=product_id, then=Value(quantity)) for product_id, (quantity, _) in lines.items()],
+            output_field=IntegerField(),
+        )
+        updated = Product.objects.filter(pk__in=list(lines), quantity__gte=requested).update(
+            quantity=F('quantity') - requested,
+            updated_at=Now(),
+        )
+        if updated != len(lines):
+            raise CheckoutError('El stock cambió mientras se procesaba la venta. Intenta de nuevo')
+        # update() no emite señales; el stock cambió, así que el catálogo en caché también
+        invalidate_pages()
+        transaction.on_commit(invalidate_pages)
+
+        items = []
+        total = Decimal('0.00')
+        for product in products:
+            quantity, unit_price = lines[product.pk]
+            subtotal = unit_price * quantity
+            total += subtotal
+            items.append(SaleItem(
+                product_name=product.name,
+                product_brand=product.brand,
+                product_sku=product.sku,
+                quantity=quantity,
+                unit_price=unit_price,
+                subtotal=subtotal
+            ))
+
+        sale = Sale.objects.create(user=user, total=total, ticket_number=ticket_number)
+        for item in items:
+            item.sale = sale
+        SaleItem.objects.bulk_create(items)
+        add_sale(sale, items)
+
+    return sale
@@ -0,0 +1,99 @@
+"""ETag y Last-Modified para las páginas de productos.
+
+Se usan con ``django.views.decorators.http.condition``: si el navegador ya
+tiene la versión actual la vista responde 304 sin consultar ni renderizar la
+plantilla. El estado se calcula una sola vez por petición y la ETag incluye
+al usuario y el carrito de la sesión, porque la barra superior muestra su
+nombre y la cantidad de productos en el carrito.
+
+El estado del catálogo es un agregado de ``updated_at`` y la cantidad de
+productos filtrados, que se resuelve con índices (product_updated_idx sin
+filtros). Sale de la base de datos y no de una caché por proceso, así que es
+el mismo en todos los procesos y después de reiniciar.
+"""
+import hashlib
+import json
+
+from django.contrib import messages
+from django.db.models import Count, Max
+
+from .cart import CART_SESSION_KEY
+from .models import Product
+
+
+def _has_pending_messages(request):
+    # Un 304 dejaría sin mostrar los mensajes pendientes (por ejemplo tras
+    # editar); len() los carga sin marcarlos como leídos
+    return len(messages.get_messages(request)) > 0
+
+
+def _cart_digest(request):
+    cart = request.session.get(CART_SESSION_KEY) or {}
+    return json.dumps(cart, sort_keys=True, default=str)
+
+
+def _etag(request, *parts):
+    raw = '|'.join(str(part) for part in (request.user.pk, _cart_digest(request), *parts))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def product_state(request, pk):
+    """(etag, last_modified) del detalle de producto, o (None, None)"""
+    if not hasattr(request, '_product_state'):
+        updated_at = Product.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        if updated_at is None or _has_pending_messages(request):
+            request._product_state = (None, None)
+        else:
+            request._product_state = (_etag(request, pk, updated_at.timestamp()), updated_at)
+    return request._product_state
+
+
+def catalog_changes(params):
+    """Consulta de la fecha del último cambio y la cantidad de productos filtrados"""
+    from .views import filter_products
+
+    return filter_products(params, Product.objects.order_by())
+
+
+def catalog_state(request):
+    """(etag, last_modified) del catálogo según los filtros de la petición"""
+    if not hasattr(request, '_catalog_state'):
+        if _has_pending_messages(request):
+            request._catalog_state = (None, None)
+        else:
+            state = catalog_changes(request.GET).aggregate(
+                last_modified=Max('updated_at'), count=Count('id')
+            )
+            request._catalog_state = (
+                _etag(request, request.GET.urlencode(), state['count'],
+                      state['last_modified'] and state['last_modified'].timestamp()),
+                state['last_modified'],
+            )
+    return request._catalog_state
+
+
+def sale_etag(request, kind, pk, ticket_number):
+    """ETag del ticket o el detalle de una venta, o None con mensajes pendientes.
+
+    La venta no cambia, pero la página extiende base.html; el número de ticket
+    distingue una venta nueva que reutiliza el id.
+    """
+    if _has_pending_messages(request):
+        return None
+    return _etag(request, 'sale', kind, pk, ticket_number)
+
+
+def product_etag(request, pk):
+    return product_state(request, pk)[0]
+
+
+def product_last_modified(request, pk):
+    return product_state(request, pk)[1]
+
+
+def catalog_etag(request):
+    return catalog_state(request)[0]
+
+
+def catalog_last_modified(request):
+    return catalog_state(request)[1]
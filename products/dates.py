@@ -0,0 +1,32 @@
+"""Fechas de los filtros (AAAA-MM-DD) convertidas a días locales.
+
+Las usan las vistas de ventas e historial y el comando export_data.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def local_day_range(date_from, date_to):
+    """Convierte fechas AAAA-MM-DD en límites [inicio, fin) del día local.
+
+    Se filtra por rango sobre created_at en lugar de __date para que la
+    consulta use el índice; las fechas inválidas se ignoran.
+    """
+    start = end = None
+    day = parse_date(date_from) if date_from else None
+    if day:
+        start = timezone.make_aware(datetime.combine(day, time.min))
+    day = parse_date(date_to) if date_to else None
+    if day:
+        end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
+
+
+def local_days(date_from, date_to):
+    """Fechas AAAA-MM-DD como date (días locales); las inválidas se ignoran"""
+    try:
+        return parse_date(date_from or ''), parse_date(date_to or '')
+    except ValueError:
+        return None, None
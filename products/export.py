@@ -0,0 +1,186 @@
+"""Exportación de productos, ventas e historial en CSV o JSONL.
+
+Las filas se leen con ``.iterator(chunk_size=...)`` y se escriben a medida
+que llegan, así que la memoria usada no depende del tamaño de la tabla y el
+primer bloque sale apenas se lee el primer lote. Lo usan la vista
+export_data (StreamingHttpResponse) y el comando ``export_data``.
+
+* products: una fila por producto.
+* sales: en CSV una fila por item con los datos de su venta; en JSONL un
+  objeto por venta con la lista de sus items.
+* history: una fila por registro; los cambios van como JSON.
+"""
+import csv
+import json
+import zlib
+from itertools import groupby
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import History, Product, SaleItem
+
+FORMATS = ('csv', 'jsonl')
+CHUNK_SIZE = 2000
+
+# Tamaño de los bloques que se envían; las filas se acumulan hasta llenarlo
+BUFFER_SIZE = 64 * 1024
+
+PRODUCT_COLUMNS = (
+    'id', 'sku', 'barcode', 'name', 'brand', 'category', 'gender', 'fragrance_type',
+    'volume', 'price', 'cost', 'quantity', 'min_stock', 'supplier', 'created_at', 'updated_at',
+)
+SALE_COLUMNS = ('sale_id', 'ticket_number', 'created_at', 'username', 'total')
+SALE_ITEM_COLUMNS = ('product_sku', 'product_name', 'product_brand', 'quantity', 'unit_price', 'subtotal')
+HISTORY_COLUMNS = ('id', 'timestamp', 'username', 'action', 'product_id', 'product_name', 'changes')
+
+
+class ExportError(Exception):
+    pass
+
+
+def _dump(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def product_rows(chunk_size=CHUNK_SIZE):
+    queryset = Product.objects.order_by('id').values_list(*PRODUCT_COLUMNS)
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(PRODUCT_COLUMNS, row))
+
+
+def _sale_item_rows(chunk_size, start=None, end=None, user_id=None):
+    queryset = SaleItem.objects.order_by('sale_id', 'id')
+    if start is not None:
+        queryset = queryset.filter(sale__created_at__gte=start)
+    if end is not None:
+        queryset = queryset.filter(sale__created_at__lt=end)
+    if user_id is not None:
+        queryset = queryset.filter(sale__user_id=user_id)
+    fields = ('sale_id', 'sale__ticket_number', 'sale__created_at', 'sale__user__username', 'sale__total')
+    columns = SALE_COLUMNS + SALE_ITEM_COLUMNS
+    for row in queryset.values_list(*fields, *SALE_ITEM_COLUMNS).iterator(chunk_size=chunk_size):
+        yield dict(zip(columns, row))
+
+
+def sale_rows(chunk_size=CHUNK_SIZE, **filters):
+    """Una fila por item vendido (CSV)"""
+    return _sale_item_rows(chunk_size, **filters)
+
+
+def sale_documents(chunk_size=CHUNK_SIZE, **filters):
+    """Un documento por venta con sus items (JSONL).
+
+    Los items llegan ordenados por venta, así que solo hace falta tener en
+    memoria los de la venta actual.
+    """
+    rows = _sale_item_rows(chunk_size, **filters)
+    for _, items in groupby(rows, key=lambda row: row['sale_id']):
+        items = list(items)
+        document = {column: items[0][column] for column in SALE_COLUMNS}
+        document['items'] = [{column: item[column] for column in SALE_ITEM_COLUMNS} for item in items]
+        yield document
+
+
+def history_rows(chunk_size=CHUNK_SIZE, start=None, end=None, user_id=None, action=None):
+    queryset = History.objects.between(start, end).order_by('id')
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    if action:
+        queryset = queryset.filter(action=action)
+    fields = ('id', 'timestamp', 'user__username', 'action', 'product_id', 'product_name', 'changes')
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield dict(zip(HISTORY_COLUMNS, row))
+
+
+# dataset -> (columnas CSV, filas CSV, documentos JSONL, filtros aceptados)
+DATASETS = {
+    'products': (PRODUCT_COLUMNS, product_rows, product_rows, ()),
+    'sales': (SALE_COLUMNS + SALE_ITEM_COLUMNS, sale_rows, sale_documents, ('start', 'end', 'user_id')),
+    'history': (HISTORY_COLUMNS, history_rows, history_rows, ('start', 'end', 'user_id', 'action')),
+}
+
+
+class _Line:
+    """Destino mínimo para csv.writer: devuelve la línea en lugar de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns, rows):
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            _dump(value) if isinstance(value, (dict, list)) else value
+            for value in (row[column] for column in columns)
+        ])
+
+
+def _jsonl_lines(documents):
+    for document in documents:
+        yield _dump(document) + '\n'
+
+
+def _buffered(lines, size=BUFFER_SIZE):
+    """Agrupa las líneas en bloques de bytes de ~``size``.
+
+    El encabezado sale solo en el primer bloque para que la descarga empiece
+    antes de leer el primer lote de filas.
+    """
+    buffer = []
+    length = 0
+    for index, line in enumerate(lines):
+        data = line.encode('utf-8')
+        buffer.append(data)
+        length += len(data)
+        if length >= size or index == 0:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: formato gzip
+    for index, chunk in enumerate(chunks):
+        data = compressor.compress(chunk)
+        if index == 0:
+            # Sin esto zlib retiene el encabezado hasta juntar más datos
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(dataset, fmt='csv', compress=False, chunk_size=CHUNK_SIZE, **filters):
+    """Genera el archivo exportado en bloques de bytes.
+
+    ``filters`` puede tener start, end (rango de fechas), user_id y action;
+    cada conjunto usa los que le corresponden e ignora el resto.
+    """
+    if dataset not in DATASETS:
+        raise ExportError(f'Conjunto desconocido: {dataset}. Opciones: {", ".join(DATASETS)}')
+    if fmt not in FORMATS:
+        raise ExportError(f'Formato desconocido: {fmt}. Opciones: {", ".join(FORMATS)}')
+
+    columns, rows, documents, accepted = DATASETS[dataset]
+    filters = {name: value for name, value in filters.items() if name in accepted}
+    if fmt == 'csv':
+        lines = _csv_lines(columns, rows(chunk_size=chunk_size, **filters))
+    else:
+        lines = _jsonl_lines(documents(chunk_size=chunk_size, **filters))
+
+    chunks = _buffered(lines)
+    return _gzipped(chunks) if compress else chunks
+
+
+def filename(dataset, fmt, compress=False):
+    return f'{dataset}.{fmt}' + ('.gz' if compress else '')
+
+
+def content_type(fmt, compress=False):
+    if compress:
+        return 'application/gzip'
+    return 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/x-ndjson; charset=utf-8'
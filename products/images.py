@@ -0,0 +1,164 @@
+"""Procesamiento de las imágenes de productos con Pillow.
+
+Al subir una imagen el original se gira según su orientación EXIF, se limita
+a ``PRODUCT_IMAGE_MAX_DIMENSION`` y se guarda sin metadatos EXIF. Después se
+generan miniaturas de los anchos de ``PRODUCT_IMAGE_VARIANT_WIDTHS`` en el
+formato del original (JPEG o PNG) y en WebP.
+
+Las variantes se nombran a partir del original, por ejemplo
+``products/foo.jpg`` -> ``products/variants/foo_320.webp``, así que no hace
+falta guardarlas en la base de datos.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+# Formatos que se conservan en el original y sus extensiones válidas
+EXTENSIONS = {
+    'JPEG': ('.jpg', '.jpeg'),
+    'PNG': ('.png',),
+    'WEBP': ('.webp',),
+}
+
+
+def max_dimension():
+    return getattr(settings, 'PRODUCT_IMAGE_MAX_DIMENSION', 1600)
+
+
+def variant_widths():
+    return tuple(getattr(settings, 'PRODUCT_IMAGE_VARIANT_WIDTHS', (320, 640)))
+
+
+def fallback_format(name):
+    """(formato de Pillow, extensión) de las miniaturas no WebP"""
+    if os.path.splitext(name)[1].lower() in ('.png', '.gif'):
+        return 'PNG', 'png'
+    return 'JPEG', 'jpg'
+
+
+def variant_name(name, width, ext):
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return f'{directory}/variants/{stem}_{width}.{ext}'.lstrip('/')
+
+
+def _encode(image, image_format):
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    elif image_format in ('PNG', 'WEBP') and image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+        image = image.convert('RGBA')
+
+    buffer = BytesIO()
+    options = {'optimize': True}
+    if image_format == 'JPEG':
+        options.update(quality=JPEG_QUALITY, progressive=True)
+    elif image_format == 'WEBP':
+        options = {'quality': WEBP_QUALITY, 'method': 6}
+    # Sin exif=: Pillow no copia los metadatos al guardar
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def _open(file):
+    image = Image.open(file)
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    return image
+
+
+def prepare_original(file, name):
+    """Retorna el original orientado, sin EXIF y limitado en tamaño, o None si no es una imagen"""
+    try:
+        file.seek(0)
+        image = _open(file)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    image_format = image.format if image.format in EXTENSIONS else fallback_format(name)[0]
+    stem, ext = os.path.splitext(name)
+    if ext.lower() not in EXTENSIONS[image_format]:
+        name = stem + EXTENSIONS[image_format][0]
+
+    limit = max_dimension()
+    image.thumbnail((limit, limit), Image.LANCZOS)
+    return ContentFile(_encode(image, image_format), name=name)
+
+
+def build_variants(name, storage, force=False):
+    """Genera las miniaturas de ``name``; retorna cuántos archivos escribió"""
+    pending = []
+    image_format, ext = fallback_format(name)
+    for width in variant_widths():
+        for variant_format, variant_ext in ((image_format, ext), ('WEBP', 'webp')):
+            target = variant_name(name, width, variant_ext)
+            if force or not storage.exists(target):
+                pending.append((width, variant_format, target))
+    if not pending:
+        return 0
+
+    with storage.open(name, 'rb') as source:
+        original = _open(source)
+
+    for width, variant_format, target in pending:
+        image = original.copy()
+        if image.width > width:
+            image.thumbnail((width, image.height), Image.LANCZOS)
+        content = ContentFile(_encode(image, variant_format))
+        if hasattr(storage, 'save_derived'):
+            # Almacenamiento por contenido: la variante conserva el nombre derivado
+            storage.save_derived(target, content)
+            continue
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, content)
+    return len(pending)
+
+
+def variant_urls(field_file):
+    """URLs para ``<picture>``: src y srcset del formato original y srcset WebP.
+
+    Retorna None si las variantes todavía no existen (imágenes subidas antes
+    de este proceso, hasta correr ``build_image_variants``).
+    """
+    if not field_file:
+        return None
+    storage, name = field_file.storage, field_file.name
+    widths = variant_widths()
+    ext = fallback_format(name)[1]
+    if not storage.exists(variant_name(name, widths[-1], 'webp')):
+        return None
+
+    def srcset(variant_ext):
+        return ', '.join(f'{storage.url(variant_name(name, width, variant_ext))} {width}w' for width in widths)
+
+    return {
+        'src': storage.url(variant_name(name, widths[0], ext)),
+        'srcset': srcset(ext),
+        'webp_srcset': srcset('webp'),
+    }
+
+
+@receiver(pre_save, sender='products.Product')
+def _prepare_upload(sender, instance, raw=False, **kwargs):
+    image = instance.image
+    instance._image_uploaded = bool(image) and not image._committed and not raw
+    if not instance._image_uploaded:
+        return
+    prepared = prepare_original(image.file, image.name)
+    if prepared is not None:
+        instance.image = prepared
+
+
+@receiver(post_save, sender='products.Product')
+def _build_upload_variants(sender, instance, **kwargs):
+    if getattr(instance, '_image_uploaded', False):
+        instance._image_uploaded = False
+        build_variants(instance.image.name, instance.image.storage, force=True)
@@ -0,0 +1,265 @@
+"""Importación masiva de productos desde CSV o JSONL.
+
+El archivo se lee fila por fila (también comprimido con gzip, como lo deja
+export.py) y cada fila se valida con los validadores de los campos de
+Product. Las filas válidas se guardan en lotes con
+``bulk_create(update_conflicts=True, unique_fields=['sku'])``: una sola
+sentencia crea los SKU nuevos y actualiza los existentes.
+
+Como bulk_create no dispara las señales del modelo, el historial se arma
+aquí comparando contra los valores actuales (una consulta por lote) y se
+escribe con ``audit.record_many``. Las filas con errores se informan con su
+número de línea y no detienen la importación.
+
+Una celda vacía se toma como "sin dato": en un producto nuevo deja el valor
+por defecto y en uno existente conserva el actual.
+"""
+import csv
+import gzip
+import io
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from . import audit, catalog_cache, scan
+from .models import Product
+
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 1000
+
+# Campos que se pueden importar; sku identifica el producto
+IMPORT_FIELDS = [
+    Product._meta.get_field(name) for name in (
+        'sku', 'name', 'brand', 'description', 'category', 'gender', 'fragrance_type',
+        'volume', 'price', 'cost', 'quantity', 'min_stock', 'barcode', 'supplier',
+    )
+]
+IMPORT_FIELD_NAMES = [field.name for field in IMPORT_FIELDS]
+REQUIRED_FIELDS = [field.name for field in IMPORT_FIELDS if not field.has_default() and not field.blank]
+UPDATE_FIELDS = [name for name in IMPORT_FIELD_NAMES if name != 'sku'] + ['updated_at']
+
+
+class ImportFileError(Exception):
+    """El archivo no se puede leer (formato o encabezado inválido)"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+
+    def add_error(self, line, sku, message):
+        self.errors.append({'line': line, 'sku': sku, 'message': message})
+
+    def __str__(self):
+        return (f'{self.created} creados, {self.updated} actualizados, '
+                f'{self.unchanged} sin cambios, {len(self.errors)} con errores')
+
+
+def detect_format(filename):
+    name = filename.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for fmt in FORMATS:
+        if name.endswith(f'.{fmt}'):
+            return fmt
+    if name.endswith('.json') or name.endswith('.ndjson'):
+        return 'jsonl'
+    raise ImportFileError('Formato no reconocido: usa un archivo .csv o .jsonl (opcionalmente .gz)')
+
+
+def _text(binary, compressed):
+    if compressed:
+        binary = gzip.GzipFile(fileobj=binary)
+    # utf-8-sig: las hojas de cálculo suelen guardar el CSV con BOM
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def read_rows(binary, fmt, compressed=False):
+    """Genera ``(número de línea, fila)`` leyendo el archivo de a una línea"""
+    text = _text(binary, compressed)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if not reader.fieldnames or 'sku' not in reader.fieldnames:
+            raise ImportFileError('El CSV debe tener encabezado con la columna sku')
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, e
+            continue
+        yield line_number, row if isinstance(row, dict) else ValueError('La línea no es un objeto JSON')
+
+
+def _is_empty(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def clean_row(row):
+    """Valores validados de la fila (solo las columnas con dato).
+
+    Lanza ValidationError con el detalle de todos los campos inválidos.
+    """
+    values = {}
+    errors = {}
+    for field in IMPORT_FIELDS:
+        raw = row.get(field.name)
+        if _is_empty(raw):
+            continue
+        if isinstance(raw, str):
+            raw = raw.strip()
+        try:
+            values[field.name] = field.clean(raw, None)
+        except ValidationError as e:
+            errors[field.name] = e.messages
+    if 'sku' not in values and 'sku' not in errors:
+        errors['sku'] = ['Este campo es obligatorio.']
+    if errors:
+        raise ValidationError(errors)
+    return values
+
+
+def _error_message(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{name}: {" ".join(messages)}' for name, messages in error.message_dict.items())
+    return ' '.join(getattr(error, 'messages', [str(error)]))
+
+
+class Importer:
+    """Aplica las filas de un archivo en lotes de ``batch_size``"""
+
+    def __init__(self, user=None, batch_size=BATCH_SIZE, dry_run=False):
+        self.user = user
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+
+    def run(self, rows):
+        rows = iter(rows)
+        with audit.acting_as(self.user):
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self._process(batch)
+        if not self.dry_run:
+            catalog_cache.invalidate_pages()
+            scan.clear_map()
+        return self.result
+
+    def _process(self, batch):
+        # sku -> (línea, valores); si un SKU se repite en el lote gana la última fila
+        cleaned = {}
+        for line, row in batch:
+            if isinstance(row, Exception):
+                self.result.add_error(line, '', str(row))
+                continue
+            try:
+                values = clean_row(row)
+            except ValidationError as e:
+                self.result.add_error(line, str(row.get('sku') or ''), _error_message(e))
+                continue
+            if values['sku'] in cleaned:
+                previous = cleaned[values['sku']][0]
+                self.result.add_error(previous, values['sku'], f'SKU repetido; se aplica la línea {line}')
+            cleaned[values['sku']] = (line, values)
+        if not cleaned:
+            return
+
+        existing = Product.objects.only('id', *IMPORT_FIELD_NAMES).in_bulk(list(cleaned), field_name='sku')
+        pending = []
+        for sku, (line, values) in cleaned.items():
+            current = existing.get(sku)
+            if current is None:
+                missing = [name for name in REQUIRED_FIELDS if name not in values]
+                if missing:
+                    self.result.add_error(line, sku, f'Faltan campos obligatorios: {", ".join(missing)}')
+                    continue
+                pending.append((line, None, Product(**values)))
+                continue
+
+            old = audit.snapshot(current)
+            merged = {name: getattr(current, name) for name in IMPORT_FIELD_NAMES}
+            merged.update(values)
+            # Instancia sin id: el upsert resuelve la fila por sku
+            product = Product(**merged)
+            product._import_pk = current.pk
+            if audit.diff(old, audit.snapshot(product)):
+                pending.append((line, old, product))
+            else:
+                self.result.unchanged += 1
+
+        if pending and not self.dry_run:
+            self._save(pending)
+        elif pending:
+            self._count(pending)
+
+    def _count(self, pending):
+        for _, old, _ in pending:
+            if old is None:
+                self.result.created += 1
+            else:
+                self.result.updated += 1
+
+    def _upsert(self, products):
+        Product.objects.bulk_create(
+            products,
+            update_conflicts=True,
+            unique_fields=['sku'],
+            update_fields=UPDATE_FIELDS,
+        )
+
+    def _save(self, pending):
+        try:
+            with transaction.atomic():
+                self._upsert([product for _, _, product in pending])
+                self._record(pending)
+        except DatabaseError:
+            # Se reintenta fila por fila para informar solo las que fallan
+            for item in pending:
+                line, _, product = item
+                try:
+                    with transaction.atomic():
+                        self._upsert([product])
+                        self._record([item])
+                except DatabaseError as e:
+                    self.result.add_error(line, product.sku, str(e))
+            return
+        self._count(pending)
+
+    def _record(self, pending):
+        for _, old, product in pending:
+            if old is not None:
+                product.pk = product._import_pk
+        created = [product for _, old, product in pending if old is None]
+        if created and any(product.pk is None for product in created):
+            # Backends que no devuelven el id en un upsert
+            ids = dict(Product.objects.filter(sku__in=[p.sku for p in created]).values_list('sku', 'id'))
+            for product in created:
+                product.pk = ids.get(product.sku)
+
+        entries = []
+        for _, old, product in pending:
+            current = audit.snapshot(product)
+            if old is None:
+                entries.append(audit.build_entry('CREATE', product, current))
+            else:
+                entries.append(audit.build_entry('UPDATE', product, audit.diff(old, current)))
+        audit.record_many(entries)
+
+
+def import_file(binary, filename, user=None, batch_size=BATCH_SIZE, dry_run=False):
+    """Importa un archivo abierto en modo binario; el formato sale del nombre"""
+    fmt = detect_format(filename)
+    rows = read_rows(binary, fmt, compressed=filename.lower().endswith('.gz'))
+    return Importer(user=user, batch_size=batch_size, dry_run=dry_run).run(rows)
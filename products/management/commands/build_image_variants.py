@@ -0,0 +1,54 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products import images
+from products.models import Product
+
+
+def _init_worker():
+    django.setup()
+    # La conexión heredada del proceso padre no se usa ni se cierra desde el hijo
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+
+
+def _build(name, force):
+    """Se ejecuta en un proceso del pool; sólo usa el almacenamiento, no la base de datos"""
+    storage = Product._meta.get_field('image').storage
+    return name, images.build_variants(name, storage, force=force)
+
+
+class Command(BaseCommand):
+    help = 'Genera las miniaturas y variantes WebP de las imágenes de productos existentes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Procesos en paralelo (por defecto, uno por CPU)')
+        parser.add_argument('--force', action='store_true',
+                            help='Regenera las variantes aunque ya existan')
+
+    def handle(self, *args, **options):
+        names = sorted(set(
+            Product.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True)
+        ))
+        if not names:
+            self.stdout.write('No hay imágenes de productos')
+            return
+
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=_init_worker) as pool:
+            futures = {pool.submit(_build, name, options['force']): name for name in names}
+            for future in as_completed(futures):
+                try:
+                    written += future.result()[1]
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names)} imágenes revisadas, {written} variantes generadas, {failed} con errores'
+        ))
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products import images
+from products.models import Product
+
+
+def _walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield f'{directory}/{name}'
+    for child in directories:
+        yield from _walk(storage, f'{directory}/{child}')
+
+
+class Command(BaseCommand):
+    help = 'Elimina las imágenes (y sus variantes) que ya no usa ningún producto'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Solo lista los archivos que se eliminarían')
+        parser.add_argument('--min-age-hours', type=float, default=24,
+                            help='No toca archivos más recientes (subidas cuyo producto aún no se guarda)')
+
+    def handle(self, *args, **options):
+        field = Product._meta.get_field('image')
+        storage = field.storage
+        root = str(field.upload_to).strip('/')
+
+        keep = set()
+        for name in Product.objects.exclude(image='').exclude(image__isnull=True).values_list('image', flat=True).iterator():
+            keep.add(name)
+            ext = images.fallback_format(name)[1]
+            for width in images.variant_widths():
+                keep.add(images.variant_name(name, width, ext))
+                keep.add(images.variant_name(name, width, 'webp'))
+
+        if not storage.exists(root):
+            self.stdout.write('No hay archivos de productos')
+            return
+
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        removed = freed = 0
+        for name in _walk(storage, root):
+            if name in keep or storage.get_modified_time(name) > cutoff:
+                continue
+            size = storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+            removed += 1
+            freed += size
+
+        verb = 'se eliminarían' if options['dry_run'] else 'eliminados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{removed} archivos {verb} ({freed / 1024 / 1024:.1f} MB)'
+        ))
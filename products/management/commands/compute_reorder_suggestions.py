@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from products import reorder
+
+
+class Command(BaseCommand):
+    help = 'Calcula el punto de reorden y la cantidad sugerida de cada producto según su velocidad de venta'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window-days', type=int, help='Días de ventas usados para la velocidad')
+        parser.add_argument('--lead-time-days', type=int, help='Días que tarda en llegar un pedido')
+        parser.add_argument('--safety-days', type=int, help='Días de venta que se guardan como reserva')
+        parser.add_argument('--cover-days', type=int, help='Días de venta que debe cubrir cada pedido')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Muestra las sugerencias sin guardar la tabla')
+
+    def handle(self, *args, **options):
+        policy = reorder.ReorderPolicy(
+            window_days=options['window_days'],
+            lead_time_days=options['lead_time_days'],
+            safety_days=options['safety_days'],
+            cover_days=options['cover_days'],
+        )
+        if options['dry_run']:
+            suggestions = reorder.compute(policy)
+        else:
+            suggestions = reorder.refresh(policy)
+
+        for supplier, rows, cost in reorder.by_supplier(suggestions):
+            self.stdout.write(f'{supplier or "Sin proveedor"}: {len(rows)} productos, ${cost}')
+            if options['dry_run']:
+                for row in rows:
+                    self.stdout.write(f'  {row.sku}: stock {row.quantity}, reorden {row.reorder_point}, pedir {row.suggested_quantity}')
+
+        pending = sum(1 for suggestion in suggestions if suggestion.needs_reorder)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(suggestions)} productos analizados, {pending} requieren pedido'
+        ))
@@ -0,0 +1,51 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products import export
+from products.dates import local_day_range
+
+
+class Command(BaseCommand):
+    help = 'Exporta productos, ventas o historial en CSV o JSONL sin cargar la tabla en memoria'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(export.DATASETS))
+        parser.add_argument('--format', dest='fmt', choices=export.FORMATS, default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Comprime la salida con gzip')
+        parser.add_argument('--output', '-o', default='-',
+                            help='Archivo de salida (por defecto, la salida estándar)')
+        parser.add_argument('--date-from', help='Desde este día (AAAA-MM-DD), ventas e historial')
+        parser.add_argument('--date-to', help='Hasta este día inclusive (AAAA-MM-DD), ventas e historial')
+        parser.add_argument('--user', type=int, help='Solo las ventas o cambios de este usuario (id)')
+        parser.add_argument('--action', choices=['CREATE', 'UPDATE', 'DELETE'], help='Acción del historial')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+                            help='Filas leídas de la base de datos por lote')
+
+    def handle(self, *args, **options):
+        try:
+            start, end = local_day_range(options['date_from'], options['date_to'])
+        except ValueError as e:
+            raise CommandError(f'Fecha inválida: {e}')
+
+        chunks = export.stream(
+            options['dataset'], options['fmt'], options['gzip'],
+            chunk_size=options['chunk_size'],
+            start=start, end=end, user_id=options['user'], action=options['action'],
+        )
+
+        if options['output'] == '-':
+            out = sys.stdout.buffer
+            for chunk in chunks:
+                out.write(chunk)
+            out.flush()
+            return
+
+        size = 0
+        with open(options['output'], 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+                size += len(chunk)
+        self.stderr.write(self.style.SUCCESS(
+            f'{options["output"]}: {size / 1024 / 1024:.1f} MB'
+        ))
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from products import importer
+
+
+class Command(BaseCommand):
+    help = 'Importa productos desde un CSV o JSONL (opcionalmente .gz), creando o actualizando por SKU'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo .csv, .jsonl, .csv.gz o .jsonl.gz')
+        parser.add_argument('--user', help='Usuario al que se atribuyen los cambios en el historial')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE,
+                            help='Filas por lote de inserción')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Valida el archivo y cuenta los cambios sin guardarlos')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'No existe el usuario {options["user"]}')
+        else:
+            self.stderr.write(self.style.WARNING('Sin --user los cambios no quedan en el historial'))
+
+        try:
+            with open(options['path'], 'rb') as f:
+                result = importer.import_file(
+                    f, options['path'], user=user,
+                    batch_size=options['batch_size'], dry_run=options['dry_run'],
+                )
+        except (OSError, importer.ImportFileError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors:
+            self.stderr.write(f'Línea {error["line"]} ({error["sku"] or "sin SKU"}): {error["message"]}')
+        prefix = 'Simulación: ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefix}{result}'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from products import rollup
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el resumen diario de ventas (SalesDaily) desde las ventas registradas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Desde este día (AAAA-MM-DD); por defecto, todo el historial')
+        parser.add_argument('--date-to', help='Hasta este día inclusive (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_date(options['date_from'] or '')
+            end = parse_date(options['date_to'] or '')
+        except ValueError as e:
+            raise CommandError(f'Fecha inválida: {e}')
+
+        written = rollup.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Resumen diario reconstruido ({written} filas)'))
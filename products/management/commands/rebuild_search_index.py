@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from products import search
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye los índices de búsqueda de texto completo (FTS5) de productos'
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError('La búsqueda de texto completo sólo está disponible con SQLite')
+
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de búsqueda reconstruido ({Product.objects.count()} productos)'
+        ))
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    from products import search
+    search.install(schema_editor.connection)
+    search.rebuild(schema_editor.connection)
+
+
+def drop_fts(apps, schema_editor):
+    from products import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_alter_product_cost_alter_product_min_stock_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:10
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.Case(models.When(cost__gt=django.db.models.expressions.RawSQL('0', []), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '-', models.F('cost')), '*', django.db.models.expressions.RawSQL('100.0', [])), '/', models.F('cost'))), default=django.db.models.expressions.RawSQL('0.0', []), output_field=models.FloatField()), models.F('id'), name='product_margin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(models.ExpressionWrapper(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('price'), '*', models.F('quantity')), '*', django.db.models.expressions.RawSQL('1.0', [])), output_field=models.FloatField()), models.F('id'), name='product_stock_value_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_computed_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True, verbose_name='Día')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='Último número asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Tickets',
+                'verbose_name_plural': 'Secuencias de Tickets',
+            },
+        ),
+    ]
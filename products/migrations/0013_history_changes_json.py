@@ -0,0 +1,61 @@
+import json
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _batches(History):
+    """Recorre el historial por rangos de id para no cargar toda la tabla"""
+    last_pk = 0
+    while True:
+        batch = list(History.objects.filter(pk__gt=last_pk).order_by('pk')[:BATCH_SIZE])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def text_to_json(apps, schema_editor):
+    History = apps.get_model('products', 'History')
+    for batch in _batches(History):
+        for history in batch:
+            try:
+                data = json.loads(history.changes) if history.changes else {}
+            except ValueError:
+                data = {}
+            history.changes_data = data if isinstance(data, dict) else {}
+        History.objects.bulk_update(batch, ['changes_data'])
+
+
+def json_to_text(apps, schema_editor):
+    History = apps.get_model('products', 'History')
+    for batch in _batches(History):
+        for history in batch:
+            history.changes = json.dumps(history.changes_data) if history.changes_data else ''
+        History.objects.bulk_update(batch, ['changes'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_history_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='history',
+            name='changes_data',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Cambios'),
+        ),
+        migrations.RunPython(text_to_json, json_to_text),
+        migrations.RemoveField(
+            model_name='history',
+            name='changes',
+        ),
+        migrations.RenameField(
+            model_name='history',
+            old_name='changes_data',
+            new_name='changes',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:26
+
+import django.db.models.expressions
+import django.db.models.functions.math
+import django.db.models.lookups
+import products.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_history_changes_json'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='history',
+            index=models.Index(django.db.models.functions.math.Abs(models.Case(models.When(django.db.models.lookups.GreaterThan(products.models.ChangeValue('price', 'old'), django.db.models.expressions.RawSQL('0', [])), then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(products.models.ChangeValue('price', 'new'), '-', products.models.ChangeValue('price', 'old')), '*', django.db.models.expressions.RawSQL('100.0', [])), '/', products.models.ChangeValue('price', 'old'))), default=None, output_field=models.FloatField())), models.F('timestamp'), name='history_price_change_idx'),
+        ),
+    ]
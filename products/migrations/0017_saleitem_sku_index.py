@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_salesdaily'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['product_sku', 'sale'], name='saleitem_sku_sale_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_saleitem_sku_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku', models.CharField(max_length=100, verbose_name='SKU')),
+                ('name', models.CharField(max_length=200, verbose_name='Nombre')),
+                ('supplier', models.CharField(blank=True, max_length=200, verbose_name='Proveedor')),
+                ('quantity', models.IntegerField(verbose_name='Stock al calcular')),
+                ('units_sold', models.IntegerField(verbose_name='Unidades vendidas en la ventana')),
+                ('velocity', models.DecimalField(decimal_places=3, max_digits=10, verbose_name='Unidades por día')),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, max_digits=10, null=True, verbose_name='Días de cobertura')),
+                ('reorder_point', models.IntegerField(verbose_name='Punto de reorden')),
+                ('suggested_quantity', models.IntegerField(verbose_name='Cantidad sugerida')),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Costo unitario')),
+                ('needs_reorder', models.BooleanField(verbose_name='Requiere pedido')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculado')),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reorder', to='products.product', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Sugerencia de Reabastecimiento',
+                'verbose_name_plural': 'Sugerencias de Reabastecimiento',
+                'indexes': [models.Index(fields=['needs_reorder', 'supplier', 'sku'], name='reorder_supplier_idx')],
+            },
+        ),
+    ]
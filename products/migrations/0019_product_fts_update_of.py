@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+def restrict_update_triggers(apps, schema_editor):
+    from products import search
+    search.reinstall_update_triggers(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_reordersuggestion'),
+    ]
+
+    operations = [
+        migrations.RunPython(restrict_update_triggers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_sales_daily(apps, schema_editor):
+    """Llena SalesDaily con las ventas existentes (igual que rollup.rebuild)"""
+    Sale = apps.get_model('products', 'Sale')
+    SaleItem = apps.get_model('products', 'SaleItem')
+    SalesDaily = apps.get_model('products', 'SalesDaily')
+    db = schema_editor.connection.alias
+    tz = timezone.get_current_timezone()
+
+    items = SaleItem.objects.using(db).annotate(day=TruncDate('sale__created_at', tzinfo=tz))
+    sales = Sale.objects.using(db).annotate(day=TruncDate('created_at', tzinfo=tz))
+
+    rows = [
+        SalesDaily(day=row['day'], user_id=row['sale__user_id'], product_sku=row['product_sku'],
+                   units=row['units'], revenue=row['revenue'], sales=row['sales'])
+        for row in items.values('day', 'sale__user_id', 'product_sku').annotate(
+            units=Sum('quantity'), revenue=Sum('subtotal'), sales=Count('sale_id', distinct=True),
+        ).order_by().iterator()
+    ]
+    units = {
+        (row['day'], row['sale__user_id']): row['units']
+        for row in items.values('day', 'sale__user_id').annotate(units=Sum('quantity')).order_by()
+    }
+    # Fila de total por vendedor y día (product_sku vacío)
+    rows.extend(
+        SalesDaily(day=row['day'], user_id=row['user_id'], product_sku='',
+                   units=units.get((row['day'], row['user_id']), 0), revenue=row['revenue'], sales=row['sales'])
+        for row in sales.values('day', 'user_id').annotate(revenue=Sum('total'), sales=Count('id')).order_by().iterator()
+    )
+
+    SalesDaily.objects.using(db).all().delete()
+    SalesDaily.objects.using(db).bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_product_updated_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_daily, migrations.RunPython.noop),
+    ]
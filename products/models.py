@@ -1,9 +1,110 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.core.validators import MinValueValidator
-import json
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Abs, Coalesce
+from django.db.models.lookups import GreaterThan
+from django.utils.functional import cached_property
+from decimal import Decimal
+from .images import variant_urls
+import re
+
+def _literal(sql):
+    """Constante SQL sin parámetros.
+
+    SQLite sólo usa un índice por expresión si la consulta repite la expresión
+    idéntica; un Value() se envía como parámetro y deja de coincidir con el
+    literal que queda escrito en el CREATE INDEX.
+    """
+    return RawSQL(sql, [])
+
+
+# Margen de ganancia en % sobre el costo; 0 cuando no hay costo registrado,
+# igual que Product.profit_margin. Se calcula como float para que los valores
+# se puedan comparar de forma exacta en la paginación por cursor.
+MARGIN_EXPRESSION = models.Case(
+    models.When(
+        cost__gt=_literal('0'),
+        then=(models.F('price') - models.F('cost')) * _literal('100.0') / models.F('cost'),
+    ),
+    default=_literal('0.0'),
+    output_field=models.FloatField(),
+)
+
+# Valor del inventario a precio de venta
+STOCK_VALUE_EXPRESSION = models.ExpressionWrapper(
+    models.F('price') * models.F('quantity') * _literal('1.0'),
+    output_field=models.FloatField(),
+)
+
+
+# Valor del inventario a costo y a precio de venta, como Decimal para sumar
+# montos exactos (STOCK_VALUE_EXPRESSION es float para el orden por cursor)
+STOCK_COST_EXPRESSION = models.ExpressionWrapper(
+    models.F('cost') * models.F('quantity'),
+    output_field=models.DecimalField(max_digits=14, decimal_places=2),
+)
+STOCK_RETAIL_EXPRESSION = models.ExpressionWrapper(
+    models.F('price') * models.F('quantity'),
+    output_field=models.DecimalField(max_digits=14, decimal_places=2),
+)
+
+# Igual que Product.is_low_stock
+LOW_STOCK_CONDITION = models.Q(quantity__lte=models.F('min_stock'))
+
+
+class ProductQuerySet(models.QuerySet):
+    def with_margin(self):
+        return self.annotate(margin_pct=MARGIN_EXPRESSION)
+
+    def with_stock_value(self):
+        return self.annotate(stock_value=STOCK_VALUE_EXPRESSION)
+
+    def with_valuation(self):
+        """Anota margin_pct, stock_cost, stock_retail y low_stock calculados en la base de datos"""
+        return self.with_margin().annotate(
+            stock_cost=STOCK_COST_EXPRESSION,
+            stock_retail=STOCK_RETAIL_EXPRESSION,
+            low_stock=models.ExpressionWrapper(LOW_STOCK_CONDITION, output_field=models.BooleanField()),
+        )
+
+    def low_stock(self):
+        return self.filter(LOW_STOCK_CONDITION)
+
+    def valuation(self):
+        """Totales del inventario con una sola consulta agregada.
+
+        Retorna products, units, cost_value, retail_value, low_stock y
+        out_of_stock, más potential_profit y margin_pct (margen ponderado por
+        el stock) calculados a partir de esos totales.
+        """
+        totals = self.aggregate(
+            products=models.Count('id'),
+            units=Coalesce(models.Sum('quantity'), 0),
+            cost_value=Coalesce(models.Sum(STOCK_COST_EXPRESSION), Decimal('0.00'), output_field=models.DecimalField()),
+            retail_value=Coalesce(models.Sum(STOCK_RETAIL_EXPRESSION), Decimal('0.00'), output_field=models.DecimalField()),
+            low_stock=models.Count('id', filter=LOW_STOCK_CONDITION),
+            out_of_stock=models.Count('id', filter=models.Q(quantity=0)),
+        )
+        totals['potential_profit'] = totals['retail_value'] - totals['cost_value']
+        totals['margin_pct'] = (
+            totals['potential_profit'] * 100 / totals['cost_value'] if totals['cost_value'] else Decimal('0')
+        )
+        return totals
+
+    def valuation_by(self, field):
+        """Totales del inventario agrupados por ``field`` (category, supplier...)"""
+        return self.order_by().values(field).annotate(
+            products=models.Count('id'),
+            units=Coalesce(models.Sum('quantity'), 0),
+            cost_value=models.Sum(STOCK_COST_EXPRESSION),
+            retail_value=models.Sum(STOCK_RETAIL_EXPRESSION),
+            low_stock=models.Count('id', filter=LOW_STOCK_CONDITION),
+        ).order_by('-retail_value', field)
+
 
 class Product(models.Model):
     CATEGORY_CHOICES = [
@@ -71,10 +172,31 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
         ordering = ['-created_at']
+        # Índices para los filtros y ordenamientos de product_list; el id final
+        # sirve de desempate para la paginación por cursor
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            models.Index(fields=['brand', 'id'], name='product_brand_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(fields=['quantity', 'id'], name='product_quantity_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], name='product_category_created_idx'),
+            models.Index(fields=['gender', 'created_at', 'id'], name='product_gender_created_idx'),
+            models.Index(fields=['fragrance_type', 'created_at', 'id'], name='product_fragrance_created_idx'),
+            models.Index(MARGIN_EXPRESSION, 'id', name='product_margin_idx'),
+            models.Index(STOCK_VALUE_EXPRESSION, 'id', name='product_stock_value_idx'),
+            # Búsqueda exacta del lector de códigos de barras (scan.py)
+            models.Index(fields=['barcode'], name='product_barcode_idx'),
+            # Agregado de la ETag del catálogo (conditional.py); quantity y min_stock
+            # lo cubren también con el filtro de stock bajo
+            models.Index(fields=['updated_at', 'quantity', 'min_stock'], name='product_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.brand} ({self.volume}ml)"
@@ -84,6 +206,11 @@ class Product(models.Model):
         """Verifica si el stock está bajo"""
         return self.quantity <= self.min_stock
 
+    @cached_property
+    def image_variants(self):
+        """URLs de las miniaturas de la imagen o None (ver products/images.py)"""
+        return variant_urls(self.image)
+
     @property
     def profit_margin(self):
         """Calcula el margen de ganancia"""
@@ -92,6 +219,74 @@ class Product(models.Model):
         return 0
 
 
+class ChangeValue(models.Func):
+    """Valor numérico anterior o nuevo de un campo dentro de History.changes.
+
+    La ruta JSON se escribe como literal (el nombre del campo se valida) para
+    que la expresión coincida con los índices que la usan.
+    """
+    template = "CAST(JSON_EXTRACT(%(expressions)s, '$.\"%(key)s\".\"%(side)s\"') AS REAL)"
+    output_field = models.FloatField()
+
+    def __init__(self, field, side, **extra):
+        if not re.fullmatch(r'[a-z_]+', field) or side not in ('old', 'new'):
+            raise ValueError(f'Campo de cambio inválido: {field}.{side}')
+        super().__init__(models.F('changes'), key=field, side=side, **extra)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="((%(expressions)s -> '%(key)s' ->> '%(side)s'))::double precision",
+            **extra_context,
+        )
+
+
+def change_pct(field):
+    """Variación porcentual de un campo numérico en un registro UPDATE (NULL si no aplica)"""
+    old, new = ChangeValue(field, 'old'), ChangeValue(field, 'new')
+    return models.Case(
+        models.When(GreaterThan(old, _literal('0')), then=(new - old) * _literal('100.0') / old),
+        default=None,
+        output_field=models.FloatField(),
+    )
+
+
+class HistoryQuerySet(models.QuerySet):
+    def between(self, start=None, end=None):
+        """Registros con timestamp en [start, end)"""
+        queryset = self
+        if start is not None:
+            queryset = queryset.filter(timestamp__gte=start)
+        if end is not None:
+            queryset = queryset.filter(timestamp__lt=end)
+        return queryset
+
+    def changed(self, field):
+        """Ediciones que modificaron ``field``"""
+        return self.filter(action='UPDATE', changes__has_key=field)
+
+    def with_change(self, field):
+        """Anota change_old, change_new y change_pct del campo numérico ``field``"""
+        return self.annotate(
+            change_old=ChangeValue(field, 'old'),
+            change_new=ChangeValue(field, 'new'),
+            change_pct=change_pct(field),
+        )
+
+    def changes_over(self, field, pct):
+        """Ediciones cuyo ``field`` subió o bajó al menos ``pct`` por ciento,
+        de la variación más grande a la más pequeña.
+
+        Ejemplo: History.objects.changes_over('price', 10).between(inicio, fin)
+
+        Sólo los registros UPDATE guardan pares old/new, así que el porcentaje
+        no es NULL únicamente en ellos y no hace falta filtrar por acción.
+        """
+        return self.alias(
+            change_abs_pct=Abs(change_pct(field))
+        ).filter(change_abs_pct__gte=pct).order_by('-change_abs_pct', '-timestamp').with_change(field)
+
+
 class History(models.Model):
     ACTION_CHOICES = [
         ('CREATE', 'Creación'),
@@ -103,24 +298,28 @@ class History(models.Model):
     product_id = models.IntegerField(verbose_name="ID del Producto")
     product_name = models.CharField(max_length=200, verbose_name="Nombre del Producto")
     action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="Acción")
-    changes = models.TextField(verbose_name="Cambios", blank=True)
+    changes = models.JSONField(verbose_name="Cambios", default=dict, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Fecha")
 
+    objects = HistoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Historial"
         verbose_name_plural = "Historiales"
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='history_timestamp_idx'),
+            models.Index(fields=['user', 'timestamp', 'id'], name='history_user_timestamp_idx'),
+            models.Index(fields=['action', 'timestamp', 'id'], name='history_action_timestamp_idx'),
+            # "cambios de precio de más de X%" se resuelve con un rango sobre este índice
+            models.Index(Abs(change_pct('price')), 'timestamp', name='history_price_change_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_action_display()} - {self.product_name}"
 
     def get_changes_dict(self):
-        if self.changes:
-            try:
-                return json.loads(self.changes)
-            except:
-                return {}
-        return {}
+        return self.changes if isinstance(self.changes, dict) else {}
 
 
 class UserProfile(models.Model):
@@ -147,6 +346,26 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 
+USER_OPTIONS_CACHE_KEY = 'products:user_options'
+
+
+def get_user_options():
+    """Lista compacta [{'id', 'username'}] para los filtros por usuario, cacheada"""
+    return cache.get_or_set(
+        USER_OPTIONS_CACHE_KEY,
+        lambda: list(User.objects.order_by('username').values('id', 'username')),
+        None,
+    )
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_options(sender, update_fields=None, **kwargs):
+    # Cada inicio de sesión guarda last_login; eso no cambia la lista
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    cache.delete(USER_OPTIONS_CACHE_KEY)
+
+
 class Sale(models.Model):
     """Modelo para registrar las ventas realizadas"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Usuario que realizó la venta")
@@ -158,15 +377,35 @@ class Sale(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='sale_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='sale_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"Venta #{self.ticket_number} - ${self.total}"
 
     def get_items_count(self):
         """Retorna el número total de items en la venta"""
+        # Con los items ya prefetcheados se suman en Python sin otra consulta
+        if 'items' in getattr(self, '_prefetched_objects_cache', {}):
+            return sum(item.quantity for item in self.items.all())
         return self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
 
 
+class TicketSequence(models.Model):
+    """Contador diario para los números de ticket de las ventas"""
+    day = models.DateField(unique=True, verbose_name="Día")
+    last_value = models.PositiveIntegerField(default=0, verbose_name="Último número asignado")
+
+    class Meta:
+        verbose_name = "Secuencia de Tickets"
+        verbose_name_plural = "Secuencias de Tickets"
+
+    def __str__(self):
+        return f"{self.day}: {self.last_value}"
+
+
 class SaleItem(models.Model):
     """Modelo para los items individuales de cada venta"""
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='items', verbose_name="Venta")
@@ -180,6 +419,77 @@ class SaleItem(models.Model):
     class Meta:
         verbose_name = "Item de Venta"
         verbose_name_plural = "Items de Venta"
+        indexes = [
+            # Ventas por SKU: el sale_id permite unir con Sale y filtrar por
+            # created_at sin recorrer toda la tabla de items (analytics.py)
+            models.Index(fields=['product_sku', 'sale'], name='saleitem_sku_sale_idx'),
+        ]
 
     def __str__(self):
         return f"{self.product_name} x{self.quantity}"
+
+
+class SalesDaily(models.Model):
+    """Totales de ventas por día, vendedor y SKU.
+
+    Se actualiza en la misma transacción que registra cada venta (rollup.py).
+    La fila con ``product_sku`` vacío guarda el total del vendedor en el día,
+    incluido el número de ventas, que no se puede sumar desde las filas por SKU.
+    """
+    TOTAL_SKU = ''
+
+    day = models.DateField(verbose_name="Día")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Vendedor")
+    product_sku = models.CharField(max_length=100, blank=True, verbose_name="SKU")
+    units = models.IntegerField(default=0, verbose_name="Unidades")
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name="Ingresos")
+    sales = models.IntegerField(default=0, verbose_name="Ventas")
+
+    class Meta:
+        verbose_name = "Resumen Diario de Ventas"
+        verbose_name_plural = "Resúmenes Diarios de Ventas"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'product_sku'], name='sales_daily_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['product_sku', 'day'], name='sales_daily_sku_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.product_sku or 'TOTAL'}: {self.units} u. ${self.revenue}"
+
+
+class ReorderSuggestion(models.Model):
+    """Punto de reorden y cantidad sugerida por producto (reorder.py).
+
+    La tabla se reescribe completa cada vez que corre el comando
+    ``compute_reorder_suggestions``; el reporte de stock bajo la lee tal cual.
+    """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='reorder', verbose_name="Producto")
+    sku = models.CharField(max_length=100, verbose_name="SKU")
+    name = models.CharField(max_length=200, verbose_name="Nombre")
+    supplier = models.CharField(max_length=200, blank=True, verbose_name="Proveedor")
+    quantity = models.IntegerField(verbose_name="Stock al calcular")
+    units_sold = models.IntegerField(verbose_name="Unidades vendidas en la ventana")
+    velocity = models.DecimalField(max_digits=10, decimal_places=3, verbose_name="Unidades por día")
+    days_of_cover = models.DecimalField(max_digits=10, decimal_places=1, null=True, blank=True, verbose_name="Días de cobertura")
+    reorder_point = models.IntegerField(verbose_name="Punto de reorden")
+    suggested_quantity = models.IntegerField(verbose_name="Cantidad sugerida")
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Costo unitario")
+    needs_reorder = models.BooleanField(verbose_name="Requiere pedido")
+    computed_at = models.DateTimeField(verbose_name="Calculado")
+
+    class Meta:
+        verbose_name = "Sugerencia de Reabastecimiento"
+        verbose_name_plural = "Sugerencias de Reabastecimiento"
+        indexes = [
+            models.Index(fields=['needs_reorder', 'supplier', 'sku'], name='reorder_supplier_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sku}: pedir {self.suggested_quantity}"
+
+    @property
+    def order_cost(self):
+        return self.unit_cost * self.suggested_quantity
+
@@ -0,0 +1,154 @@
+"""Paginación por cursor (keyset) para listados grandes.
+
+A diferencia de OFFSET, cada página se obtiene filtrando a partir de los
+valores de ordenamiento de la última fila vista, de modo que el costo de
+una página no crece con la posición dentro del listado.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """Conserva los microsegundos que DjangoJSONEncoder trunca a milisegundos"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, direction='next'):
+    """Codifica los valores de ordenamiento de una fila como cursor opaco"""
+    payload = json.dumps({'v': values, 'd': direction}, cls=CursorJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor; retorna (valores, dirección) o None si es inválido"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        values, direction = data['v'], data['d']
+    except (ValueError, KeyError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    if not isinstance(values, list) or direction not in ('next', 'prev'):
+        return None
+    return values, direction
+
+
+def get_page_size(request, default, maximum):
+    """Lee ?page_size= del request y lo limita al máximo configurado"""
+    try:
+        size = int(request.GET.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+class KeysetPage:
+    """Una página de resultados junto con los cursores de navegación"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+
+class KeysetPaginator:
+    """Pagina un queryset usando un ordenamiento determinista.
+
+    ``ordering`` es una secuencia de nombres de campo (con ``-`` para orden
+    descendente) cuyo último elemento debe ser único, normalmente ``id``,
+    para que el cursor identifique una posición exacta.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.descending = [field.startswith('-') for field in self.ordering]
+
+    def _seek_filter(self, values, backwards):
+        """Construye la condición (a, b, c) > (va, vb, vc) respetando direcciones"""
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            descending = self.descending[index] != backwards
+            lookup = 'lt' if descending else 'gt'
+            term = Q(**{f'{field}__{lookup}': values[index]})
+            for prev_index in range(index):
+                term &= Q(**{self.fields[prev_index]: values[prev_index]})
+            condition |= term
+        return condition
+
+    def _reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else f'-{field}' for field in self.ordering]
+
+    def _cursor_for(self, obj, direction):
+        return encode_cursor([getattr(obj, field) for field in self.fields], direction)
+
+    def get_page(self, cursor=None):
+        decoded = decode_cursor(cursor)
+        if decoded is not None and len(decoded[0]) != len(self.fields):
+            decoded = None
+
+        backwards = decoded is not None and decoded[1] == 'prev'
+        queryset = self.queryset.order_by(*(self._reversed_ordering() if backwards else self.ordering))
+
+        # Se pide una fila extra sólo para saber si hay más resultados
+        try:
+            if decoded is not None:
+                queryset = queryset.filter(self._seek_filter(decoded[0], backwards))
+            rows = list(queryset[:self.per_page + 1])
+        except (ValidationError, ValueError, TypeError):
+            # Cursor con valores que no corresponden al tipo del campo
+            if decoded is None:
+                raise
+            return self.get_page(None)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows)
+
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, decoded is not None
+
+        return KeysetPage(
+            rows,
+            next_cursor=self._cursor_for(rows[-1], 'next') if has_next else None,
+            previous_cursor=self._cursor_for(rows[0], 'prev') if has_previous else None,
+        )
@@ -0,0 +1,84 @@
+"""Caché del ticket y el detalle de las ventas.
+
+Una venta y sus items no cambian después de registrarse, así que el HTML del
+ticket y del detalle se renderiza una sola vez y se guarda sin expiración con
+la clave del id de la venta. Se descarta si la venta se elimina o si una
+venta nueva reutiliza el id (SQLite lo hace tras eliminar la última fila).
+
+La página completa incluye el usuario y el carrito de base.html, así que el
+navegador la revalida siempre con una ETag y una reimpresión responde 304.
+"""
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.safestring import mark_safe
+
+from .conditional import sale_etag
+from .models import Sale
+
+SALE_TEMPLATES = {
+    'ticket': 'products/sale_ticket_content.html',
+    'detail': 'products/sale_detail_content.html',
+}
+
+
+def sale_cache_key(kind, pk):
+    return f'sales:{kind}:{pk}'
+
+
+def render_sale(kind, pk):
+    """Retorna {'user_id', 'ticket_number', 'html'} de la venta, o None si no existe.
+
+    En un fallo de caché la venta se lee con su usuario e items prefetcheados;
+    el conteo de artículos se calcula en Python sobre esos items.
+    """
+    key = sale_cache_key(kind, pk)
+    rendered = cache.get(key)
+    if rendered is not None:
+        return rendered
+
+    sale = Sale.objects.select_related('user').prefetch_related('items').filter(pk=pk).first()
+    if sale is None:
+        return None
+
+    rendered = {
+        'user_id': sale.user_id,
+        'ticket_number': sale.ticket_number,
+        'html': render_to_string(SALE_TEMPLATES[kind], {'sale': sale}),
+    }
+    cache.set(key, rendered, None)
+    return rendered
+
+
+def sale_context(rendered):
+    return {'ticket_number': rendered['ticket_number'], 'sale_html': mark_safe(rendered['html'])}
+
+
+def sale_response(request, template, kind, pk, rendered):
+    """Página de la venta con ETag; 304 si el navegador ya la tiene"""
+    etag = sale_etag(request, kind, pk, rendered['ticket_number'])
+    response = None
+    if etag is not None:
+        etag = quote_etag(etag)
+        response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render(request, template, sale_context(rendered))
+    if etag is not None:
+        response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@receiver(post_delete, sender=Sale)
+def _discard_sale(sender, instance, **kwargs):
+    cache.delete_many([sale_cache_key(kind, instance.pk) for kind in SALE_TEMPLATES])
+
+
+@receiver(post_save, sender=Sale)
+def _discard_reused_id(sender, instance, created, **kwargs):
+    if not created:
+        return
+    cache.delete_many([sale_cache_key(kind, instance.pk) for kind in SALE_TEMPLATES])
@@ -0,0 +1,118 @@
+"""Sugerencias de reabastecimiento según la velocidad de venta.
+
+Para todos los SKU a la vez:
+
+1. Una consulta agrupada suma las unidades vendidas de cada SKU en la ventana
+   (``REORDER_WINDOW_DAYS``) sobre SaleItem unido a Sale por created_at.
+2. Una lectura de los productos trae stock, costo, proveedor y min_stock.
+3. En una sola pasada se calcula por producto:
+
+   * velocidad = unidades vendidas / días de la ventana
+   * punto de reorden = velocidad × (tiempo de entrega + días de seguridad),
+     nunca menor que ``min_stock``
+   * nivel objetivo = velocidad × (entrega + seguridad + cobertura), como
+     mínimo un producto por encima del punto de reorden
+   * cantidad sugerida = nivel objetivo - stock, si el stock llegó al punto
+     de reorden
+
+El resultado reemplaza la tabla ReorderSuggestion en una transacción.
+"""
+import math
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Product, ReorderSuggestion, SaleItem
+
+VELOCITY_PLACES = Decimal('0.001')
+COVER_PLACES = Decimal('0.1')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ReorderPolicy:
+    """Parámetros del cálculo; por defecto salen de settings"""
+
+    def __init__(self, window_days=None, lead_time_days=None, safety_days=None, cover_days=None):
+        self.window_days = window_days or _setting('REORDER_WINDOW_DAYS', 28)
+        self.lead_time_days = lead_time_days if lead_time_days is not None else _setting('REORDER_LEAD_TIME_DAYS', 7)
+        self.safety_days = safety_days if safety_days is not None else _setting('REORDER_SAFETY_DAYS', 3)
+        self.cover_days = cover_days if cover_days is not None else _setting('REORDER_COVER_DAYS', 30)
+
+    def reorder_point(self, velocity, min_stock):
+        return max(math.ceil(velocity * (self.lead_time_days + self.safety_days)), min_stock)
+
+    def order_up_to(self, velocity, reorder_point):
+        days = self.lead_time_days + self.safety_days + self.cover_days
+        return max(math.ceil(velocity * days), reorder_point + 1)
+
+
+def units_sold(window_days, today=None):
+    """{sku: unidades vendidas} de los últimos ``window_days`` días, en una consulta"""
+    today = today or timezone.localdate()
+    since = timezone.make_aware(datetime.combine(today - timedelta(days=window_days - 1), time.min))
+    return dict(
+        SaleItem.objects.filter(sale__created_at__gte=since)
+        .values('product_sku')
+        .annotate(units=Sum('quantity'))
+        .values_list('product_sku', 'units')
+    )
+
+
+def compute(policy=None, today=None):
+    """Lista de ReorderSuggestion sin guardar, una por producto"""
+    policy = policy or ReorderPolicy()
+    sold = units_sold(policy.window_days, today)
+    now = timezone.now()
+
+    suggestions = []
+    products = Product.objects.values_list('id', 'sku', 'name', 'supplier', 'quantity', 'min_stock', 'cost')
+    for pk, sku, name, supplier, quantity, min_stock, cost in products.iterator(chunk_size=2000):
+        units = sold.get(sku, 0)
+        velocity = units / policy.window_days
+        reorder_point = policy.reorder_point(velocity, min_stock)
+        needs_reorder = quantity <= reorder_point
+        suggested = max(policy.order_up_to(velocity, reorder_point) - quantity, 0) if needs_reorder else 0
+        suggestions.append(ReorderSuggestion(
+            product_id=pk,
+            sku=sku,
+            name=name,
+            supplier=supplier,
+            quantity=quantity,
+            units_sold=units,
+            velocity=Decimal(velocity).quantize(VELOCITY_PLACES),
+            days_of_cover=Decimal(quantity / velocity).quantize(COVER_PLACES) if velocity else None,
+            reorder_point=reorder_point,
+            suggested_quantity=suggested,
+            unit_cost=cost,
+            needs_reorder=needs_reorder,
+            computed_at=now,
+        ))
+    return suggestions
+
+
+def refresh(policy=None, today=None):
+    """Recalcula y reemplaza la tabla de sugerencias; retorna las sugerencias"""
+    suggestions = compute(policy, today)
+    with transaction.atomic():
+        ReorderSuggestion.objects.all().delete()
+        ReorderSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+    return suggestions
+
+
+def by_supplier(suggestions):
+    """[(proveedor, sugerencias, costo total)] de las que requieren pedido"""
+    groups = {}
+    for suggestion in suggestions:
+        if suggestion.needs_reorder:
+            groups.setdefault(suggestion.supplier, []).append(suggestion)
+    return [
+        (supplier, rows, sum((row.order_cost for row in rows), Decimal('0.00')))
+        for supplier, rows in sorted(groups.items())
+    ]
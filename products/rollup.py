@@ -0,0 +1,169 @@
+"""Resumen diario de ventas (SalesDaily).
+
+``add_sale`` suma una venta al resumen dentro de la transacción del checkout
+con dos consultas sin importar sus líneas: un INSERT que ignora las filas ya
+existentes del día y un UPDATE con CASE que suma unidades, ingresos y ventas.
+Eliminar una venta la resta con ``remove_sale``.
+
+Los reportes (totales de sale_list, tablero de ventas) leen de aquí, así que
+su costo depende de la cantidad de días del rango y no de la de ventas.
+``rebuild`` recalcula el resumen desde Sale y SaleItem.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Sale, SaleItem, SalesDaily
+
+TOTAL_SKU = SalesDaily.TOTAL_SKU
+
+ZERO = Decimal('0.00')
+
+
+def sale_day(sale):
+    return timezone.localdate(sale.created_at)
+
+
+def _sale_rows(sale, items, sign=1):
+    """{sku: (unidades, ingresos, ventas)} de una venta, con la fila de total"""
+    rows = defaultdict(lambda: [0, ZERO, 0])
+    for item in items:
+        row = rows[item.product_sku]
+        row[0] += sign * item.quantity
+        row[1] += sign * item.subtotal
+        row[2] = sign
+    rows[TOTAL_SKU] = [sum(row[0] for row in rows.values()), sign * sale.total, sign]
+    return rows
+
+
+def _apply(day, user_id, rows):
+    # Las filas que faltan se crean en cero (las existentes se ignoran) y luego
+    # se suman todas con un UPDATE: siempre dos consultas y sin carreras entre
+    # ventas simultáneas del mismo vendedor
+    SalesDaily.objects.bulk_create(
+        [SalesDaily(day=day, user_id=user_id, product_sku=sku) for sku in rows],
+        ignore_conflicts=True,
+    )
+
+    def delta(index, output_field):
+        return Case(
+            *[When(product_sku=sku, then=Value(row[index])) for sku, row in rows.items()],
+            output_field=output_field,
+        )
+    SalesDaily.objects.filter(day=day, user_id=user_id, product_sku__in=list(rows)).update(
+        units=F('units') + delta(0, IntegerField()),
+        revenue=F('revenue') + delta(1, DecimalField(max_digits=14, decimal_places=2)),
+        sales=F('sales') + delta(2, IntegerField()),
+    )
+
+
+def add_sale(sale, items):
+    """Suma ``sale`` (con sus ``items``) al resumen de su día"""
+    with transaction.atomic():
+        _apply(sale_day(sale), sale.user_id, _sale_rows(sale, items))
+
+
+def remove_sale(sale):
+    """Resta ``sale`` del resumen; las filas que quedan sin ventas se eliminan"""
+    day = sale_day(sale)
+    with transaction.atomic():
+        _apply(day, sale.user_id, _sale_rows(sale, sale.items.all(), sign=-1))
+        SalesDaily.objects.filter(day=day, user_id=sale.user_id, sales__lte=0).delete()
+
+
+@receiver(pre_delete, sender=Sale)
+def _remove_deleted_sale(sender, instance, **kwargs):
+    # Antes de borrar: los items se eliminan en cascada junto con la venta
+    remove_sale(instance)
+
+
+def _in_range(queryset, start=None, end=None, user_id=None):
+    """Filas de los días [start, end], ambos incluidos"""
+    if start is not None:
+        queryset = queryset.filter(day__gte=start)
+    if end is not None:
+        queryset = queryset.filter(day__lte=end)
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    return queryset
+
+
+def summary(start=None, end=None, user_id=None):
+    """Filas de total (una por vendedor y día) del rango"""
+    return _in_range(SalesDaily.objects.filter(product_sku=TOTAL_SKU), start, end, user_id)
+
+
+def totals(start=None, end=None, user_id=None):
+    """{'revenue', 'units', 'sales'} del rango en una sola consulta"""
+    return summary(start, end, user_id).aggregate(
+        revenue=Coalesce(Sum('revenue'), ZERO, output_field=DecimalField()),
+        units=Coalesce(Sum('units'), 0),
+        sales=Coalesce(Sum('sales'), 0),
+    )
+
+
+def by_day(start=None, end=None, user_id=None):
+    return summary(start, end, user_id).values('day').annotate(
+        revenue=Sum('revenue'), units=Sum('units'), sales=Sum('sales'),
+    ).order_by('day')
+
+
+def by_seller(start=None, end=None, user_id=None):
+    return summary(start, end, user_id).values('user_id', 'user__username').annotate(
+        revenue=Sum('revenue'), units=Sum('units'), sales=Sum('sales'),
+    ).order_by('-revenue')
+
+
+def by_sku(start=None, end=None, user_id=None):
+    queryset = _in_range(SalesDaily.objects.exclude(product_sku=TOTAL_SKU), start, end, user_id)
+    return queryset.values('product_sku').annotate(
+        revenue=Sum('revenue'), units=Sum('units'), sales=Sum('sales'),
+    ).order_by('-revenue')
+
+
+def rebuild(start=None, end=None):
+    """Recalcula el resumen de los días [start, end] desde Sale y SaleItem.
+
+    Retorna la cantidad de filas escritas. Se agrupa en la base de datos por
+    día local, vendedor y SKU, así que no se cargan las ventas en memoria.
+    """
+    tz = timezone.get_current_timezone()
+    items = SaleItem.objects.annotate(day=TruncDate('sale__created_at', tzinfo=tz))
+    sales = Sale.objects.annotate(day=TruncDate('created_at', tzinfo=tz))
+    if start is not None:
+        items, sales = items.filter(day__gte=start), sales.filter(day__gte=start)
+    if end is not None:
+        items, sales = items.filter(day__lte=end), sales.filter(day__lte=end)
+
+    per_sku = items.values('day', 'sale__user_id', 'product_sku').annotate(
+        units=Sum('quantity'), revenue=Sum('subtotal'), sales=Count('sale_id', distinct=True),
+    ).order_by()
+    units = dict(
+        ((row['day'], row['sale__user_id']), row['units'])
+        for row in items.values('day', 'sale__user_id').annotate(units=Sum('quantity')).order_by()
+    )
+    per_seller = sales.values('day', 'user_id').annotate(
+        revenue=Sum('total'), sales=Count('id'),
+    ).order_by()
+
+    rows = [
+        SalesDaily(day=row['day'], user_id=row['sale__user_id'], product_sku=row['product_sku'],
+                   units=row['units'], revenue=row['revenue'], sales=row['sales'])
+        for row in per_sku.iterator()
+    ]
+    rows.extend(
+        SalesDaily(day=row['day'], user_id=row['user_id'], product_sku=TOTAL_SKU,
+                   units=units.get((row['day'], row['user_id']), 0), revenue=row['revenue'], sales=row['sales'])
+        for row in per_seller.iterator()
+    )
+
+    with transaction.atomic():
+        _in_range(SalesDaily.objects.all(), start, end).delete()
+        SalesDaily.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,143 @@
+"""Búsqueda de productos por código escaneado.
+
+El lector de códigos de barras envía el código completo, así que basta una
+coincidencia exacta con ``barcode`` (índice product_barcode_idx) o ``sku``
+(único). Opcionalmente se mantiene en memoria un mapa código → id para que
+cada escaneo sea una sola consulta por clave primaria.
+
+Al guardar o eliminar un producto en este proceso sólo se actualizan sus
+códigos en el mapa, sin volver a cargarlo. Con varios procesos puede quedar
+desactualizado, por eso el producto obtenido por id se comprueba contra el
+código y, si ya no coincide, se olvida ese código y se vuelve a la consulta
+por índice. Un código que falta en el mapa también se busca por índice.
+"""
+import threading
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cart import CART_PRODUCT_FIELDS
+from .models import Product
+
+# Columnas que necesita el carrito para validar stock y mostrar la línea
+SCAN_PRODUCT_FIELDS = CART_PRODUCT_FIELDS + ('barcode',)
+
+_codes = None
+# id → (sku, barcode) con los que el producto está en _codes
+_product_codes = {}
+_lock = threading.Lock()
+
+
+def warm_map_enabled():
+    return getattr(settings, 'SCAN_WARM_MAP', True)
+
+
+def normalize_code(code):
+    return (code or '').strip()
+
+
+def _matches(product, code):
+    return product.barcode == code or product.sku == code
+
+
+def _load_codes():
+    codes = {}
+    barcodes = {}
+    product_codes = {}
+    for pk, sku, barcode in Product.objects.values_list('id', 'sku', 'barcode').iterator():
+        codes[sku] = pk
+        if barcode:
+            barcodes[barcode] = pk
+        product_codes[pk] = (sku, barcode)
+    # El código de barras tiene prioridad sobre un SKU igual
+    codes.update(barcodes)
+    return codes, product_codes
+
+
+def code_map():
+    """Mapa código → id, cargado la primera vez que se usa"""
+    global _codes, _product_codes
+    codes = _codes
+    if codes is None:
+        with _lock:
+            if _codes is None:
+                _codes, _product_codes = _load_codes()
+            codes = _codes
+    return codes
+
+
+def clear_map():
+    global _codes, _product_codes
+    with _lock:
+        _codes, _product_codes = None, {}
+
+
+def _remove_product(pk):
+    # Debe llamarse con _lock tomado
+    for code in _product_codes.pop(pk, ()):
+        if code and _codes.get(code) == pk:
+            del _codes[code]
+
+
+def update_product(pk, sku, barcode):
+    """Reemplaza en el mapa (si está cargado) los códigos del producto ``pk``"""
+    with _lock:
+        if _codes is None:
+            return
+        _remove_product(pk)
+        _codes.setdefault(sku, pk)
+        if barcode:
+            _codes[barcode] = pk
+        _product_codes[pk] = (sku, barcode)
+
+
+def remove_product(pk):
+    with _lock:
+        if _codes is not None:
+            _remove_product(pk)
+
+
+def forget_code(code):
+    """Quita un código desactualizado; la próxima búsqueda irá por índice"""
+    with _lock:
+        if _codes is not None:
+            _codes.pop(code, None)
+
+
+def find_by_code(code):
+    """Producto con ``barcode`` o ``sku`` igual a ``code``, o None"""
+    code = normalize_code(code)
+    if not code:
+        return None
+
+    products = Product.objects.only(*SCAN_PRODUCT_FIELDS)
+    if warm_map_enabled():
+        pk = code_map().get(code)
+        if pk is not None:
+            product = products.filter(pk=pk).first()
+            if product is not None and _matches(product, code):
+                return product
+            # Mapa desactualizado (cambio hecho en otro proceso)
+            forget_code(code)
+
+    candidates = list(products.filter(Q(barcode=code) | Q(sku=code))[:2])
+    for product in candidates:
+        if product.barcode == code:
+            return product
+    return candidates[0] if candidates else None
+
+
+@receiver(post_save, sender=Product)
+def _update_codes(sender, instance, **kwargs):
+    # Con sku o barcode diferidos el guardado no los cambió
+    data = instance.__dict__
+    if _codes is not None and 'sku' in data and 'barcode' in data:
+        update_product(instance.pk, data['sku'], data['barcode'])
+
+
+@receiver(post_delete, sender=Product)
+def _remove_codes(sender, instance, **kwargs):
+    if _codes is not None:
+        remove_product(instance.pk)
@@ -0,0 +1,173 @@
+"""Búsqueda de productos con índices de texto completo FTS5 de SQLite.
+
+Se mantienen dos tablas virtuales sincronizadas mediante triggers:
+
+* ``products_product_fts``: nombre, marca, descripción, SKU y código de
+  barras tokenizados por palabra, usada para resultados con ranking bm25.
+* ``products_product_code_fts``: SKU y código de barras con el tokenizador
+  ``trigram``, que permite coincidencias por subcadena usando el índice.
+
+En bases de datos distintas de SQLite se conserva la búsqueda con ``icontains``.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+TEXT_TABLE = 'products_product_fts'
+CODE_TABLE = 'products_product_code_fts'
+
+TEXT_COLUMNS = ('name', 'brand', 'description', 'sku', 'barcode')
+CODE_COLUMNS = ('sku', 'barcode')
+
+# El tokenizador trigram no encuentra términos de menos de tres caracteres
+TRIGRAM_MIN_LENGTH = 3
+
+
+def _index_sql(table, columns, tokenize):
+    cols = ', '.join(columns)
+    new_values = ', '.join(f'new.{c}' for c in columns)
+    old_values = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{cols}, content='products_product', content_rowid='id', tokenize='{tokenize}')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON products_product BEGIN "
+        f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON products_product BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        # Sólo al cambiar columnas indexadas: los descuentos de stock del checkout
+        # y las importaciones de existencias no reescriben el índice
+        f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} ON products_product BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def is_supported(conn=None):
+    return (conn or connection).vendor == 'sqlite'
+
+
+def install(conn=None):
+    """Crea (si no existen) las tablas FTS5 y sus triggers. Es idempotente.
+
+    Retorna True si hubo que crear algo, en cuyo caso el índice debe
+    reconstruirse para reflejar los productos existentes.
+    """
+    conn = conn or connection
+    if not is_supported(conn):
+        return False
+    statements = (
+        _index_sql(TEXT_TABLE, TEXT_COLUMNS, 'unicode61 remove_diacritics 2')
+        + _index_sql(CODE_TABLE, CODE_COLUMNS, 'trigram')
+    )
+    names = [
+        f'{table}{suffix}'
+        for table in (TEXT_TABLE, CODE_TABLE)
+        for suffix in ('', '_ai', '_ad', '_au')
+    ]
+    with conn.cursor() as cursor:
+        cursor.execute(
+            'SELECT count(*) FROM sqlite_master WHERE name IN (%s)' % ', '.join(['%s'] * len(names)),
+            names,
+        )
+        existing = cursor.fetchone()[0]
+        for statement in statements:
+            cursor.execute(statement)
+    return existing < len(names)
+
+
+def uninstall(conn=None):
+    conn = conn or connection
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for table in (TEXT_TABLE, CODE_TABLE):
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+def reinstall_update_triggers(conn=None):
+    """Reemplaza los triggers de UPDATE por los actuales (CREATE IF NOT EXISTS no los cambia)"""
+    conn = conn or connection
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        for table in (TEXT_TABLE, CODE_TABLE):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {table}_au')
+    install(conn)
+
+
+def rebuild(conn=None):
+    """Reconstruye ambos índices a partir de la tabla de productos"""
+    conn = conn or connection
+    if not is_supported(conn):
+        return
+    install(conn)
+    with conn.cursor() as cursor:
+        for table in (TEXT_TABLE, CODE_TABLE):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_text_query(text):
+    """Convierte el texto del buscador en una consulta FTS5 por prefijos.
+
+    Cada palabra se busca como prefijo y todas deben aparecer, de modo que
+    "dior sauv" encuentra "Sauvage" de "Dior".
+    """
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'{_quote(term)}*' for term in terms)
+
+
+def search_products(queryset, text):
+    """Filtra ``queryset`` por ``text`` y anota ``search_rank`` (menor es mejor).
+
+    Las coincidencias en el índice de texto se ordenan por bm25; las que sólo
+    coinciden por subcadena en SKU o código de barras quedan después.
+    """
+    text = text.strip()
+    if not text:
+        return queryset
+
+    if not is_supported():
+        return queryset.filter(
+            Q(name__icontains=text) |
+            Q(brand__icontains=text) |
+            Q(sku__icontains=text) |
+            Q(barcode__icontains=text) |
+            Q(description__icontains=text)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    condition = Q()
+    rank = Value(0.0, output_field=FloatField())
+
+    text_query = build_text_query(text)
+    if text_query:
+        condition |= Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {TEXT_TABLE} WHERE {TEXT_TABLE} MATCH %s', [text_query]
+        ))
+        rank = Coalesce(
+            RawSQL(
+                f'SELECT bm25({TEXT_TABLE}) FROM {TEXT_TABLE} '
+                f'WHERE {TEXT_TABLE} MATCH %s AND rowid = products_product.id',
+                [text_query],
+                output_field=FloatField(),
+            ),
+            Value(0.0, output_field=FloatField()),
+        )
+
+    # Subcadena en SKU y código de barras
+    if len(text) >= TRIGRAM_MIN_LENGTH:
+        condition |= Q(pk__in=RawSQL(
+            f'SELECT rowid FROM {CODE_TABLE} WHERE {CODE_TABLE} MATCH %s', [_quote(text)]
+        ))
+    else:
+        condition |= Q(sku__icontains=text) | Q(barcode__icontains=text)
+
+    return queryset.filter(condition).annotate(search_rank=rank)
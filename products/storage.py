@@ -0,0 +1,104 @@
+"""Almacenamiento de archivos direccionado por contenido.
+
+Cada archivo subido se guarda con el SHA-256 de su contenido como nombre
+(``products/ab/abcdef....jpg``). Dos subidas idénticas terminan en el mismo
+archivo, así que la misma foto usada en varios SKU se guarda una sola vez, y
+como el contenido de una URL nunca cambia se puede servir con caché de larga
+duración.
+
+El contenido se copia a un archivo temporal por bloques mientras se calcula
+el hash, de modo que una subida grande nunca se carga completa en memoria.
+"""
+import hashlib
+import os
+import re
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.cache import patch_cache_control
+from django.views.static import serve
+
+# Nombres generados por este almacenamiento y las variantes derivadas de ellos
+ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{64}(_\d+)?\.\w+$')
+
+# Un año: la URL de un archivo direccionado nunca cambia de contenido
+MAX_AGE = 60 * 60 * 24 * 365
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage que nombra los archivos por el hash de su contenido"""
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre definitivo se decide en _save a partir del contenido
+        return name
+
+    def addressed_name(self, name, digest):
+        directory = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest + ext).replace('\\', '/')
+
+    def _save(self, name, content):
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp.write(chunk)
+
+            final_name = self.addressed_name(name, digest.hexdigest())
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                # Contenido repetido: se reutiliza el archivo existente. Se
+                # actualiza su fecha para que collect_media_garbage no lo
+                # borre si estaba huérfano antes de que se guarde el producto
+                os.utime(final_path)
+                return final_name
+
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            try:
+                file_move_safe(temp_path, final_path, allow_overwrite=False)
+            except FileExistsError:
+                # Otro proceso guardó el mismo contenido al mismo tiempo
+                os.utime(final_path)
+            return final_name
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def save_derived(self, name, content):
+        """Guarda ``content`` exactamente en ``name`` (variantes de un archivo direccionado)"""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.derived-')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+    """django.views.static.serve con caché de larga duración para archivos direccionados.
+
+    En producción el servidor web debe servir MEDIA_ROOT con los mismos
+    encabezados para las rutas con nombre de hash.
+    """
+    response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+    if response.status_code == 200 and ADDRESSED_NAME.search(path):
+        patch_cache_control(response, public=True, max_age=MAX_AGE, immutable=True)
+    return response
@@ -1,4 +1,4 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from decimal import Decimal
@@ -417,7 +417,7 @@ class CartViewsTest(TestCase):
         # Verificar nueva cantidad
         session = self.client.session
         cart = session.get('cart', {})
-        self.assertEqual(cart[str(self.product.pk)]['quantity'], 3)
+        self.assertEqual(cart[str(self.product.pk)][0], 3)
 
     def test_cart_remove(self):
         """Test de eliminar producto del carrito"""
@@ -666,3 +666,1965 @@ class URLTest(TestCase):
             # Verificar que no da error 404
             self.assertNotEqual(response.status_code, 404,
                               f"URL {url_name} returned 404")
+
+
+class ProductListPaginationTest(TestCase):
+    """Tests para la paginación por cursor del catálogo"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        for i in range(7):
+            Product.objects.create(
+                name=f'Paged {i}',
+                brand='Brand',
+                description='Desc',
+                price=Decimal('10.00') + i % 3,
+                quantity=10,
+                sku=f'PAGE-{i:03d}'
+            )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _walk(self, params):
+        """Recorre todas las páginas siguiendo el cursor siguiente"""
+        seen = []
+        cursor = None
+        while True:
+            query = dict(params, page_size=3)
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get(reverse('product_list'), query)
+            page = response.context['page']
+            self.assertLessEqual(len(page), 3)
+            seen.extend(p.sku for p in page)
+            if not page.has_next:
+                return seen, page
+            cursor = page.next_cursor
+
+    def test_pages_cover_catalog_without_duplicates(self):
+        """Test que las páginas recorren todo el catálogo una sola vez"""
+        seen, _ = self._walk({})
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_pagination_with_non_unique_sort(self):
+        """Test que el desempate por id mantiene el orden con precios repetidos"""
+        seen, _ = self._walk({'order_by': '-price'})
+        expected = list(Product.objects.order_by('-price', '-id').values_list('sku', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        """Test que el cursor anterior regresa a la página previa"""
+        first = self.client.get(reverse('product_list'), {'page_size': 3}).context['page']
+        second = self.client.get(reverse('product_list'), {'page_size': 3, 'cursor': first.next_cursor}).context['page']
+        back = self.client.get(reverse('product_list'), {'page_size': 3, 'cursor': second.previous_cursor}).context['page']
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+        self.assertFalse(back.has_previous)
+
+    def test_invalid_cursor_shows_first_page(self):
+        """Test que un cursor inválido muestra la primera página"""
+        from .pagination import encode_cursor
+        response = self.client.get(reverse('product_list'), {'cursor': 'basura!!'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('product_list'), {'cursor': encode_cursor(['no-es-fecha', 'x'])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page']), 7)
+
+    def test_list_defers_description(self):
+        """Test que el listado no carga la descripción"""
+        response = self.client.get(reverse('product_list'))
+        product = response.context['page'][0]
+        self.assertIn('description', product.get_deferred_fields())
+
+
+class ProductSearchTest(TestCase):
+    """Tests para la búsqueda de texto completo"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.sauvage = Product.objects.create(
+            name='Sauvage',
+            brand='Dior',
+            description='Fragancia fresca y especiada',
+            price=Decimal('120.00'),
+            quantity=10,
+            sku='DIOR-SAU-100',
+            barcode='3348901250153'
+        )
+        self.bleu = Product.objects.create(
+            name='Bleu',
+            brand='Chanel',
+            description='Notas amaderadas, inspirada en Dior Sauvage',
+            price=Decimal('130.00'),
+            quantity=10,
+            sku='CHA-BLEU-100',
+            barcode='3145891073607'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _search(self, text, **params):
+        response = self.client.get(reverse('product_list'), dict(params, search=text))
+        return [p.pk for p in response.context['page']]
+
+    def test_search_by_prefix_ranked(self):
+        """Test que la búsqueda por prefijo ordena por relevancia"""
+        results = self._search('sauv dior')
+        self.assertEqual(results, [self.sauvage.pk, self.bleu.pk])
+
+    def test_search_ignores_accents(self):
+        """Test que la búsqueda ignora acentos"""
+        self.assertEqual(self._search('amaderadás'), [self.bleu.pk])
+
+    def test_search_by_sku_and_barcode_substring(self):
+        """Test que SKU y código de barras se buscan por subcadena"""
+        self.assertEqual(self._search('IOR-SA'), [self.sauvage.pk])
+        self.assertEqual(self._search('89107'), [self.bleu.pk])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test que el índice se mantiene al editar y eliminar"""
+        self.sauvage.name = 'Eau Sauvage'
+        self.sauvage.brand = 'Christian'
+        self.sauvage.description = 'Clásico'
+        self.sauvage.save()
+        self.assertEqual(self._search('christian'), [self.sauvage.pk])
+        self.sauvage.delete()
+        self.assertEqual(self._search('christian'), [])
+
+    def test_search_with_explicit_order(self):
+        """Test que un orden explícito reemplaza la relevancia"""
+        self.assertEqual(self._search('dior', order_by='-price'), [self.bleu.pk, self.sauvage.pk])
+
+    def test_rebuild_command(self):
+        """Test del comando que reconstruye el índice"""
+        from io import StringIO
+        from django.core.management import call_command
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self._search('chanel'), [self.bleu.pk])
+
+    def test_stock_updates_do_not_fire_index_triggers(self):
+        """Test que los triggers de UPDATE sólo se disparan por columnas indexadas"""
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%%_au'")
+            triggers = [row[0] for row in cursor.fetchall()]
+        self.assertEqual(len(triggers), 2)
+        for sql in triggers:
+            self.assertIn('AFTER UPDATE OF', sql)
+            self.assertNotIn('quantity', sql)
+
+        from django.db.models import F
+        Product.objects.filter(pk=self.sauvage.pk).update(quantity=F('quantity') - 1)
+        self.assertEqual(self._search('sauv dior'), [self.sauvage.pk, self.bleu.pk])
+
+
+class ProductQueryPlanTest(TestCase):
+    """Verifica con EXPLAIN QUERY PLAN que el catálogo no recorre toda la tabla"""
+
+    FILTERS = [
+        {},
+        {'category': 'EDP'},
+        {'gender': 'F'},
+        {'fragrance': 'WOODY'},
+        {'price_min': '10', 'price_max': '50'},
+        {'quantity_min': '5'},
+        {'low_stock': 'true'},
+        {'category': 'EDP', 'gender': 'F'},
+        {'search': 'dior'},
+        {'search': 'SAU-100'},
+    ]
+
+    ORDERS = ['', 'desconocido']
+
+    # Combinaciones filtro de igualdad + orden por fecha que deben leerse
+    # en el orden del índice, sin ordenar en memoria
+    INDEX_ORDERED = [{'category': 'EDP'}, {'gender': 'F'}, {'fragrance': 'WOODY'}]
+
+    def setUp(self):
+        from .views import PRODUCT_SORTS
+        self.orders = self.ORDERS + list(PRODUCT_SORTS)
+
+    def _plan(self, params):
+        from .views import filter_products, sort_products, PRODUCT_CARD_FIELDS
+        products = filter_products(params, Product.objects.only(*PRODUCT_CARD_FIELDS))
+        products, ordering = sort_products(products, params)
+        return products.order_by(*ordering)[:25].explain()
+
+    def assertNoFullScan(self, params, plan):
+        for line in plan.splitlines():
+            detail = line.split(' ', 3)[-1]
+            if detail == 'SCAN products_product':
+                self.fail(f'Recorrido completo de products_product con {params}:\n{plan}')
+
+    def test_filters_and_orders_use_indexes(self):
+        """Test que cada combinación estándar usa un índice"""
+        for filters in self.FILTERS:
+            for order_by in self.orders:
+                params = dict(filters, order_by=order_by) if order_by else filters
+                with self.subTest(params=params):
+                    self.assertNoFullScan(params, self._plan(params))
+
+    def test_equality_filters_read_in_index_order(self):
+        """Test que filtrar por categoría, género o fragancia no ordena en memoria"""
+        for filters in self.INDEX_ORDERED:
+            for order_by in ('-created_at', 'created_at'):
+                params = dict(filters, order_by=order_by)
+                with self.subTest(params=params):
+                    plan = self._plan(params)
+                    self.assertNoFullScan(params, plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_catalog_etag_aggregate_uses_indexes(self):
+        """Test que el agregado de la ETag del catálogo no recorre toda la tabla de productos"""
+        from django.db import connection
+        from django.db.models import Count, Max
+        from django.test.utils import CaptureQueriesContext
+        from .conditional import catalog_changes
+
+        for filters in self.FILTERS + [{'cursor': 'x'}, {'cursor': 'x', 'category': 'EDP'}]:
+            with self.subTest(params=filters):
+                with CaptureQueriesContext(connection) as queries:
+                    catalog_changes(filters).aggregate(last=Max('updated_at'), count=Count('id'))
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+                    plan = '\n'.join(f'{row[0]} {row[1]} {row[2]} {row[3]}' for row in cursor.fetchall())
+                self.assertNoFullScan(filters, plan)
+
+    def test_harness_detects_full_scan(self):
+        """Test que el verificador detecta un ordenamiento sin índice"""
+        plan = Product.objects.order_by('description').explain()
+        with self.assertRaises(AssertionError):
+            self.assertNoFullScan({'order_by': 'description'}, plan)
+
+
+class ProductSortTest(TestCase):
+    """Tests para los ordenamientos declarados del catálogo"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        # (precio, costo, cantidad) con márgenes repetidos para probar el desempate
+        data = [('100.00', '50.00', 1), ('30.00', '10.00', 2), ('99.99', '0', 3),
+                ('60.00', '30.00', 4), ('15.50', '10.00', 5), ('12.00', '4.00', 6)]
+        for i, (price, cost, quantity) in enumerate(data):
+            Product.objects.create(
+                name=f'Sort {i}',
+                brand='Brand',
+                description='Desc',
+                price=Decimal(price),
+                cost=Decimal(cost),
+                quantity=quantity,
+                sku=f'SORT-{i:03d}'
+            )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _walk(self, order_by):
+        seen = []
+        params = {'order_by': order_by, 'page_size': 2}
+        while True:
+            page = self.client.get(reverse('product_list'), params).context['page']
+            seen.extend(page)
+            if not page.has_next:
+                return seen
+            params['cursor'] = page.next_cursor
+
+    def test_margin_sort_matches_profit_margin(self):
+        """Test que el orden por margen coincide con profit_margin"""
+        products = self._walk('-margin')
+        expected = sorted(Product.objects.all(), key=lambda p: (-p.profit_margin, -p.pk))
+        self.assertEqual([p.pk for p in products], [p.pk for p in expected])
+        self.assertAlmostEqual(products[0].margin_pct, 200.0)
+
+    def test_stock_value_sort(self):
+        """Test del orden por valor en stock"""
+        products = self._walk('stock_value')
+        values = [p.price * p.quantity for p in products]
+        self.assertEqual(values, sorted(values))
+        self.assertEqual(len(products), 6)
+
+    def test_unknown_sort_falls_back_to_default(self):
+        """Test que una clave desconocida usa el orden predeterminado"""
+        for order_by in ('description', 'user__password', '-??'):
+            response = self.client.get(reverse('product_list'), {'order_by': order_by})
+            self.assertEqual(response.status_code, 200)
+            expected = list(Product.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+            self.assertEqual([p.pk for p in response.context['page']], expected)
+
+    def test_sort_select_shows_applied_order(self):
+        """Test que el selector marca el orden aplicado y sólo ofrece relevancia al buscar"""
+        response = self.client.get(reverse('product_list'))
+        self.assertNotContains(response, 'Relevancia')
+        self.assertContains(response, '<option value="-created_at" selected>', html=False)
+
+        response = self.client.get(reverse('product_list'), {'search': 'Sort'})
+        self.assertContains(response, '<option value="" selected>Relevancia</option>', html=True)
+
+        response = self.client.get(reverse('product_list'), {'search': 'Sort', 'order_by': 'price'})
+        self.assertEqual(response.context['current_sort'], 'price')
+
+
+class CheckoutTest(TestCase):
+    """Tests para el procesamiento atómico de ventas"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.products = [
+            Product.objects.create(
+                name=f'Checkout {i}',
+                brand='Brand',
+                description='Desc',
+                price=Decimal('10.00') * (i + 1),
+                quantity=5,
+                sku=f'CHK-{i:03d}'
+            )
+            for i in range(6)
+        ]
+
+    def _cart(self, products, quantity=2):
+        return {
+            str(p.pk): {'name': p.name, 'brand': p.brand, 'sku': p.sku, 'price': float(p.price), 'quantity': quantity}
+            for p in products
+        }
+
+    def test_process_sale_creates_items_and_reduces_stock(self):
+        """Test que la venta crea los items, el total y descuenta stock"""
+        from .checkout import process_sale
+        sale = process_sale(self.user, self._cart(self.products[:2]))
+        self.assertEqual(sale.total, Decimal('60.00'))
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(sale.get_items_count(), 4)
+        for product in self.products[:2]:
+            product.refresh_from_db()
+            self.assertEqual(product.quantity, 3)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        """Test que el número de consultas es fijo"""
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from . import checkout
+        with mock.patch.object(checkout, 'next_ticket_number', side_effect=['T-1', 'T-2']):
+            with CaptureQueriesContext(connection) as small:
+                checkout.process_sale(self.user, self._cart(self.products[:1], quantity=1))
+            with CaptureQueriesContext(connection) as large:
+                checkout.process_sale(self.user, self._cart(self.products[1:], quantity=1))
+        self.assertEqual(len(small), len(large))
+
+    def test_insufficient_stock_rolls_back(self):
+        """Test que sin stock suficiente no se guarda nada"""
+        from .checkout import CheckoutError, process_sale
+        cart = self._cart(self.products[:2])
+        cart[str(self.products[1].pk)]['quantity'] = 6
+        with self.assertRaises(CheckoutError):
+            process_sale(self.user, cart)
+        self.assertFalse(Sale.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 5)
+
+    def test_concurrent_sale_never_oversells(self):
+        """Test que si otra terminal vende primero, el descuento condicional falla"""
+        from unittest import mock
+        from . import checkout
+        stale = checkout._lock_products([self.products[0].pk])
+        # Otra terminal vende 4 unidades después de que leímos el stock
+        Product.objects.filter(pk=self.products[0].pk).update(quantity=1)
+        with mock.patch.object(checkout, '_lock_products', return_value=stale):
+            with self.assertRaises(checkout.CheckoutError):
+                checkout.process_sale(self.user, self._cart(self.products[:1], quantity=2))
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 1)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_deleted_product_is_reported(self):
+        """Test que un producto eliminado cancela la venta"""
+        from .checkout import CheckoutError, process_sale
+        cart = self._cart(self.products[:2])
+        self.products[1].delete()
+        with self.assertRaisesMessage(CheckoutError, 'Producto no encontrado'):
+            process_sale(self.user, cart)
+
+
+class TicketSequenceTest(TransactionTestCase):
+    """Tests para la asignación de números de ticket"""
+
+    def test_format_and_daily_counter(self):
+        """Test del formato y del contador por día"""
+        from datetime import date
+        from .tickets import format_ticket_number, reserve
+        self.assertEqual(format_ticket_number(date(2025, 1, 2), 7), 'TICKET-20250102-000007')
+        self.assertEqual(list(reserve(date(2025, 1, 2))), [1])
+        self.assertEqual(list(reserve(date(2025, 1, 2), 3)), [2, 3, 4])
+        self.assertEqual(list(reserve(date(2025, 1, 3))), [1])
+
+    def _hammer(self, allocator, threads=8, per_thread=20):
+        import threading
+        from django.db import connection
+        results, errors = [], []
+
+        def work():
+            try:
+                for _ in range(per_thread):
+                    results.append(allocator.next_number())
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errors.append(e)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        return results
+
+    def test_concurrent_allocation_is_unique(self):
+        """Test que hilos simultáneos nunca obtienen el mismo número"""
+        from .tickets import TicketAllocator
+        results = self._hammer(TicketAllocator(block_size=1))
+        self.assertEqual(len(results), 160)
+        self.assertEqual(len(set(results)), 160)
+
+    def test_concurrent_block_allocation_is_unique(self):
+        """Test que la reserva por bloques también es única entre asignadores"""
+        from .tickets import TicketAllocator
+        results = self._hammer(TicketAllocator(block_size=10)) + self._hammer(TicketAllocator(block_size=7))
+        self.assertEqual(len(set(results)), len(results))
+
+    def test_sales_in_same_second_get_distinct_tickets(self):
+        """Test que dos ventas seguidas no chocan por el número de ticket"""
+        from .checkout import process_sale
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        product = Product.objects.create(
+            name='Ticket Product', brand='Brand', description='Desc',
+            price=Decimal('10.00'), quantity=10, sku='TCK-001'
+        )
+        cart = {str(product.pk): {'name': product.name, 'price': 10.0, 'quantity': 1}}
+        first = process_sale(user, cart)
+        second = process_sale(user, cart)
+        self.assertNotEqual(first.ticket_number, second.ticket_number)
+
+
+class CartHydrationTest(TestCase):
+    """Tests para la carga del carrito en una sola consulta"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.products = [
+            Product.objects.create(
+                name=f'Hydrate {i}',
+                brand='Brand',
+                description='Desc',
+                price=Decimal('20.00'),
+                quantity=5,
+                sku=f'HYD-{i:03d}'
+            )
+            for i in range(4)
+        ]
+        self.client.login(username='testuser', password='testpass123')
+
+    def _add(self, products):
+        for product in products:
+            self.client.get(reverse('cart_add', args=[product.pk]))
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        """Test que el carrito se carga con una consulta sin importar las líneas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._add(self.products[:1])
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('cart_view'))
+        self._add(self.products[1:])
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('cart_view'))
+        self.assertEqual(len(response.context['cart_items']), 4)
+        self.assertEqual(len(small), len(large))
+
+    def test_deleted_products_are_pruned(self):
+        """Test que los productos eliminados se quitan de la sesión"""
+        self._add(self.products[:2])
+        self.products[0].delete()
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(len(response.context['cart_items']), 1)
+        self.assertNotIn(str(self.products[0].pk), self.client.session['cart'])
+        self.assertContains(response, 'ya no está disponible')
+
+    def test_price_and_stock_drift(self):
+        """Test que se marcan los cambios de precio y stock"""
+        self._add(self.products[:1])
+        self.client.post(reverse('cart_update_quantity', args=[self.products[0].pk]), {'quantity': 3})
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('25.00'), quantity=2)
+        response = self.client.get(reverse('cart_view'))
+        item = response.context['cart_items'][0]
+        self.assertTrue(item['price_changed'])
+        self.assertTrue(item['stock_short'])
+        self.assertEqual(item['subtotal'], Decimal('60.00'))
+        self.assertContains(response, 'El precio actual es')
+
+
+class SaleLedgerTest(TestCase):
+    """Tests para el listado paginado de ventas"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def _create_sales(self, count, start=0):
+        sales = []
+        for i in range(start, start + count):
+            sale = Sale.objects.create(user=self.user, total=Decimal('10.00'), ticket_number=f'LEDGER-{i:03d}')
+            SaleItem.objects.create(
+                sale=sale, product_name='P', product_brand='B', product_sku='S',
+                quantity=2, unit_price=Decimal('5.00'), subtotal=Decimal('10.00')
+            )
+            sales.append(sale)
+        # Las ventas creadas directamente no pasan por el checkout; los totales
+        # se leen del resumen diario
+        from .rollup import rebuild
+        rebuild()
+        return sales
+
+    def test_query_count_does_not_depend_on_rows(self):
+        """Test que el número de consultas no crece con las ventas de la página"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._create_sales(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('sale_list'))
+        self._create_sales(10, start=2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(reverse('sale_list'))
+        self.assertEqual(len(response.context['sales']), 12)
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(response.context['sales'][0].items_count, 2)
+
+    def test_totals_and_pagination(self):
+        """Test de los totales de página y generales"""
+        self._create_sales(5)
+        response = self.client.get(reverse('sale_list'), {'page_size': 2})
+        self.assertEqual(len(response.context['sales']), 2)
+        self.assertEqual(response.context['total_sales'], Decimal('50.00'))
+        self.assertEqual(response.context['page_total'], Decimal('20.00'))
+        self.assertEqual(response.context['sales_count'], 5)
+        self.assertTrue(response.context['page'].has_next)
+
+    def test_date_range_includes_whole_last_day(self):
+        """Test que la fecha final incluye todo el día"""
+        from django.utils import timezone
+        sale = self._create_sales(1)[0]
+        today = timezone.localdate().isoformat()
+        response = self.client.get(reverse('sale_list'), {'date_from': today, 'date_to': today})
+        self.assertEqual([s.pk for s in response.context['sales']], [sale.pk])
+        response = self.client.get(reverse('sale_list'), {'date_to': '2000-01-01'})
+        self.assertEqual(len(response.context['sales']), 0)
+        self.assertEqual(response.context['total_sales'], 0)
+
+    def test_invalid_dates_are_ignored(self):
+        """Test que una fecha inválida no produce error"""
+        self._create_sales(1)
+        response = self.client.get(reverse('sale_list'), {'date_from': '2025-02-30', 'date_to': 'ayer'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['sales']), 1)
+
+    def test_date_range_uses_index(self):
+        """Test que el filtro por fechas usa el índice de created_at"""
+        from datetime import timedelta
+        from django.utils import timezone
+        now = timezone.now()
+        plan = Sale.objects.filter(
+            created_at__gte=now - timedelta(days=7), created_at__lt=now
+        ).order_by('-created_at', '-id')[:50].explain()
+        self.assertIn('sale_created_idx', plan)
+
+
+class HistoryAuditLogTest(TestCase):
+    """Tests para el historial paginado"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = User.objects.create_user(username='admin', password='adminpass123')
+        UserProfile.objects.filter(user=self.admin_user).update(is_admin=True)
+        self.client.login(username='admin', password='adminpass123')
+
+    def _create(self, count, action='UPDATE'):
+        History.objects.bulk_create([
+            History(user=self.admin_user, product_id=i, product_name=f'Audit {i}', action=action, changes={})
+            for i in range(count)
+        ])
+
+    def test_pages_through_history(self):
+        """Test que el historial se recorre por páginas con el cursor"""
+        self._create(5)
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            page = self.client.get(reverse('history_list'), params).context['page']
+            seen.extend(h.pk for h in page)
+            if not page.has_next:
+                break
+            params['cursor'] = page.next_cursor
+        self.assertEqual(seen, list(History.objects.order_by('-timestamp', '-id').values_list('pk', flat=True)))
+
+    def test_query_count_does_not_depend_on_rows(self):
+        """Test que el usuario de cada registro no genera consultas extra"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        self._create(1)
+        self.client.get(reverse('history_list'))  # Llena la caché de usuarios
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('history_list'))
+        self._create(20)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('history_list'))
+        self.assertEqual(len(small), len(large))
+
+    def test_user_options_are_cached_and_invalidated(self):
+        """Test que la lista de usuarios se cachea y se invalida al crear usuarios"""
+        from django.core.cache import cache
+        from .models import USER_OPTIONS_CACHE_KEY, get_user_options
+        cache.delete(USER_OPTIONS_CACHE_KEY)
+        self.assertEqual([u['username'] for u in get_user_options()], ['admin'])
+        with self.assertNumQueries(0):
+            get_user_options()
+        User.objects.create_user(username='nuevo', password='x')
+        self.assertEqual([u['username'] for u in get_user_options()], ['admin', 'nuevo'])
+
+    def test_filters_use_indexes(self):
+        """Test que los filtros por usuario y acción usan sus índices"""
+        plan = History.objects.filter(user=self.admin_user).order_by('-timestamp', '-id')[:50].explain()
+        self.assertIn('history_user_timestamp_idx', plan)
+        plan = History.objects.filter(action='DELETE').order_by('-timestamp', '-id')[:50].explain()
+        self.assertIn('history_action_timestamp_idx', plan)
+
+
+class HistoryChangesQueryTest(TestCase):
+    """Tests para las consultas sobre History.changes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def _update(self, changes, name='Perfume'):
+        return History.objects.create(
+            user=self.user, product_id=1, product_name=name, action='UPDATE', changes=changes
+        )
+
+    def test_changes_are_stored_as_json(self):
+        """Test que los cambios se guardan y leen como diccionario"""
+        history = self._update({'price': {'old': '50.00', 'new': '75.00'}})
+        history.refresh_from_db()
+        self.assertEqual(history.get_changes_dict()['price']['new'], '75.00')
+        self.assertTrue(History.objects.filter(changes__price__new='75.00').exists())
+
+    def test_price_changes_over_threshold(self):
+        """Test de "cambios de precio de más de 10% en el último mes\""""
+        from datetime import timedelta
+        from django.utils import timezone
+        big_raise = self._update({'price': {'old': '100.00', 'new': '125.00'}})
+        big_cut = self._update({'price': {'old': '100.00', 'new': '80.00'}})
+        self._update({'price': {'old': '100.00', 'new': '105.00'}})
+        self._update({'name': {'old': 'A', 'new': 'B'}})
+        self._update({'price': {'old': '0', 'new': '50.00'}})
+        old = self._update({'price': {'old': '10.00', 'new': '20.00'}})
+        History.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=60))
+
+        results = History.objects.changes_over('price', 10).between(timezone.now() - timedelta(days=30))
+        self.assertEqual({h.pk for h in results}, {big_raise.pk, big_cut.pk})
+        pcts = {h.pk: h.change_pct for h in results}
+        self.assertAlmostEqual(pcts[big_raise.pk], 25.0)
+        self.assertAlmostEqual(pcts[big_cut.pk], -20.0)
+
+    def test_price_change_query_uses_index(self):
+        """Test que la consulta por porcentaje de cambio de precio usa su índice"""
+        plan = History.objects.changes_over('price', 10).explain()
+        self.assertIn('history_price_change_idx', plan)
+
+    def test_invalid_field_name_is_rejected(self):
+        """Test que no se aceptan nombres de campo arbitrarios en la ruta JSON"""
+        from .models import ChangeValue
+        with self.assertRaises(ValueError):
+            ChangeValue("price') --", 'new')
+
+
+class HistoryChangesMigrationTest(TransactionTestCase):
+    """Test de la migración de History.changes de texto a JSON"""
+
+    def test_text_rows_are_converted(self):
+        from django.db import connection
+        from django.db.migrations.executor import MigrationExecutor
+        before = [('products', '0012_history_indexes')]
+        after = [('products', '0013_history_changes_json')]
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(before)
+        old_apps = executor.loader.project_state(before).apps
+        OldUser = old_apps.get_model('auth', 'User')
+        OldHistory = old_apps.get_model('products', 'History')
+        user = OldUser.objects.create(username='legacy')
+        for changes in ('{"price": {"old": "1.00", "new": "2.00"}}', '', 'no es json'):
+            OldHistory.objects.create(user=user, product_id=1, product_name='P', action='UPDATE', changes=changes)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(after)
+        new_apps = executor.loader.project_state(after).apps
+        NewHistory = new_apps.get_model('products', 'History')
+        converted = list(NewHistory.objects.order_by('pk').values_list('changes', flat=True))
+        self.assertEqual(converted, [{'price': {'old': '1.00', 'new': '2.00'}}, {}, {}])
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+@override_settings(AUDIT_MODE='sync')
+class AuditTest(TestCase):
+    """Tests para el registro de auditoría basado en señales"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(
+            name='Audit Product', brand='Audit Brand', description='Audit', category='PERFUME',
+            price=Decimal('99.99'), cost=Decimal('50.00'), quantity=10, sku='AUD-001'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _form(self, **overrides):
+        data = {
+            'name': 'Audit Product', 'brand': 'Audit Brand', 'description': 'Audit',
+            'category': 'PERFUME', 'gender': 'U', 'fragrance_type': '', 'volume': 100,
+            'price': '99.99', 'cost': '50.00', 'quantity': 10, 'min_stock': 5, 'sku': 'AUD-001'
+        }
+        data.update(overrides)
+        return data
+
+    def test_products_without_user_are_not_audited(self):
+        """Test que los cambios sin usuario responsable no generan historial"""
+        self.assertFalse(History.objects.exists())
+
+    def test_edit_records_only_changed_fields(self):
+        """Test que la edición registra solo los campos modificados"""
+        self.client.post(reverse('product_edit', args=[self.product.pk]), self._form(price='129.99', quantity=15))
+        history = History.objects.get()
+        self.assertEqual(history.action, 'UPDATE')
+        self.assertEqual(history.user, self.user)
+        self.assertEqual(history.changes, {
+            'price': {'old': '99.99', 'new': '129.99'},
+            'quantity': {'old': 10, 'new': 15},
+        })
+
+    def test_edit_without_changes_is_not_recorded(self):
+        """Test que guardar sin cambios no crea un registro vacío"""
+        self.client.post(reverse('product_edit', args=[self.product.pk]), self._form())
+        self.assertFalse(History.objects.exists())
+
+    def test_create_and_delete_record_model_fields(self):
+        """Test que crear y eliminar registran los campos del modelo"""
+        self.client.post(reverse('product_create'), self._form(sku='AUD-002', price='10'))
+        created = History.objects.get(action='CREATE')
+        self.assertEqual(created.changes['price'], '10.00')
+        self.assertEqual(created.changes['sku'], 'AUD-002')
+        self.assertNotIn('image', created.changes)
+
+        self.client.post(reverse('product_delete', args=[self.product.pk]))
+        deleted = History.objects.get(action='DELETE')
+        self.assertEqual(deleted.product_id, self.product.pk)
+        self.assertEqual(deleted.changes['quantity'], 10)
+
+    @override_settings(AUDIT_MODE='commit')
+    def test_commit_mode_writes_batch_on_commit(self):
+        """Test que en modo commit los registros se escriben juntos al confirmar"""
+        from django.db import transaction
+        from .audit import acting_as
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            with acting_as(self.user), transaction.atomic():
+                for quantity in (11, 12, 13):
+                    self.product.quantity = quantity
+                    self.product.save()
+        self.assertFalse(History.objects.exists())
+
+        with self.assertNumQueries(1):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(History.objects.count(), 3)
+
+    @override_settings(AUDIT_MODE='commit')
+    def test_record_many_writes_one_batch(self):
+        """Test que record_many escribe todos sus registros con un solo bulk_create"""
+        from unittest import mock
+        from .audit import build_entry, record_many
+
+        entries = [build_entry('UPDATE', self.product, {'quantity': i}, user=self.user) for i in range(5)]
+        autocommit = mock.Mock(in_atomic_block=False)
+        with mock.patch('products.audit.transaction.get_connection', return_value=autocommit):
+            with self.assertNumQueries(1):
+                record_many(entries)
+        self.assertEqual(History.objects.count(), 5)
+
+    @override_settings(AUDIT_MODE='commit')
+    def test_rolled_back_changes_are_discarded(self):
+        """Test que un savepoint revertido descarta sus registros"""
+        from django.db import transaction
+        from .audit import acting_as
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with acting_as(self.user), transaction.atomic():
+                self.product.quantity = 20
+                self.product.save()
+                try:
+                    with transaction.atomic():
+                        self.product.name = 'Revertido'
+                        self.product.save()
+                        raise ValueError
+                except ValueError:
+                    pass
+        self.assertEqual(list(History.objects.values_list('changes', flat=True)), [
+            {'quantity': {'old': 10, 'new': 20}},
+        ])
+
+    @override_settings(AUDIT_MODE='background')
+    def test_background_mode_queues_until_flush(self):
+        """Test que en modo background los registros esperan al hilo escritor"""
+        from unittest import mock
+        from .audit import acting_as, writer
+
+        with mock.patch.object(writer, '_ensure_thread'), acting_as(self.user):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.quantity = 3
+                self.product.save()
+            self.assertEqual(writer.pending(), 1)
+            self.assertFalse(History.objects.exists())
+            self.assertEqual(writer.flush(), 1)
+        self.assertTrue(History.objects.filter(action='UPDATE').exists())
+
+    @override_settings(AUDIT_MODE='background')
+    def test_failed_flush_requeues_entries(self):
+        """Test que si la escritura falla los registros vuelven a la cola y se reintentan"""
+        from unittest import mock
+        from django.db import OperationalError
+        from .audit import build_entry, writer
+
+        entries = [build_entry('UPDATE', self.product, {'quantity': i}, user=self.user) for i in range(3)]
+        with mock.patch.object(writer, '_ensure_thread'):
+            writer.add(entries[:2])
+            with mock.patch.object(History.objects, 'bulk_create', side_effect=OperationalError('database is locked')):
+                with self.assertRaises(OperationalError):
+                    writer.flush()
+            writer.add(entries[2:])
+            self.assertEqual(writer.pending(), 3)
+            self.assertEqual(writer.flush(), 3)
+        self.assertEqual(list(History.objects.order_by('id').values_list('changes', flat=True)),
+                         [{'quantity': 0}, {'quantity': 1}, {'quantity': 2}])
+
+
+class CatalogCacheTest(TestCase):
+    """Tests para la caché de tarjetas y primeras páginas del catálogo"""
+
+    def setUp(self):
+        from . import catalog_cache
+        catalog_cache.get_cache().clear()
+        catalog_cache.reset_stats()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(
+            name='Cached Perfume', brand='Brand', description='Desc',
+            price=Decimal('40.00'), quantity=10, sku='CACHE-001'
+        )
+        Product.objects.create(name='Otro', brand='Brand', description='Desc', price=Decimal('20.00'), quantity=4, sku='CACHE-002')
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_second_request_is_served_from_cache(self):
+        """Test que la segunda visita usa la página y las tarjetas guardadas"""
+        from . import catalog_cache
+        self.client.get(reverse('product_list'), {'category': 'OTHER'})
+        self.assertEqual(catalog_cache.stats()['page_misses'], 1)
+        self.assertEqual(catalog_cache.stats()['card_misses'], 2)
+
+        with self.assertNumQueries(3):  # usuario, perfil y el agregado de la ETag; la sesión sale de la caché
+            response = self.client.get(reverse('product_list'), {'category': 'OTHER'})
+        self.assertContains(response, 'Cached Perfume')
+        self.assertEqual(catalog_cache.stats()['page_hits'], 1)
+        self.assertEqual(catalog_cache.stats()['card_hits'], 2)
+
+    def test_stats_endpoint_and_dedicated_cache(self):
+        """Test que los contadores se exponen a administradores y el catálogo usa su propia caché"""
+        from django.conf import settings
+        from django.core.cache import cache
+        from . import catalog_cache
+        self.assertNotEqual(settings.CATALOG_CACHE_ALIAS, 'default')
+        self.client.get(reverse('product_list'))
+        self.assertIsNone(cache.get(catalog_cache.VERSION_KEY))
+
+        self.assertRedirects(self.client.get(reverse('catalog_cache_stats')), reverse('product_list'),
+                             fetch_redirect_response=False)
+        UserProfile.objects.filter(user=self.user).update(is_admin=True)
+        self.client.get(reverse('product_list'))
+        data = self.client.get(reverse('catalog_cache_stats')).json()
+        self.assertEqual((data['page_misses'], data['page_hits']), (1, 1))
+        self.assertEqual(data['page_hit_rate'], 50.0)
+        self.assertEqual(data['alias'], 'catalog')
+
+    def test_save_refreshes_card_and_page(self):
+        """Test que guardar un producto invalida su tarjeta y la primera página"""
+        self.client.get(reverse('product_list'))
+        self.product.price = Decimal('55.00')
+        self.product.save()
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, '55')
+        self.assertNotContains(response, '40,00')
+
+        self.product.delete()
+        response = self.client.get(reverse('product_list'))
+        self.assertNotContains(response, 'Cached Perfume')
+
+    def test_sale_refreshes_stock(self):
+        """Test que una venta actualiza el stock mostrado en caché"""
+        from .checkout import process_sale
+        self.client.get(reverse('product_list'))
+        process_sale(self.user, {str(self.product.pk): {'quantity': 3, 'price': '40.00'}})
+        response = self.client.get(reverse('product_list'))
+        stock = {product.pk: product.quantity for product in response.context['page']}
+        self.assertEqual(stock[self.product.pk], 7)
+
+    def test_search_and_cursor_skip_page_cache(self):
+        """Test que búsquedas y páginas siguientes no usan la caché de página"""
+        from . import catalog_cache
+        self.client.get(reverse('product_list'), {'search': 'Cached'})
+        self.client.get(reverse('product_list'), {'search': 'Cached'})
+        self.assertEqual(catalog_cache.stats()['page_hits'], 0)
+        self.assertEqual(catalog_cache.stats()['page_misses'], 0)
+
+
+class ConditionalGetTest(TestCase):
+    """Tests para las respuestas 304 del detalle y el catálogo"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(
+            name='Etag Perfume', brand='Brand', description='Desc',
+            price=Decimal('30.00'), quantity=5, sku='ETAG-001'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def _revalidate(self, url, params=None):
+        first = self.client.get(url, params or {})
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.has_header('ETag'))
+        self.assertTrue(first.has_header('Last-Modified'))
+        return first, self.client.get(url, params or {}, HTTP_IF_NONE_MATCH=first['ETag'])
+
+    def test_detail_returns_304_when_unchanged(self):
+        """Test que el detalle sin cambios responde 304 sin renderizar"""
+        url = reverse('product_detail', args=[self.product.pk])
+        first, second = self._revalidate(url)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        self.assertFalse(second.templates)
+
+        self.product.price = Decimal('35.00')
+        self.product.save()
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+
+    def test_catalog_etag_follows_filter_set(self):
+        """Test que la ETag del catálogo cambia con los filtros y con nuevos productos"""
+        url = reverse('product_list')
+        first, second = self._revalidate(url, {'category': 'OTHER'})
+        self.assertEqual(second.status_code, 304)
+
+        other = self.client.get(url, {'category': 'PERFUME'})
+        self.assertNotEqual(other['ETag'], first['ETag'])
+
+        Product.objects.create(name='Nuevo', brand='B', description='D', price=Decimal('1.00'), quantity=1, sku='ETAG-002')
+        third = self.client.get(url, {'category': 'OTHER'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(third.status_code, 200)
+
+    def test_catalog_etag_survives_cache_reset(self):
+        """Test que la ETag del catálogo sale de la base de datos y no de la caché del proceso"""
+        from . import catalog_cache
+        url = reverse('product_list')
+        first = self.client.get(url)
+        self.product.name = 'Renombrado'
+        self.product.save()
+        # Como un reinicio o un proceso distinto: la versión de la caché vuelve a empezar
+        catalog_cache.get_cache().clear()
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertContains(second, 'Renombrado')
+
+    def test_cart_change_invalidates_etag(self):
+        """Test que agregar al carrito cambia la ETag, porque la barra muestra el carrito"""
+        for url in (reverse('product_list'), reverse('product_detail', args=[self.product.pk])):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.client.post(reverse('api_cart_add', args=[self.product.pk]))
+                second = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+                self.assertEqual(second.status_code, 200)
+                self.assertContains(second, 'data-cart-badge')
+                self.client.post(reverse('api_cart_clear'))
+
+    def test_etag_is_per_user(self):
+        """Test que otro usuario no reutiliza la ETag ajena"""
+        url = reverse('product_detail', args=[self.product.pk])
+        etag = self.client.get(url)['ETag']
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_missing_product_still_404(self):
+        """Test que un producto inexistente sigue respondiendo 404"""
+        self.assertEqual(self.client.get(reverse('product_detail', args=[9999])).status_code, 404)
+
+
+class SaleReceiptCacheTest(TestCase):
+    """Tests para la caché del ticket y el detalle de ventas"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        UserProfile.objects.filter(user=self.user).update(is_admin=True)
+        self.sale = Sale.objects.create(user=self.user, total=Decimal('90.00'), ticket_number='REC-TICKET-001')
+        for i in range(3):
+            SaleItem.objects.create(
+                sale=self.sale, product_name=f'Item {i}', product_brand='Brand', product_sku=f'REC-{i}',
+                quantity=i + 1, unit_price=Decimal('15.00'), subtotal=Decimal('15.00') * (i + 1)
+            )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_ticket_miss_uses_prefetch_and_hit_skips_sale_queries(self):
+        """Test que el ticket se renderiza con un prefetch y luego sale de la caché"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        url = reverse('sale_ticket', args=[self.sale.pk])
+
+        with CaptureQueriesContext(connection) as miss:
+            response = self.client.get(url)
+        self.assertContains(response, 'REC-TICKET-001')
+        self.assertContains(response, '6 productos')
+        sale_queries = [q['sql'] for q in miss.captured_queries if 'products_sale' in q['sql']]
+        self.assertEqual(len(sale_queries), 2)  # venta con usuario + items
+
+        with CaptureQueriesContext(connection) as hit:
+            response = self.client.get(url)
+        self.assertContains(response, 'REC-TICKET-001')
+        self.assertFalse([q for q in hit.captured_queries if 'products_sale' in q['sql']])
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_reprint_revalidates_with_etag(self):
+        """Test que reimprimir el ticket responde 304 con la misma ETag"""
+        url = reverse('sale_ticket', args=[self.sale.pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        # La barra superior muestra el carrito: cambiarlo invalida la ETag
+        session = self.client.session
+        session['cart'] = {'1': 2}
+        session.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_etag_is_per_user(self):
+        """Test que otro administrador no reutiliza la ETag ajena del detalle"""
+        url = reverse('sale_detail', args=[self.sale.pk])
+        etag = self.client.get(url)['ETag']
+        other = User.objects.create_user(username='other', password='testpass123')
+        UserProfile.objects.filter(user=other).update(is_admin=True)
+        self.client.login(username='other', password='testpass123')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_checks_owner_from_cache(self):
+        """Test que el detalle en caché sigue respetando los permisos"""
+        url = reverse('sale_detail', args=[self.sale.pk])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        self.assertRedirects(self.client.get(url), reverse('sale_list'))
+
+    def test_missing_sale_returns_404(self):
+        """Test que una venta inexistente responde 404"""
+        self.assertEqual(self.client.get(reverse('sale_ticket', args=[9999])).status_code, 404)
+
+    def test_deleted_sale_is_dropped_from_cache(self):
+        """Test que eliminar la venta descarta su ticket guardado"""
+        url = reverse('sale_ticket', args=[self.sale.pk])
+        self.client.get(url)
+        self.sale.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ProductImagePipelineTest(TestCase):
+    """Tests para las miniaturas y variantes WebP de las imágenes"""
+
+    def setUp(self):
+        import tempfile
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _photo(self, size=(3000, 2000)):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        image = Image.new('RGB', size, (200, 120, 80))
+        exif = Image.Exif()
+        exif[0x010F] = 'Camara de prueba'
+        buffer = BytesIO()
+        image.save(buffer, 'JPEG', exif=exif)
+        return SimpleUploadedFile('botella.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _create(self, **extra):
+        return Product.objects.create(
+            name='Foto', brand='Brand', description='Desc', price=Decimal('10.00'),
+            quantity=1, sku=extra.pop('sku', 'IMG-001'), **extra
+        )
+
+    def test_upload_is_capped_stripped_and_has_variants(self):
+        """Test que el original se limita, pierde el EXIF y genera variantes"""
+        from PIL import Image
+        from .images import variant_name
+        product = self._create(image=self._photo())
+        storage = product.image.storage
+
+        with storage.open(product.image.name) as stored:
+            original = Image.open(stored)
+            self.assertLessEqual(max(original.size), 1600)
+            self.assertEqual(len(original.getexif()), 0)
+
+        for width in (320, 640):
+            for ext in ('jpg', 'webp'):
+                self.assertTrue(storage.exists(variant_name(product.image.name, width, ext)))
+        with storage.open(variant_name(product.image.name, 320, 'webp')) as thumb:
+            self.assertEqual(Image.open(thumb).width, 320)
+
+    def test_catalog_serves_lazy_srcset(self):
+        """Test que el catálogo usa srcset, WebP y carga diferida"""
+        self._create(image=self._photo())
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '_320.webp 320w')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill_command_builds_missing_variants(self):
+        """Test que el comando genera las variantes de imágenes existentes"""
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from io import StringIO
+        from .images import variant_name
+        name = default_storage.save('products/antigua.jpg', self._photo((800, 600)))
+        product = self._create(sku='IMG-002')
+        Product.objects.filter(pk=product.pk).update(image=name)
+
+        out = StringIO()
+        call_command('build_image_variants', workers=1, stdout=out)
+        self.assertIn('4 variantes generadas', out.getvalue())
+        self.assertTrue(default_storage.exists(variant_name(name, 640, 'webp')))
+
+
+class ContentAddressedStorageTest(TestCase):
+    """Tests para el almacenamiento de imágenes por contenido"""
+
+    def setUp(self):
+        import tempfile
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media.name)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def _photo(self, color=(10, 20, 30)):
+        from io import BytesIO
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), color).save(buffer, 'JPEG')
+        return SimpleUploadedFile('foto.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+    def _create(self, sku, image):
+        return Product.objects.create(
+            name='Foto', brand='Brand', description='Desc', price=Decimal('10.00'),
+            quantity=1, sku=sku, image=image
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        """Test que dos subidas idénticas se guardan una sola vez con nombre por hash"""
+        import os
+        first = self._create('CAS-001', self._photo())
+        second = self._create('CAS-002', self._photo())
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name, r'^products/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+        directory = os.path.dirname(first.image.path)
+        files = [f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f))]
+        self.assertEqual(files, [os.path.basename(first.image.path)])
+
+    def test_addressed_files_get_far_future_headers(self):
+        """Test que los archivos por hash se sirven con caché inmutable"""
+        from django.conf import settings
+        from django.test import RequestFactory
+        from .storage import serve_media
+        product = self._create('CAS-003', self._photo())
+        response = serve_media(RequestFactory().get('/media/x'), product.image.name, document_root=settings.MEDIA_ROOT)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=31536000', response['Cache-Control'])
+
+    def test_garbage_collection_keeps_referenced_files(self):
+        """Test que la limpieza borra solo archivos sin producto"""
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        from .images import variant_name
+        kept = self._create('CAS-004', self._photo())
+        orphan = self._create('CAS-005', self._photo((200, 0, 0)))
+        orphan_name = orphan.image.name
+        orphan.delete()
+
+        call_command('collect_media_garbage', min_age_hours=0, stdout=StringIO())
+        self.assertTrue(default_storage.exists(kept.image.name))
+        self.assertTrue(default_storage.exists(variant_name(kept.image.name, 320, 'webp')))
+        self.assertFalse(default_storage.exists(orphan_name))
+        self.assertFalse(default_storage.exists(variant_name(orphan_name, 320, 'webp')))
+
+    def test_reused_orphan_is_protected_from_collection(self):
+        """Test que reutilizar un archivo huérfano renueva su fecha para la limpieza"""
+        import os
+        import time
+        from io import StringIO
+        from django.core.files.storage import default_storage
+        from django.core.management import call_command
+        orphan = self._create('CAS-006', self._photo((0, 200, 0)))
+        name, path = orphan.image.name, orphan.image.path
+        orphan.delete()
+        old = time.time() - 48 * 3600
+        os.utime(path, (old, old))
+
+        self.assertEqual(self._create('CAS-007', self._photo((0, 200, 0))).image.name, name)
+        self.assertGreater(os.path.getmtime(path), old + 3600)
+        call_command('collect_media_garbage', min_age_hours=24, stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
+
+
+class CompactCartTest(TestCase):
+    """Tests para el carrito compacto en la sesión"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(
+            name='Cart Perfume', brand='Brand', description='Desc',
+            price=Decimal('19.99'), quantity=10, sku='CMP-001'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_cart_stores_ids_quantities_and_cents(self):
+        """Test que el carrito guarda solo id, cantidad y precio en centavos"""
+        self.client.get(reverse('cart_add', args=[self.product.pk]))
+        self.client.get(reverse('cart_add', args=[self.product.pk]))
+        self.assertEqual(self.client.session['cart'], {str(self.product.pk): [2, 1999]})
+
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(response.context['total'], Decimal('39.98'))
+
+    def test_legacy_session_cart_is_read(self):
+        """Test que un carrito con el formato anterior sigue funcionando"""
+        session = self.client.session
+        session['cart'] = {str(self.product.pk): {
+            'name': 'Cart Perfume', 'brand': 'Brand', 'sku': 'CMP-001', 'price': 19.99, 'quantity': 2
+        }}
+        session.save()
+
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(response.context['cart_items'][0]['unit_price'], Decimal('19.99'))
+
+        self.client.get(reverse('sale_process'))
+        self.assertEqual(Sale.objects.get().total, Decimal('39.98'))
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_skip_session_table(self):
+        """Test que con cookies firmadas el carrito no escribe en django_session"""
+        from django.contrib.sessions.models import Session
+        Session.objects.all().delete()
+        self.client.login(username='testuser', password='testpass123')
+
+        self.client.get(reverse('cart_add', args=[self.product.pk]))
+        response = self.client.get(reverse('cart_view'))
+        self.assertEqual(len(response.context['cart_items']), 1)
+        self.assertFalse(Session.objects.exists())
+
+
+class CartApiTest(TestCase):
+    """Tests para la API JSON del carrito"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(
+            name='Api Perfume', brand='Brand', description='Desc',
+            price=Decimal('10.50'), quantity=5, sku='API-001'
+        )
+        self.other = Product.objects.create(
+            name='Otro Perfume', brand='Brand', description='Desc',
+            price=Decimal('20.00'), quantity=5, sku='API-002'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_add_returns_line_and_totals(self):
+        """Test que agregar responde con la línea y los totales actualizados"""
+        response = self.client.post(reverse('api_cart_add', args=[self.product.pk]), {'quantity': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['ok'])
+        self.assertEqual(data['line']['quantity'], 2)
+        self.assertEqual(data['line']['subtotal'], '21,00')
+        self.assertEqual(data['units'], 2)
+        self.assertEqual(self.client.session['cart'], {str(self.product.pk): [2, 1050]})
+
+    def test_update_and_remove(self):
+        """Test que cambiar la cantidad y eliminar devuelven los totales del carrito"""
+        self.client.post(reverse('api_cart_add', args=[self.product.pk]))
+        self.client.post(reverse('api_cart_add', args=[self.other.pk]))
+
+        data = self.client.post(reverse('api_cart_update_quantity', args=[self.product.pk]), {'quantity': 3}).json()
+        self.assertEqual(data['line']['quantity'], 3)
+        self.assertEqual(data['total'], '51,50')
+
+        data = self.client.post(reverse('api_cart_remove', args=[self.product.pk])).json()
+        self.assertIsNone(data['line'])
+        self.assertEqual(data['lines'], 1)
+        self.assertEqual(data['total'], '20,00')
+
+        data = self.client.post(reverse('api_cart_clear')).json()
+        self.assertEqual(data['lines'], 0)
+        self.assertEqual(self.client.session['cart'], {})
+
+    def test_stock_and_input_errors(self):
+        """Test que los errores de stock y de cantidad responden JSON con su estado"""
+        response = self.client.post(reverse('api_cart_add', args=[self.product.pk]), {'quantity': 6})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['ok'])
+
+        response = self.client.post(reverse('api_cart_update_quantity', args=[self.product.pk]), {'quantity': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse('api_cart_add', args=[9999]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('cart', self.client.session)
+
+    def test_requires_login_and_post(self):
+        """Test que la API responde 401 sin sesión y 405 con GET"""
+        response = self.client.get(reverse('api_cart_clear'))
+        self.assertEqual(response.status_code, 405)
+
+        self.client.logout()
+        response = self.client.post(reverse('api_cart_clear'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('error', response.json())
+
+    def test_redirect_views_still_work(self):
+        """Test que las vistas con redirección siguen funcionando sin JavaScript"""
+        self.client.get(reverse('cart_add', args=[self.product.pk]))
+        response = self.client.post(reverse('cart_update_quantity', args=[self.product.pk]), {'quantity': 9})
+        self.assertRedirects(response, reverse('cart_view'))
+        self.assertEqual(self.client.session['cart'][str(self.product.pk)][0], 1)
+
+    def test_new_line_is_rendered_once(self):
+        """Test que una línea nueva se devuelve renderizada para insertarla sin recargar"""
+        url = reverse('api_cart_add', args=[self.product.pk])
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.post(url, {'render': 'line'}).json()
+        # Renderizar la línea no carga campos diferidos del producto
+        self.assertEqual(sum('products_product' in query['sql'] for query in queries), 1)
+        self.assertIn(f'data-cart-line="{self.product.pk}"', data['line']['html'])
+        self.assertIn('Api Perfume', data['line']['html'])
+
+        # Si la línea ya estaba, sólo cambian cantidad y subtotal
+        data = self.client.post(url, {'render': 'line'}).json()
+        self.assertNotIn('html', data['line'])
+        self.assertEqual(data['line']['quantity'], 2)
+
+        scan = self.client.post(reverse('api_cart_scan'), {'code': 'API-002', 'render': 'line'}).json()
+        self.assertIn(f'data-cart-line="{self.other.pk}"', scan['line']['html'])
+
+    def test_catalog_and_cart_use_the_api(self):
+        """Test que el catálogo y el carrito apuntan a la API y la barra tiene el contador"""
+        response = self.client.get(reverse('product_list'))
+        self.assertContains(response, f'data-cart-add="{reverse("api_cart_add", args=[self.product.pk])}"')
+        self.assertContains(response, 'data-cart-badge')
+
+        response = self.client.get(reverse('cart_view'))
+        self.assertContains(response, 'data-cart-lines')
+        self.assertContains(response, 'data-cart-empty')
+
+
+class BarcodeScanTest(TestCase):
+    """Tests para el escaneo de códigos de barras al carrito"""
+
+    def setUp(self):
+        from products import scan
+        scan.clear_map()
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.product = Product.objects.create(
+            name='Scan Perfume', brand='Brand', description='Desc',
+            price=Decimal('15.00'), quantity=3, sku='SCN-001', barcode='7501234567890'
+        )
+        self.client.login(username='testuser', password='testpass123')
+
+    def test_scan_by_barcode_and_sku(self):
+        """Test que el escaneo acepta código de barras o SKU y suma al carrito"""
+        data = self.client.post(reverse('api_cart_scan'), {'code': '7501234567890'}).json()
+        self.assertEqual(data['line']['id'], self.product.pk)
+        self.assertEqual(data['line']['quantity'], 1)
+
+        data = self.client.post(reverse('api_cart_scan'), {'code': ' SCN-001 '}).json()
+        self.assertEqual(data['line']['quantity'], 2)
+
+    def test_warm_map_lookup_is_single_primary_key_query(self):
+        """Test que con el mapa cargado el producto se obtiene con una consulta por id"""
+        from products import scan
+        scan.code_map()
+        with self.assertNumQueries(1):
+            product = scan.find_by_code('7501234567890')
+        self.assertEqual(product, self.product)
+
+    def test_map_refreshes_after_barcode_change(self):
+        """Test que un código cambiado no resuelve al producto anterior"""
+        from products import scan
+        scan.code_map()
+        Product.objects.filter(pk=self.product.pk).update(barcode='111')
+        # Cambio hecho sin señales (como desde otro proceso): se comprueba contra la base
+        self.assertIsNone(scan.find_by_code('7501234567890'))
+        self.assertEqual(scan.find_by_code('111'), self.product)
+        # Sólo se olvida el código desactualizado; el resto del mapa sigue cargado
+        self.assertIsNotNone(scan._codes)
+        self.assertNotIn('7501234567890', scan._codes)
+        self.assertIn('SCN-001', scan._codes)
+
+    def test_save_and_delete_update_map_in_place(self):
+        """Test que guardar o eliminar un producto actualiza sus códigos sin recargar el mapa"""
+        from products import scan
+        codes = scan.code_map()
+        self.product.barcode = '222'
+        self.product.save()
+        other = Product.objects.create(name='Otro', brand='B', description='D', price=Decimal('1.00'),
+                                       quantity=1, sku='SCN-002', barcode='333')
+        self.assertIs(scan.code_map(), codes)
+        self.assertNotIn('7501234567890', codes)
+        self.assertEqual((codes['222'], codes['SCN-001'], codes['333']), (self.product.pk, self.product.pk, other.pk))
+        with self.assertNumQueries(1):
+            self.assertEqual(scan.find_by_code('333'), other)
+
+        other.delete()
+        self.assertNotIn('333', codes)
+        self.assertNotIn('SCN-002', codes)
+
+    def test_unknown_code_and_stock(self):
+        """Test que un código desconocido da 404 y la falta de stock 409"""
+        response = self.client.post(reverse('api_cart_scan'), {'code': '000'})
+        self.assertEqual(response.status_code, 404)
+
+        response = self.client.post(reverse('api_cart_scan'), {'code': 'SCN-001', 'quantity': 4})
+        self.assertEqual(response.status_code, 409)
+
+    def test_redirect_fallback(self):
+        """Test que el formulario sin JavaScript agrega y redirige al carrito"""
+        response = self.client.post(reverse('cart_scan'), {'code': '7501234567890'})
+        self.assertRedirects(response, reverse('cart_view'))
+        self.assertEqual(self.client.session['cart'][str(self.product.pk)][0], 1)
+
+
+class ExportTest(TestCase):
+    """Tests para la exportación en CSV/JSONL"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        self.admin.profile.is_admin = True
+        self.admin.profile.save()
+        self.product = Product.objects.create(
+            name='Export Perfume', brand='Brand', description='Desc',
+            price=Decimal('12.50'), quantity=4, sku='EXP-001'
+        )
+        self.sale = Sale.objects.create(user=self.admin, total=Decimal('37.50'), ticket_number='T-EXP-1')
+        SaleItem.objects.create(sale=self.sale, product_name='Export Perfume', product_brand='Brand',
+                                product_sku='EXP-001', quantity=1, unit_price=Decimal('12.50'), subtotal=Decimal('12.50'))
+        SaleItem.objects.create(sale=self.sale, product_name='Otro', product_brand='Brand',
+                                product_sku='EXP-002', quantity=2, unit_price=Decimal('12.50'), subtotal=Decimal('25.00'))
+        History.objects.create(user=self.admin, product_id=self.product.pk, product_name='Export Perfume',
+                               action='UPDATE', changes={'price': {'old': '10.00', 'new': '12.50'}})
+        self.client.login(username='admin', password='testpass123')
+
+    def _content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_products_csv(self):
+        """Test que los productos se exportan en CSV con encabezado"""
+        import csv
+        import io
+        response = self.client.get(reverse('export_data', args=['products']))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="products.csv"')
+        rows = list(csv.DictReader(io.StringIO(self._content(response).decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['sku'], 'EXP-001')
+        self.assertEqual(rows[0]['price'], '12.50')
+
+    def test_sales_jsonl_groups_items(self):
+        """Test que en JSONL cada venta es un objeto con sus items"""
+        import json
+        response = self.client.get(reverse('export_data', args=['sales']), {'format': 'jsonl'})
+        lines = self._content(response).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        sale = json.loads(lines[0])
+        self.assertEqual(sale['ticket_number'], 'T-EXP-1')
+        self.assertEqual([item['product_sku'] for item in sale['items']], ['EXP-001', 'EXP-002'])
+
+    def test_sales_csv_one_row_per_item_gzip(self):
+        """Test que el CSV de ventas comprimido tiene una fila por item"""
+        import gzip
+        response = self.client.get(reverse('export_data', args=['sales']), {'gzip': '1'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(self._content(response)).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+
+    def test_history_filters_and_changes(self):
+        """Test que el historial respeta el filtro de acción y exporta los cambios como JSON"""
+        import json
+        response = self.client.get(reverse('export_data', args=['history']), {'format': 'jsonl', 'action': 'UPDATE'})
+        row = json.loads(self._content(response))
+        self.assertEqual(row['changes']['price']['new'], '12.50')
+
+        response = self.client.get(reverse('export_data', args=['history']), {'action': 'DELETE'})
+        self.assertEqual(len(self._content(response).decode().splitlines()), 1)
+
+    def test_requires_admin_and_known_dataset(self):
+        """Test que solo los administradores exportan y un conjunto desconocido da 404"""
+        self.assertEqual(self.client.get(reverse('export_data', args=['users'])).status_code, 404)
+
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+        response = self.client.get(reverse('export_data', args=['products']))
+        self.assertRedirects(response, reverse('product_list'))
+
+    def test_command_writes_file(self):
+        """Test que el comando escribe el archivo exportado"""
+        import io
+        import os
+        import tempfile
+        from django.core.management import call_command
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.jsonl')
+            call_command('export_data', 'history', format='jsonl', output=path, stderr=io.StringIO())
+            with open(path) as f:
+                self.assertEqual(len(f.read().splitlines()), 1)
+
+
+@override_settings(AUDIT_MODE='sync')
+class ProductImportTest(TestCase):
+    """Tests para la importación masiva de productos"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        self.admin.profile.is_admin = True
+        self.admin.profile.save()
+        self.existing = Product.objects.create(
+            name='Existente', brand='Brand', description='Desc',
+            price=Decimal('10.00'), quantity=1, sku='IMP-001'
+        )
+        self.client.login(username='admin', password='testpass123')
+
+    def _import(self, content, filename='productos.csv', **kwargs):
+        import io
+        from .importer import import_file
+        return import_file(io.BytesIO(content.encode('utf-8')), filename, user=self.admin, **kwargs)
+
+    def test_csv_upserts_by_sku_and_reports_row_errors(self):
+        """Test que el CSV crea, actualiza y reporta errores por fila sin abortar"""
+        result = self._import(
+            'sku,name,description,price,quantity\n'
+            'IMP-001,,,12.50,\n'
+            'IMP-002,Nuevo,Desc,20,5\n'
+            'IMP-003,Malo,Desc,-1,5\n'
+            'IMP-004,Incompleto,,20,5\n'
+        )
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual([error['line'] for error in result.errors], [4, 5])
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.price, Decimal('12.50'))
+        self.assertEqual(self.existing.name, 'Existente')
+        self.assertEqual(Product.objects.get(sku='IMP-002').quantity, 5)
+        self.assertFalse(Product.objects.filter(sku__in=['IMP-003', 'IMP-004']).exists())
+
+    def test_history_written_in_bulk(self):
+        """Test que la importación deja CREATE y UPDATE en el historial"""
+        History.objects.all().delete()
+        self._import('sku,name,description,price,quantity\nIMP-001,,,11,\nIMP-002,Nuevo,Desc,20,5\n')
+
+        update = History.objects.get(action='UPDATE')
+        self.assertEqual(update.product_id, self.existing.pk)
+        self.assertEqual(update.changes, {'price': {'old': '10.00', 'new': '11.00'}})
+        create = History.objects.get(action='CREATE')
+        self.assertEqual(create.product_id, Product.objects.get(sku='IMP-002').pk)
+
+    def test_unchanged_rows_and_dry_run(self):
+        """Test que las filas sin cambios no se escriben y la simulación no guarda"""
+        result = self._import('sku,price\nIMP-001,10.00\n')
+        self.assertEqual(result.unchanged, 1)
+
+        result = self._import('sku,name,description,price,quantity\nIMP-009,X,D,1,1\n', dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Product.objects.filter(sku='IMP-009').exists())
+
+    def test_jsonl_in_batches(self):
+        """Test que JSONL se importa en varios lotes e informa líneas inválidas"""
+        import json
+        lines = [json.dumps({'sku': f'J-{n}', 'name': f'P{n}', 'description': 'D', 'price': '5.00', 'quantity': n})
+                 for n in range(5)]
+        lines.insert(2, '{no es json')
+        result = self._import('\n'.join(lines), filename='productos.jsonl', batch_size=2)
+        self.assertEqual(result.created, 5)
+        self.assertEqual(result.errors[0]['line'], 3)
+        self.assertEqual(Product.objects.filter(sku__startswith='J-').count(), 5)
+
+    def test_upload_view(self):
+        """Test que la vista de carga importa el archivo y solo admite administradores"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        upload = SimpleUploadedFile('productos.csv', b'sku,name,description,price,quantity\nIMP-005,V,D,3,3\n')
+        response = self.client.post(reverse('product_import'), {'file': upload})
+        self.assertEqual(response.context['result'].created, 1)
+        self.assertTrue(Product.objects.filter(sku='IMP-005').exists())
+
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+        self.assertRedirects(self.client.get(reverse('product_import')), reverse('product_list'))
+
+
+class SalesRollupTest(TestCase):
+    """Tests para el resumen diario de ventas"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        self.admin.profile.is_admin = True
+        self.admin.profile.save()
+        self.seller = User.objects.create_user(username='seller', password='testpass123')
+        self.products = [
+            Product.objects.create(name=f'Rollup {n}', brand='Brand', description='Desc',
+                                   price=Decimal('10.00') * (n + 1), quantity=20, sku=f'ROL-{n}')
+            for n in range(2)
+        ]
+
+    def _sell(self, user, quantities):
+        from .checkout import process_sale
+        cart = {str(product.pk): [quantity, int(product.price * 100)]
+                for product, quantity in zip(self.products, quantities) if quantity}
+        return process_sale(user, cart)
+
+    def _rows(self):
+        from .models import SalesDaily
+        return {(row.user_id, row.product_sku): (row.units, row.revenue, row.sales)
+                for row in SalesDaily.objects.all()}
+
+    def test_checkout_updates_rollup(self):
+        """Test que cada venta suma al resumen de su vendedor, día y SKU"""
+        self._sell(self.seller, [1, 2])
+        self._sell(self.seller, [3, 0])
+        rows = self._rows()
+        self.assertEqual(rows[(self.seller.pk, 'ROL-0')], (4, Decimal('40.00'), 2))
+        self.assertEqual(rows[(self.seller.pk, 'ROL-1')], (2, Decimal('40.00'), 1))
+        self.assertEqual(rows[(self.seller.pk, '')], (6, Decimal('80.00'), 2))
+
+    def test_rebuild_matches_incremental(self):
+        """Test que reconstruir el resumen da los mismos valores que el checkout"""
+        from .rollup import rebuild
+        self._sell(self.seller, [1, 2])
+        self._sell(self.admin, [0, 1])
+        incremental = self._rows()
+        rebuild()
+        self.assertEqual(self._rows(), incremental)
+
+    def test_migration_backfills_existing_sales(self):
+        """Test que la migración de datos llena el resumen con las ventas existentes"""
+        from importlib import import_module
+        from types import SimpleNamespace
+        from django.apps import apps
+        from django.db import connection
+        from .models import SalesDaily
+        migration = import_module('products.migrations.0021_backfill_sales_daily')
+        self._sell(self.seller, [1, 2])
+        self._sell(self.admin, [0, 1])
+        incremental = self._rows()
+
+        SalesDaily.objects.all().delete()
+        migration.backfill_sales_daily(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(self._rows(), incremental)
+
+    def test_deleting_sale_subtracts(self):
+        """Test que eliminar una venta la resta del resumen"""
+        self._sell(self.seller, [1, 0])
+        sale = self._sell(self.seller, [1, 1])
+        sale.delete()
+        self.assertEqual(self._rows(), {
+            (self.seller.pk, 'ROL-0'): (1, Decimal('10.00'), 1),
+            (self.seller.pk, ''): (1, Decimal('10.00'), 1),
+        })
+
+    def test_sale_list_totals_read_from_rollup(self):
+        """Test que los totales de sale_list salen del resumen diario"""
+        self._sell(self.seller, [1, 1])
+        self._sell(self.admin, [2, 0])
+        self.client.login(username='seller', password='testpass123')
+        response = self.client.get(reverse('sale_list'))
+        self.assertEqual(response.context['total_sales'], Decimal('30.00'))
+        self.assertEqual(response.context['sales_count'], 1)
+
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('sale_list'))
+        self.assertEqual(response.context['total_sales'], Decimal('50.00'))
+        self.assertEqual(response.context['sales_count'], 2)
+
+    def test_dashboard(self):
+        """Test que el tablero muestra días, SKU y vendedores del resumen"""
+        self._sell(self.seller, [1, 1])
+        self.client.login(username='admin', password='testpass123')
+        response = self.client.get(reverse('sales_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['totals']['revenue'], Decimal('30.00'))
+        self.assertEqual(len(response.context['days']), 1)
+        self.assertEqual([row['product_sku'] for row in response.context['top_skus']], ['ROL-1', 'ROL-0'])
+        self.assertEqual(response.context['sellers'][0]['user__username'], 'seller')
+
+        self.client.login(username='seller', password='testpass123')
+        response = self.client.get(reverse('sales_dashboard'))
+        self.assertIsNone(response.context['sellers'])
+
+
+class SalesAnalyticsTest(TestCase):
+    """Tests para el análisis de ventas por SKU"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        self.admin.profile.is_admin = True
+        self.admin.profile.save()
+        self.client.login(username='admin', password='testpass123')
+
+    def _sale(self, lines, days_ago=0):
+        from django.utils import timezone
+        sale = Sale.objects.create(user=self.admin, total=sum(q * p for _, q, p in lines),
+                                   ticket_number=f'AN-{Sale.objects.count()}')
+        SaleItem.objects.bulk_create([
+            SaleItem(sale=sale, product_name=f'Nombre {sku}', product_brand='B', product_sku=sku,
+                     quantity=quantity, unit_price=price, subtotal=quantity * price)
+            for sku, quantity, price in lines
+        ])
+        Sale.objects.filter(pk=sale.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_top_skus_in_one_query_and_cached(self):
+        """Test que el top se calcula en una consulta y la siguiente lectura sale de caché"""
+        from . import analytics
+        self._sale([('A', 1, Decimal('100')), ('B', 5, Decimal('10'))])
+        self._sale([('B', 1, Decimal('10'))], days_ago=200)
+        start, end = analytics.period_bounds('30d')
+
+        with self.assertNumQueries(1):
+            top = analytics.top_skus(start, end, limit=5)
+        self.assertEqual([row['product_sku'] for row in top], ['A', 'B'])
+        self.assertEqual(top[1]['units'], 5)
+        with self.assertNumQueries(0):
+            cached = analytics.top_skus(start, end, limit=5)
+        self.assertEqual(cached, top)
+        self.assertEqual(analytics.top_skus(start, end, limit=5, by='units')[0]['product_sku'], 'B')
+
+    def test_abc_classification(self):
+        """Test que la clasificación ABC sigue el acumulado de ingresos"""
+        from . import analytics
+        self._sale([('A', 1, Decimal('800')), ('B', 1, Decimal('150')), ('C', 1, Decimal('50'))])
+        start, end = analytics.period_bounds('month')
+        rows = analytics.abc_classification(start, end)
+        self.assertEqual([(row['product_sku'], row['abc']) for row in rows], [('A', 'A'), ('B', 'B'), ('C', 'C')])
+        self.assertEqual(analytics.abc_summary(rows)['A']['revenue'], Decimal('800'))
+
+    def test_dead_stock(self):
+        """Test que se listan los productos con stock sin ventas recientes"""
+        from . import analytics
+        for sku in ('VIVO', 'VIEJO', 'NUNCA'):
+            Product.objects.create(name=sku, brand='B', description='D', price=Decimal('10'),
+                                   cost=Decimal('4'), quantity=3, sku=sku)
+        Product.objects.create(name='AGOTADO', brand='B', description='D', price=Decimal('10'), quantity=0, sku='AGOTADO')
+        self._sale([('VIVO', 1, Decimal('10'))], days_ago=5)
+        self._sale([('VIEJO', 1, Decimal('10'))], days_ago=120)
+
+        with self.assertNumQueries(1):
+            rows = analytics.dead_stock(90)
+        self.assertEqual(sorted(row['sku'] for row in rows), ['NUNCA', 'VIEJO'])
+        self.assertEqual(rows[0]['stock_cost'], Decimal('12'))
+        self.assertIsNone(next(row for row in rows if row['sku'] == 'NUNCA')['last_sold'])
+
+    def test_period_bounds(self):
+        """Test de los límites de los periodos con nombre"""
+        from datetime import date
+        from . import analytics
+        today = date(2026, 3, 15)
+        self.assertEqual(analytics.period_bounds('month', today), (date(2026, 3, 1), date(2026, 3, 16)))
+        self.assertEqual(analytics.period_bounds('last_month', today), (date(2026, 2, 1), date(2026, 3, 1)))
+        self.assertEqual(analytics.period_bounds('30d', today), (date(2026, 2, 14), date(2026, 3, 16)))
+
+    def test_view(self):
+        """Test que la vista de análisis responde a los administradores"""
+        self._sale([('A', 1, Decimal('100'))])
+        response = self.client.get(reverse('sales_analytics'), {'period': '90d', 'by': 'units'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['top_skus'][0]['product_sku'], 'A')
+
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+        self.assertRedirects(self.client.get(reverse('sales_analytics')), reverse('product_list'))
+
+
+class ReorderSuggestionTest(TestCase):
+    """Tests para las sugerencias de reabastecimiento"""
+
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.fast = Product.objects.create(name='Rápido', brand='B', description='D', price=Decimal('10'),
+                                           cost=Decimal('4'), quantity=5, min_stock=2, sku='FAST', supplier='Acme')
+        self.idle = Product.objects.create(name='Quieto', brand='B', description='D', price=Decimal('10'),
+                                           cost=Decimal('3'), quantity=1, min_stock=5, sku='IDLE', supplier='Beta')
+        self.full = Product.objects.create(name='Lleno', brand='B', description='D', price=Decimal('10'),
+                                           quantity=50, min_stock=5, sku='FULL', supplier='Acme')
+        self._sale('FAST', 28, days_ago=3)
+        self._sale('FULL', 100, days_ago=60)
+        self.client.login(username='testuser', password='testpass123')
+
+    def _sale(self, sku, quantity, days_ago):
+        from django.utils import timezone
+        sale = Sale.objects.create(user=self.user, total=Decimal('1'), ticket_number=f'RO-{sku}')
+        SaleItem.objects.create(sale=sale, product_name=sku, product_brand='B', product_sku=sku,
+                                quantity=quantity, unit_price=Decimal('1'), subtotal=Decimal('1'))
+        Sale.objects.filter(pk=sale.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+
+    def test_velocity_reorder_point_and_quantity(self):
+        """Test del punto de reorden y la cantidad sugerida según la velocidad"""
+        from .reorder import ReorderPolicy, compute
+        policy = ReorderPolicy(window_days=28, lead_time_days=7, safety_days=3, cover_days=30)
+        with self.assertNumQueries(2):
+            suggestions = {row.sku: row for row in compute(policy)}
+
+        fast = suggestions['FAST']
+        self.assertEqual(fast.velocity, Decimal('1.000'))
+        self.assertEqual(fast.reorder_point, 10)
+        self.assertEqual(fast.suggested_quantity, 35)
+        self.assertEqual(fast.days_of_cover, Decimal('5.0'))
+
+        # Sin ventas el punto de reorden es el min_stock fijo
+        idle = suggestions['IDLE']
+        self.assertEqual((idle.reorder_point, idle.suggested_quantity), (5, 5))
+        self.assertIsNone(idle.days_of_cover)
+
+        # Las ventas fuera de la ventana no cuentan
+        self.assertEqual(suggestions['FULL'].units_sold, 0)
+        self.assertFalse(suggestions['FULL'].needs_reorder)
+
+    def test_command_and_report(self):
+        """Test que el comando escribe la tabla y el reporte la agrupa por proveedor"""
+        import io
+        from django.core.management import call_command
+        from .models import ReorderSuggestion
+        call_command('compute_reorder_suggestions', stdout=io.StringIO())
+        self.assertEqual(ReorderSuggestion.objects.count(), 3)
+        call_command('compute_reorder_suggestions', stdout=io.StringIO())
+        self.assertEqual(ReorderSuggestion.objects.count(), 3)
+
+        with self.assertNumQueries(4):  # sesión, usuario, sugerencias y fecha del cálculo
+            response = self.client.get(reverse('low_stock_report'))
+        groups = response.context['groups']
+        self.assertEqual([(supplier, [row.sku for row in rows]) for supplier, rows, _ in groups],
+                         [('Acme', ['FAST']), ('Beta', ['IDLE'])])
+        self.assertEqual(groups[0][2], Decimal('140.00'))
+
+        response = self.client.get(reverse('low_stock_report'), {'supplier': 'Beta'})
+        self.assertEqual(len(response.context['groups']), 1)
+
+
+class InventoryValuationTest(TestCase):
+    """Tests para la valuación del inventario calculada en la base de datos"""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin = User.objects.create_user(username='admin', password='testpass123')
+        self.admin.profile.is_admin = True
+        self.admin.profile.save()
+        Product.objects.create(name='Uno', brand='B', description='D', price=Decimal('100'), cost=Decimal('60'),
+                               quantity=10, min_stock=2, sku='VAL-1', category='EDP', supplier='Acme')
+        Product.objects.create(name='Dos', brand='B', description='D', price=Decimal('50'), cost=Decimal('20'),
+                               quantity=3, min_stock=5, sku='VAL-2', category='EDT', supplier='Acme')
+        Product.objects.create(name='Tres', brand='B', description='D', price=Decimal('10'),
+                               quantity=0, min_stock=5, sku='VAL-3', category='EDT')
+
+    def test_annotations(self):
+        """Test que las anotaciones coinciden con las propiedades del modelo"""
+        products = {p.sku: p for p in Product.objects.with_valuation()}
+        one = products['VAL-1']
+        self.assertEqual(one.stock_cost, Decimal('600.00'))
+        self.assertEqual(one.stock_retail, Decimal('1000.00'))
+        self.assertAlmostEqual(one.margin_pct, float(one.profit_margin))
+        for product in products.values():
+            self.assertEqual(product.low_stock, product.is_low_stock)
+        self.assertEqual(sorted(Product.objects.low_stock().values_list('sku', flat=True)), ['VAL-2', 'VAL-3'])
+
+    def test_totals_in_one_query(self):
+        """Test que los totales del catálogo salen de una sola consulta agregada"""
+        with self.assertNumQueries(1):
+            totals = Product.objects.valuation()
+        self.assertEqual(totals['products'], 3)
+        self.assertEqual(totals['units'], 13)
+        self.assertEqual(totals['cost_value'], Decimal('660.00'))
+        self.assertEqual(totals['retail_value'], Decimal('1150.00'))
+        self.assertEqual(totals['potential_profit'], Decimal('490.00'))
+        self.assertEqual((totals['low_stock'], totals['out_of_stock']), (2, 1))
+
+        Product.objects.all().delete()
+        totals = Product.objects.valuation()
+        self.assertEqual((totals['products'], totals['retail_value'], totals['margin_pct']), (0, 0, 0))
+
+    def test_view(self):
+        """Test que la vista agrupa por categoría y proveedor y requiere administrador"""
+        self.client.login(username='admin', password='testpass123')
+        # usuario, perfil, totales, categorías, proveedores y productos
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('inventory_valuation'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row['category'], row['products']) for row in response.context['by_category']],
+                         [('EDP', 1), ('EDT', 2)])
+        self.assertEqual({row['supplier']: row['retail_value'] for row in response.context['by_supplier']},
+                         {'Acme': Decimal('1150.00'), '': Decimal('0.00')})
+        self.assertEqual([p.sku for p in response.context['top_products']][:2], ['VAL-1', 'VAL-2'])
+
+        User.objects.create_user(username='seller', password='testpass123')
+        self.client.login(username='seller', password='testpass123')
+        self.assertRedirects(self.client.get(reverse('inventory_valuation')), reverse('product_list'))
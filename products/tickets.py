@@ -0,0 +1,86 @@
+"""Asignación de números de ticket únicos para las ventas.
+
+Los números salen de un contador diario en la tabla TicketSequence, con el
+formato ``TICKET-AAAAMMDD-NNNNNN``. El contador se incrementa con un UPDATE
+antes de leerlo, de modo que la fila queda bloqueada hasta el commit y dos
+procesos nunca obtienen el mismo valor.
+
+Con ``TICKET_SEQUENCE_BLOCK_SIZE`` mayor a 1 cada proceso reserva un bloque
+de números de una sola vez y los reparte desde memoria; los tickets siguen
+siendo únicos pero pueden no ser consecutivos entre cajas.
+"""
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TicketSequence
+
+
+def format_ticket_number(day, value):
+    return f"TICKET-{day:%Y%m%d}-{value:06d}"
+
+
+def reserve(day, count=1):
+    """Reserva ``count`` números del día y retorna el rango asignado.
+
+    Si ya hay una transacción abierta la reserva forma parte de ella y se
+    revierte junto con la misma.
+    """
+    with transaction.atomic():
+        updated = TicketSequence.objects.filter(day=day).update(last_value=F('last_value') + count)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    TicketSequence.objects.create(day=day, last_value=count)
+            except IntegrityError:
+                # Otro proceso creó el contador del día al mismo tiempo
+                TicketSequence.objects.filter(day=day).update(last_value=F('last_value') + count)
+        last_value = TicketSequence.objects.filter(day=day).values_list('last_value', flat=True).get()
+    return range(last_value - count + 1, last_value + 1)
+
+
+class TicketAllocator:
+    """Reparte números de ticket, reservándolos en bloques cuando es posible"""
+
+    def __init__(self, block_size=None):
+        self._block_size = block_size
+        self._lock = threading.Lock()
+        self._day = None
+        self._pending = iter(())
+
+    @property
+    def block_size(self):
+        if self._block_size is not None:
+            return self._block_size
+        return max(1, getattr(settings, 'TICKET_SEQUENCE_BLOCK_SIZE', 1))
+
+    def next_number(self):
+        day = timezone.localdate()
+
+        # Dentro de una transacción un bloque podría revertirse después de
+        # haberse repartido; en ese caso se reserva un solo número en ella
+        if connection.in_atomic_block or self.block_size == 1:
+            return format_ticket_number(day, reserve(day)[0])
+
+        with self._lock:
+            if self._day != day:
+                self._day, self._pending = day, iter(())
+            value = next(self._pending, None)
+            if value is None:
+                self._pending = iter(reserve(day, self.block_size))
+                value = next(self._pending)
+        return format_ticket_number(day, value)
+
+    def reset(self):
+        with self._lock:
+            self._day, self._pending = None, iter(())
+
+
+allocator = TicketAllocator()
+
+
+def next_ticket_number():
+    return allocator.next_number()
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.product_list, name='product_list'),
@@ -13,6 +13,10 @@ urlpatterns = [
     path('products/', views.product_list, name='product_list'),
     path('products/<int:pk>/', views.product_detail, name='product_detail'),
     path('products/create/', views.product_create, name='product_create'),
+    path('products/import/', views.product_import, name='product_import'),
+    path('products/reorder/', views.low_stock_report, name='low_stock_report'),
+    path('products/valuation/', views.inventory_valuation, name='inventory_valuation'),
+    path('products/cache-stats/', views.catalog_cache_stats, name='catalog_cache_stats'),
     path('products/<int:pk>/edit/', views.product_edit, name='product_edit'),
     path('products/<int:pk>/delete/', views.product_delete, name='product_delete'),
 
@@ -25,10 +29,23 @@ urlpatterns = [
     path('cart/remove/<int:pk>/', views.cart_remove, name='cart_remove'),
     path('cart/update/<int:pk>/', views.cart_update_quantity, name='cart_update_quantity'),
     path('cart/clear/', views.cart_clear, name='cart_clear'),
+    path('cart/scan/', views.cart_scan, name='cart_scan'),
+
+    # API JSON del carrito (actualización sin recargar la página)
+    path('api/cart/add/<int:pk>/', api.cart_add, name='api_cart_add'),
+    path('api/cart/remove/<int:pk>/', api.cart_remove, name='api_cart_remove'),
+    path('api/cart/update/<int:pk>/', api.cart_update_quantity, name='api_cart_update_quantity'),
+    path('api/cart/clear/', api.cart_clear, name='api_cart_clear'),
+    path('api/cart/scan/', api.cart_scan, name='api_cart_scan'),
 
     # Ventas
     path('sales/', views.sale_list, name='sale_list'),
+    path('sales/dashboard/', views.sales_dashboard, name='sales_dashboard'),
+    path('sales/analytics/', views.sales_analytics, name='sales_analytics'),
     path('sales/<int:pk>/', views.sale_detail, name='sale_detail'),
     path('sales/process/', views.sale_process, name='sale_process'),
     path('sales/ticket/<int:pk>/', views.sale_ticket, name='sale_ticket'),
+
+    # Exportación (solo administradores)
+    path('export/<str:dataset>/', views.export_data, name='export_data'),
 ]
@@ -1,14 +1,28 @@
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
-from django.db.models import Q, Sum
+from django.conf import settings
+from django.db.models import Sum
 from django.db import models
-from .models import Product, History, UserProfile, Sale, SaleItem
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
+from . import analytics, catalog_cache, export, importer, reorder, rollup
+from .cart import CartError, add_item, hydrate_cart, load_cart, save_cart, set_quantity
+from .checkout import CheckoutError, process_sale
+from .conditional import catalog_etag, catalog_last_modified, product_etag, product_last_modified
+from .dates import local_day_range, local_days
+from .models import Product, History, UserProfile, ReorderSuggestion, Sale, SaleItem, get_user_options
+from .pagination import KeysetPaginator, get_page_size
+from .receipts import render_sale, sale_response
+from .scan import find_by_code
+from .search import search_products
 from decimal import Decimal
-from datetime import datetime
-import json
+from datetime import timedelta
 
 def user_login(request):
     if request.user.is_authenticated:
@@ -77,67 +91,143 @@ def user_delete(request, pk):
     messages.success(request, 'Usuario eliminado exitosamente')
     return redirect('user_list')
 
-@login_required
-def product_list(request):
-    products = Product.objects.all()
-
-    # Busqueda
-    search = request.GET.get('search')
+# Columnas que usan las tarjetas de product_list.html (se omite description)
+PRODUCT_CARD_FIELDS = (
+    'id', 'name', 'brand', 'category', 'gender', 'volume',
+    'price', 'quantity', 'min_stock', 'sku', 'image', 'created_at', 'updated_at',
+)
+
+# Ordenamientos permitidos en el catálogo: clave -> (etiqueta, orden).
+# Cada uno está respaldado por un índice de Product y termina en id para que
+# el orden sea determinista y el cursor identifique una posición exacta.
+PRODUCT_SORTS = {
+    '-created_at': ('Más recientes', ['-created_at', '-id']),
+    'created_at': ('Más antiguos', ['created_at', 'id']),
+    'name': ('Nombre (A-Z)', ['name', 'id']),
+    '-name': ('Nombre (Z-A)', ['-name', '-id']),
+    'brand': ('Marca (A-Z)', ['brand', 'id']),
+    '-brand': ('Marca (Z-A)', ['-brand', '-id']),
+    'price': ('Precio (menor)', ['price', 'id']),
+    '-price': ('Precio (mayor)', ['-price', '-id']),
+    'quantity': ('Stock (menor)', ['quantity', 'id']),
+    '-quantity': ('Stock (mayor)', ['-quantity', '-id']),
+    '-margin': ('Margen (mayor)', ['-margin_pct', '-id']),
+    'margin': ('Margen (menor)', ['margin_pct', 'id']),
+    '-stock_value': ('Valor en stock (mayor)', ['-stock_value', '-id']),
+    'stock_value': ('Valor en stock (menor)', ['stock_value', 'id']),
+}
+PRODUCT_DEFAULT_SORT = '-created_at'
+
+
+def filter_products(params, queryset=None):
+    """Aplica al catálogo los filtros de búsqueda recibidos por GET"""
+    products = Product.objects.all() if queryset is None else queryset
+
+    # Busqueda (indice de texto completo, ordenada por relevancia)
+    search = (params.get('search') or '').strip()
     if search:
-        products = products.filter(
-            Q(name__icontains=search) |
-            Q(brand__icontains=search) |
-            Q(sku__icontains=search) |
-            Q(barcode__icontains=search) |
-            Q(description__icontains=search)
-        )
+        products = search_products(products, search)
 
     # Filtro por categoria
-    category = request.GET.get('category')
+    category = params.get('category')
     if category:
         products = products.filter(category=category)
 
     # Filtro por genero
-    gender = request.GET.get('gender')
+    gender = params.get('gender')
     if gender:
         products = products.filter(gender=gender)
 
     # Filtro por tipo de fragancia
-    fragrance = request.GET.get('fragrance')
+    fragrance = params.get('fragrance')
     if fragrance:
         products = products.filter(fragrance_type=fragrance)
 
     # Filtro por precio
-    price_min = request.GET.get('price_min')
-    price_max = request.GET.get('price_max')
+    price_min = params.get('price_min')
+    price_max = params.get('price_max')
     if price_min:
         products = products.filter(price__gte=price_min)
     if price_max:
         products = products.filter(price__lte=price_max)
 
     # Filtro por cantidad
-    quantity_min = request.GET.get('quantity_min')
+    quantity_min = params.get('quantity_min')
     if quantity_min:
         products = products.filter(quantity__gte=quantity_min)
 
     # Filtro de stock bajo
-    low_stock = request.GET.get('low_stock')
+    low_stock = params.get('low_stock')
     if low_stock == 'true':
-        from django.db.models import F
-        products = products.filter(quantity__lte=F('min_stock'))
+        products = products.low_stock()
+
+    return products
+
 
-    # Ordenamiento
-    order_by = request.GET.get('order_by', '-created_at')
-    if order_by:
-        products = products.order_by(order_by)
+def sort_products(queryset, params):
+    """Retorna (queryset, orden) para la clave ?order_by= recibida.
 
-    return render(request, 'products/product_list.html', {'products': products})
+    Sin clave, una búsqueda se ordena por relevancia; una clave desconocida
+    usa el orden predeterminado.
+    """
+    order_by = params.get('order_by')
+    if (params.get('search') or '').strip() and not order_by:
+        return queryset, ['search_rank', 'id']
+
+    ordering = PRODUCT_SORTS.get(order_by, PRODUCT_SORTS[PRODUCT_DEFAULT_SORT])[1]
+    fields = {field.lstrip('-') for field in ordering}
+    if 'margin_pct' in fields:
+        queryset = queryset.with_margin()
+    if 'stock_value' in fields:
+        queryset = queryset.with_stock_value()
+    return queryset, ordering
+
+
+def current_sort(params):
+    """Clave del orden aplicado por sort_products ('' para relevancia)"""
+    order_by = params.get('order_by')
+    if order_by in PRODUCT_SORTS:
+        return order_by
+    if (params.get('search') or '').strip() and not order_by:
+        return ''
+    return PRODUCT_DEFAULT_SORT
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def product_list(request):
+    products = filter_products(request.GET, Product.objects.only(*PRODUCT_CARD_FIELDS))
+    products, ordering = sort_products(products, request.GET)
+
+    # Paginación por cursor; la primera página de los filtros simples sale de la caché
+    per_page = get_page_size(request, settings.PRODUCT_LIST_PAGE_SIZE, settings.PAGINATION_MAX_PAGE_SIZE)
+    paginator = KeysetPaginator(products, ordering, per_page)
+    page = catalog_cache.get_page(request.GET, lambda: paginator.get_page(request.GET.get('cursor')))
+
+    return render(request, 'products/product_list.html', {
+        'products': page,
+        'page': page,
+        'cards': catalog_cache.render_cards(page),
+        'sort_options': [(key, label) for key, (label, _) in PRODUCT_SORTS.items()],
+        'current_sort': current_sort(request.GET),
+    })
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=product_etag, last_modified_func=product_last_modified)
 def product_detail(request, pk):
     product = get_object_or_404(Product, pk=pk)
     return render(request, 'products/product_detail.html', {'product': product})
 
+@login_required
+def catalog_cache_stats(request):
+    """Aciertos y fallos de la caché del catálogo en este proceso (solo administradores)"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin:
+        messages.error(request, 'No tienes permisos para acceder a esta pagina')
+        return redirect('product_list')
+    return JsonResponse(catalog_cache.stats_report())
+
 @login_required
 def product_create(request):
     if request.method == 'POST':
@@ -178,56 +268,45 @@ def product_create(request):
             product.image = request.FILES['image']
             product.save()
 
-        History.objects.create(
-            user=request.user,
-            product_id=product.id,
-            product_name=product.name,
-            action='CREATE',
-            changes=json.dumps({
-                'name': name,
-                'brand': brand,
-                'description': description,
-                'category': category,
-                'gender': gender,
-                'fragrance_type': fragrance_type,
-                'volume': volume,
-                'price': str(price),
-                'cost': str(cost),
-                'quantity': quantity,
-                'min_stock': min_stock,
-                'sku': sku,
-                'barcode': barcode,
-                'supplier': supplier
-            })
-        )
-
         messages.success(request, 'Producto creado exitosamente')
         return redirect('product_list')
 
     return render(request, 'products/product_form.html')
 
+@login_required
+def product_import(request):
+    """Carga masiva de productos desde CSV o JSONL (solo administradores)"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin:
+        messages.error(request, 'No tienes permisos para acceder a esta pagina')
+        return redirect('product_list')
+
+    result = None
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            messages.error(request, 'Selecciona un archivo para importar')
+        else:
+            try:
+                result = importer.import_file(
+                    upload.file, upload.name, user=request.user,
+                    dry_run=request.POST.get('dry_run') == 'on',
+                )
+            except importer.ImportFileError as e:
+                messages.error(request, str(e))
+            else:
+                messages.success(request, f'Importación terminada: {result}')
+
+    return render(request, 'products/product_import.html', {
+        'result': result,
+        'columns': importer.IMPORT_FIELD_NAMES,
+        'required': importer.REQUIRED_FIELDS,
+    })
+
 @login_required
 def product_edit(request, pk):
     product = get_object_or_404(Product, pk=pk)
 
     if request.method == 'POST':
-        old_data = {
-            'name': product.name,
-            'brand': product.brand,
-            'description': product.description,
-            'category': product.category,
-            'gender': product.gender,
-            'fragrance_type': product.fragrance_type,
-            'volume': product.volume,
-            'price': str(product.price),
-            'cost': str(product.cost),
-            'quantity': product.quantity,
-            'min_stock': product.min_stock,
-            'sku': product.sku,
-            'barcode': product.barcode,
-            'supplier': product.supplier
-        }
-
         product.name = request.POST.get('name')
         product.brand = request.POST.get('brand')
         product.description = request.POST.get('description')
@@ -249,36 +328,6 @@ def product_edit(request, pk):
 
         product.save()
 
-        new_data = {
-            'name': product.name,
-            'brand': product.brand,
-            'description': product.description,
-            'category': product.category,
-            'gender': product.gender,
-            'fragrance_type': product.fragrance_type,
-            'volume': product.volume,
-            'price': str(product.price),
-            'cost': str(product.cost),
-            'quantity': product.quantity,
-            'min_stock': product.min_stock,
-            'sku': product.sku,
-            'barcode': product.barcode,
-            'supplier': product.supplier
-        }
-
-        changes = {}
-        for key in old_data:
-            if old_data[key] != new_data[key]:
-                changes[key] = {'old': old_data[key], 'new': new_data[key]}
-
-        History.objects.create(
-            user=request.user,
-            product_id=product.id,
-            product_name=product.name,
-            action='UPDATE',
-            changes=json.dumps(changes)
-        )
-
         messages.success(request, 'Producto actualizado exitosamente')
         return redirect('product_list')
 
@@ -289,29 +338,6 @@ def product_delete(request, pk):
     product = get_object_or_404(Product, pk=pk)
 
     if request.method == 'POST':
-        History.objects.create(
-            user=request.user,
-            product_id=product.id,
-            product_name=product.name,
-            action='DELETE',
-            changes=json.dumps({
-                'name': product.name,
-                'brand': product.brand,
-                'description': product.description,
-                'category': product.category,
-                'gender': product.gender,
-                'fragrance_type': product.fragrance_type,
-                'volume': product.volume,
-                'price': str(product.price),
-                'cost': str(product.cost),
-                'quantity': product.quantity,
-                'min_stock': product.min_stock,
-                'sku': product.sku,
-                'barcode': product.barcode,
-                'supplier': product.supplier
-            })
-        )
-
         product.delete()
         messages.success(request, 'Producto eliminado exitosamente')
         return redirect('product_list')
@@ -320,7 +346,9 @@ def product_delete(request, pk):
 
 @login_required
 def history_list(request):
-    histories = History.objects.all()
+    histories = History.objects.select_related('user').only(
+        'id', 'product_id', 'product_name', 'action', 'timestamp', 'user__username'
+    )
 
     is_admin = hasattr(request.user, 'profile') and request.user.profile.is_admin
 
@@ -331,7 +359,7 @@ def history_list(request):
     product_filter = request.GET.get('product')
     action_filter = request.GET.get('action')
 
-    if user_filter:
+    if user_filter and user_filter.isdigit():
         histories = histories.filter(user_id=user_filter)
 
     if product_filter:
@@ -340,10 +368,15 @@ def history_list(request):
     if action_filter:
         histories = histories.filter(action=action_filter)
 
-    users = User.objects.all() if is_admin else None
+    users = get_user_options() if is_admin else None
+
+    # Paginación por cursor sobre (timestamp, id), respaldada por los índices de History
+    per_page = get_page_size(request, settings.HISTORY_LIST_PAGE_SIZE, settings.PAGINATION_MAX_PAGE_SIZE)
+    page = KeysetPaginator(histories, ['-timestamp', '-id'], per_page).get_page(request.GET.get('cursor'))
 
     return render(request, 'products/history_list.html', {
-        'histories': histories,
+        'histories': page,
+        'page': page,
         'users': users,
         'is_admin': is_admin,
         'actions': History.ACTION_CHOICES
@@ -372,22 +405,13 @@ def history_detail(request, pk):
 @login_required
 def cart_view(request):
     """Vista del carrito de compras"""
-    cart = request.session.get('cart', {})
-    cart_items = []
-    total = Decimal('0.00')
+    cart_items, total, removed = hydrate_cart(request.session)
 
-    for product_id, item_data in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            subtotal = Decimal(str(item_data['price'])) * item_data['quantity']
-            cart_items.append({
-                'product': product,
-                'quantity': item_data['quantity'],
-                'subtotal': subtotal
-            })
-            total += subtotal
-        except Product.DoesNotExist:
-            continue
+    # El carrito solo guarda ids, así que el aviso no puede nombrar el producto
+    if len(removed) == 1:
+        messages.warning(request, 'Un producto ya no está disponible y se quitó del carrito')
+    elif removed:
+        messages.warning(request, f'{len(removed)} productos ya no están disponibles y se quitaron del carrito')
 
     return render(request, 'products/cart.html', {
         'cart_items': cart_items,
@@ -404,42 +428,51 @@ def cart_add(request, pk):
         messages.error(request, f'No hay stock disponible de {product.name}')
         return redirect('product_list')
 
-    cart = request.session.get('cart', {})
-    product_id = str(product.id)
+    cart = load_cart(request.session)
+    try:
+        # Verifica que no exceda el stock disponible
+        add_item(cart, product)
+    except CartError as e:
+        messages.warning(request, str(e))
+        return redirect('cart_view')
 
-    if product_id in cart:
-        # Verificar que no exceda el stock disponible
-        if cart[product_id]['quantity'] + 1 > product.quantity:
-            messages.warning(request, f'No hay suficiente stock de {product.name}. Disponible: {product.quantity}')
-            return redirect('cart_view')
-        cart[product_id]['quantity'] += 1
-    else:
-        cart[product_id] = {
-            'name': product.name,
-            'brand': product.brand,
-            'sku': product.sku,
-            'price': float(product.price),
-            'quantity': 1
-        }
-
-    request.session['cart'] = cart
-    request.session.modified = True
+    save_cart(request.session, cart)
     messages.success(request, f'{product.name} agregado al carrito')
 
     return redirect(request.META.get('HTTP_REFERER', 'product_list'))
 
 
+@login_required
+@require_POST
+def cart_scan(request):
+    """Agregar al carrito por código de barras o SKU (lector de códigos)"""
+    code = request.POST.get('code', '').strip()
+    product = find_by_code(code)
+    if product is None:
+        messages.error(request, f'No hay ningún producto con el código {code}')
+        return redirect('cart_view')
+
+    cart = load_cart(request.session)
+    try:
+        add_item(cart, product)
+    except CartError as e:
+        messages.warning(request, str(e))
+    else:
+        save_cart(request.session, cart)
+        messages.success(request, f'{product.name} agregado al carrito')
+    return redirect('cart_view')
+
+
 @login_required
 def cart_remove(request, pk):
     """Remover producto del carrito"""
-    cart = request.session.get('cart', {})
+    cart = load_cart(request.session)
     product_id = str(pk)
 
     if product_id in cart:
-        product_name = cart[product_id]['name']
         del cart[product_id]
-        request.session['cart'] = cart
-        request.session.modified = True
+        save_cart(request.session, cart)
+        product_name = Product.objects.filter(pk=pk).values_list('name', flat=True).first() or 'Producto'
         messages.success(request, f'{product_name} eliminado del carrito')
 
     return redirect('cart_view')
@@ -450,27 +483,17 @@ def cart_update_quantity(request, pk):
     """Actualizar cantidad de un producto en el carrito"""
     if request.method == 'POST':
         product = get_object_or_404(Product, pk=pk)
-        cart = request.session.get('cart', {})
-        product_id = str(pk)
+        cart = load_cart(request.session)
 
         try:
-            new_quantity = int(request.POST.get('quantity', 1))
-
-            if new_quantity <= 0:
-                messages.error(request, 'La cantidad debe ser mayor a 0')
-                return redirect('cart_view')
-
-            if new_quantity > product.quantity:
-                messages.error(request, f'No hay suficiente stock. Disponible: {product.quantity}')
-                return redirect('cart_view')
-
-            if product_id in cart:
-                cart[product_id]['quantity'] = new_quantity
-                request.session['cart'] = cart
-                request.session.modified = True
-                messages.success(request, 'Cantidad actualizada')
+            set_quantity(cart, product, int(request.POST.get('quantity', 1)))
         except ValueError:
             messages.error(request, 'Cantidad inválida')
+        except CartError as e:
+            messages.error(request, str(e))
+        else:
+            save_cart(request.session, cart)
+            messages.success(request, 'Cantidad actualizada')
 
     return redirect('cart_view')
 
@@ -478,8 +501,7 @@ def cart_update_quantity(request, pk):
 @login_required
 def cart_clear(request):
     """Limpiar el carrito"""
-    request.session['cart'] = {}
-    request.session.modified = True
+    save_cart(request.session, {})
     messages.success(request, 'Carrito vaciado')
     return redirect('cart_view')
 
@@ -487,80 +509,52 @@ def cart_clear(request):
 @login_required
 def sale_process(request):
     """Procesar la venta y generar ticket"""
-    cart = request.session.get('cart', {})
+    cart = load_cart(request.session)
 
     if not cart:
         messages.error(request, 'El carrito está vacío')
         return redirect('cart_view')
 
-    # Verificar stock disponible para todos los productos
-    for product_id, item_data in cart.items():
-        try:
-            product = Product.objects.get(id=product_id)
-            if product.quantity < item_data['quantity']:
-                messages.error(request, f'Stock insuficiente para {product.name}. Disponible: {product.quantity}')
-                return redirect('cart_view')
-        except Product.DoesNotExist:
-            messages.error(request, f'Producto no encontrado')
-            return redirect('cart_view')
-
-    # Crear la venta
-    total = Decimal('0.00')
-    ticket_number = f"TICKET-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-    sale = Sale.objects.create(
-        user=request.user,
-        total=total,  # Se actualizará después
-        ticket_number=ticket_number
-    )
-
-    # Crear los items de venta y reducir stock
-    for product_id, item_data in cart.items():
-        product = Product.objects.get(id=product_id)
-        quantity = item_data['quantity']
-        unit_price = Decimal(str(item_data['price']))
-        subtotal = unit_price * quantity
-
-        # Crear item de venta
-        SaleItem.objects.create(
-            sale=sale,
-            product_name=product.name,
-            product_brand=product.brand,
-            product_sku=product.sku,
-            quantity=quantity,
-            unit_price=unit_price,
-            subtotal=subtotal
-        )
-
-        # Reducir stock
-        product.quantity -= quantity
-        product.save()
-
-        total += subtotal
-
-    # Actualizar total de la venta
-    sale.total = total
-    sale.save()
+    try:
+        sale = process_sale(request.user, cart)
+    except CheckoutError as e:
+        messages.error(request, str(e))
+        return redirect('cart_view')
 
     # Limpiar carrito
-    request.session['cart'] = {}
-    request.session.modified = True
+    save_cart(request.session, {})
 
-    messages.success(request, f'Venta realizada exitosamente. Ticket: {ticket_number}')
+    messages.success(request, f'Venta realizada exitosamente. Ticket: {sale.ticket_number}')
     return redirect('sale_ticket', pk=sale.id)
 
 
 @login_required
 def sale_ticket(request, pk):
     """Ver el ticket de venta"""
-    sale = get_object_or_404(Sale, pk=pk)
-    return render(request, 'products/sale_ticket.html', {'sale': sale})
+    rendered = render_sale('ticket', pk)
+    if rendered is None:
+        raise Http404('Venta no encontrada')
+
+    return sale_response(request, 'products/sale_ticket.html', 'ticket', pk, rendered)
+
+
+def sales_user_filter(request, is_admin):
+    """Id del vendedor cuyas ventas se muestran, o None para todos"""
+    if not is_admin:
+        return request.user.pk
+    user_filter = request.GET.get('user')
+    return int(user_filter) if user_filter and user_filter.isdigit() else None
 
 
 @login_required
 def sale_list(request):
     """Lista de todas las ventas"""
-    sales = Sale.objects.all()
+    items_count = SaleItem.objects.filter(sale=models.OuterRef('pk')).values('sale').annotate(
+        count=Sum('quantity')
+    ).values('count')
+    sales = Sale.objects.select_related('user').only(
+        'id', 'ticket_number', 'total', 'created_at', 'user__username'
+    )
 
     is_admin = hasattr(request.user, 'profile') and request.user.profile.is_admin
 
@@ -569,40 +563,191 @@ def sale_list(request):
         sales = sales.filter(user=request.user)
 
     # Filtros
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
+    try:
+        date_from, date_to = local_day_range(request.GET.get('date_from'), request.GET.get('date_to'))
+    except ValueError:
+        date_from = date_to = None
     user_filter = request.GET.get('user')
 
     if date_from:
         sales = sales.filter(created_at__gte=date_from)
     if date_to:
-        sales = sales.filter(created_at__lte=date_to)
-    if user_filter and is_admin:
+        sales = sales.filter(created_at__lt=date_to)
+    if user_filter and is_admin and user_filter.isdigit():
         sales = sales.filter(user_id=user_filter)
 
-    users = User.objects.all() if is_admin else None
+    users = get_user_options() if is_admin else None
 
-    # Calcular totales
-    total_sales = sales.aggregate(total=models.Sum('total'))['total'] or 0
+    # Paginación por cursor; la cantidad de items se calcula sólo para la página
+    per_page = get_page_size(request, settings.SALE_LIST_PAGE_SIZE, settings.PAGINATION_MAX_PAGE_SIZE)
+    page = KeysetPaginator(
+        sales.annotate(items_count=Coalesce(models.Subquery(items_count), 0)),
+        ['-created_at', '-id'],
+        per_page,
+    ).get_page(request.GET.get('cursor'))
+
+    # Totales de todo el filtro desde el resumen diario (una fila por vendedor y
+    # día); el de la página se suma sobre las ventas ya cargadas
+    day_from, day_to = local_days(request.GET.get('date_from'), request.GET.get('date_to'))
+    totals = rollup.totals(day_from, day_to, user_id=sales_user_filter(request, is_admin))
 
     return render(request, 'products/sale_list.html', {
-        'sales': sales,
+        'sales': page,
+        'page': page,
         'users': users,
         'is_admin': is_admin,
-        'total_sales': total_sales
+        'total_sales': totals['revenue'],
+        'sales_count': totals['sales'],
+        'page_total': sum((sale.total for sale in page), Decimal('0.00')),
     })
 
 
 @login_required
 def sale_detail(request, pk):
     """Detalle de una venta"""
-    sale = get_object_or_404(Sale, pk=pk)
+    rendered = render_sale('detail', pk)
+    if rendered is None:
+        raise Http404('Venta no encontrada')
 
     is_admin = hasattr(request.user, 'profile') and request.user.profile.is_admin
 
     # Verificar permisos
-    if not is_admin and sale.user != request.user:
+    if not is_admin and rendered['user_id'] != request.user.pk:
         messages.error(request, 'No tienes permisos para ver esta venta')
         return redirect('sale_list')
 
-    return render(request, 'products/sale_detail.html', {'sale': sale})
+    return sale_response(request, 'products/sale_detail.html', 'detail', pk, rendered)
+
+
+@login_required
+def export_data(request, dataset):
+    """Descarga products, sales o history en CSV o JSONL (?format=jsonl, ?gzip=1).
+
+    Acepta los mismos filtros date_from, date_to, user y action que las listas.
+    """
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin:
+        messages.error(request, 'No tienes permisos para exportar datos')
+        return redirect('product_list')
+
+    fmt = request.GET.get('format', 'csv')
+    compress = request.GET.get('gzip') in ('1', 'true', 'on')
+    try:
+        start, end = local_day_range(request.GET.get('date_from'), request.GET.get('date_to'))
+    except ValueError:
+        start = end = None
+    user_filter = request.GET.get('user')
+
+    try:
+        chunks = export.stream(
+            dataset, fmt, compress,
+            start=start, end=end,
+            user_id=int(user_filter) if user_filter and user_filter.isdigit() else None,
+            action=request.GET.get('action') or None,
+        )
+    except export.ExportError as e:
+        raise Http404(str(e))
+
+    response = StreamingHttpResponse(chunks, content_type=export.content_type(fmt, compress))
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(dataset, fmt, compress)}"'
+    return response
+
+
+@login_required
+def sales_dashboard(request):
+    """Ventas por día, vendedor y SKU leídas del resumen diario"""
+    is_admin = hasattr(request.user, 'profile') and request.user.profile.is_admin
+    user_id = sales_user_filter(request, is_admin)
+
+    day_from, day_to = local_days(request.GET.get('date_from'), request.GET.get('date_to'))
+    if day_from is None and day_to is None:
+        day_to = timezone.localdate()
+        day_from = day_to - timedelta(days=settings.SALES_DASHBOARD_DAYS - 1)
+
+    days = list(rollup.by_day(day_from, day_to, user_id))
+    best_day = max((day['revenue'] for day in days), default=0)
+    for day in days:
+        day['share'] = int(day['revenue'] * 100 / best_day) if best_day else 0
+
+    return render(request, 'products/sales_dashboard.html', {
+        'day_from': day_from,
+        'day_to': day_to,
+        'days': days,
+        'totals': rollup.totals(day_from, day_to, user_id),
+        'sellers': rollup.by_seller(day_from, day_to, user_id) if is_admin else None,
+        'top_skus': rollup.by_sku(day_from, day_to, user_id)[:settings.SALES_DASHBOARD_TOP_SKUS],
+        'users': get_user_options() if is_admin else None,
+        'is_admin': is_admin,
+    })
+
+
+@login_required
+def sales_analytics(request):
+    """Más vendidos, clasificación ABC y stock sin ventas (solo administradores)"""
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin:
+        messages.error(request, 'No tienes permisos para acceder a esta pagina')
+        return redirect('product_list')
+
+    period = request.GET.get('period', analytics.DEFAULT_PERIOD)
+    if period not in analytics.PERIODS:
+        period = analytics.DEFAULT_PERIOD
+    order_by = 'units' if request.GET.get('by') == 'units' else 'revenue'
+    start, end = analytics.period_bounds(period)
+
+    abc = analytics.abc_classification(start, end)
+    return render(request, 'products/sales_analytics.html', {
+        'periods': analytics.PERIODS.items(),
+        'period': period,
+        'order_by': order_by,
+        'start': start,
+        'end': end - timedelta(days=1),
+        'top_skus': analytics.top_skus(start, end, settings.ANALYTICS_TOP_SKUS, by=order_by),
+        'abc': abc,
+        'abc_summary': analytics.abc_summary(abc),
+        'dead_stock_days': settings.ANALYTICS_DEAD_STOCK_DAYS,
+        'dead_stock': analytics.dead_stock(settings.ANALYTICS_DEAD_STOCK_DAYS),
+    })
+
+
+@login_required
+def low_stock_report(request):
+    """Productos a pedir por proveedor, leídos de la tabla de sugerencias"""
+    suggestions = ReorderSuggestion.objects.filter(needs_reorder=True).order_by('supplier', 'sku')
+    supplier = request.GET.get('supplier')
+    if supplier is not None:
+        suggestions = suggestions.filter(supplier=supplier)
+
+    groups = reorder.by_supplier(suggestions)
+    return render(request, 'products/low_stock_report.html', {
+        'groups': groups,
+        'total_cost': sum((cost for _, _, cost in groups), Decimal('0.00')),
+        'computed_at': ReorderSuggestion.objects.order_by().values_list('computed_at', flat=True).first(),
+    })
+
+
+@login_required
+def inventory_valuation(request):
+    """Valor del inventario a costo y a precio de venta (solo administradores).
+
+    Los totales salen de una consulta agregada y los desgloses de consultas
+    agrupadas; ningún producto se carga en memoria salvo los de mayor valor.
+    """
+    if not hasattr(request.user, 'profile') or not request.user.profile.is_admin:
+        messages.error(request, 'No tienes permisos para acceder a esta pagina')
+        return redirect('product_list')
+
+    products = Product.objects.all()
+    categories = dict(Product.CATEGORY_CHOICES)
+    by_category = list(products.valuation_by('category'))
+    for row in by_category:
+        row['label'] = categories.get(row['category'], row['category'])
+
+    return render(request, 'products/inventory_valuation.html', {
+        'totals': products.valuation(),
+        'by_category': by_category,
+        'by_supplier': products.valuation_by('supplier'),
+        'top_products': (
+            products.with_valuation()
+            .only('id', 'name', 'brand', 'sku', 'quantity', 'min_stock', 'price', 'cost')
+            .order_by('-stock_retail', 'pk')[:settings.INVENTORY_VALUATION_TOP_PRODUCTS]
+        ),
+    })